@@ -0,0 +1,90 @@
+# bench_csv_parse.py
+"""
+CSV parse throughput on the wide 54-column files.
+
+Builds a large file by repeating the rows of data/data_1.csv, then times:
+  - pandas C parser (the previous behaviour of every stage)
+  - pyarrow, single-threaded
+  - pyarrow, multi-threaded block parsing (the csv_reader default)
+  - pyarrow, multi-threaded with explicit Doris-derived column types
+  - pyarrow, multi-threaded with usecols pushdown (8 of 54 columns)
+
+Usage: python3 benchmarks/bench_csv_parse.py [--rows N] [--runs N]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+SOURCE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "data_1.csv")
+sys.path.insert(0, SCRIPTS_DIR)
+os.environ.setdefault("PIPELINE_BASE_DIR", tempfile.mkdtemp(prefix="bench_csv_"))
+
+import pandas as pd
+
+def build_wide_file(rows):
+    with open(SOURCE_FILE) as f:
+        header = f.readline()
+        body = [line if line.endswith("\n") else line + "\n" for line in f if line.strip()]
+    fd, path = tempfile.mkstemp(suffix=".csv", prefix="wide_")
+    with os.fdopen(fd, "w") as out:
+        out.write(header)
+        written = 0
+        while written < rows:
+            chunk = body[:rows - written]
+            out.writelines(chunk)
+            written += len(chunk)
+    return path
+
+def bench(label, fn, size_bytes, rows, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        df = fn()
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    print(f"{label:44s} {best*1000:9.1f}ms {statistics.median(timings)*1000:9.1f}ms "
+          f"{size_bytes/best/1024/1024:8.1f} MB/s {rows/best/1000:9.1f}k rows/s  ({df.shape[1]} cols)")
+
+def main():
+    parser = argparse.ArgumentParser(description="CSV parse throughput benchmark")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    import csv_reader
+    if csv_reader.pa_csv is None:
+        print("pyarrow is not installed - only the pandas parser can be measured")
+
+    path = build_wide_file(args.rows)
+    size = os.path.getsize(path)
+    try:
+        # Derive Doris types the way the loader would see them after DESC
+        sample = pd.read_csv(path, nrows=1000)
+        load = __import__("4_load_to_doris")
+        doris_types = {c: load.infer_doris_type(sample[c]) for c in sample.columns}
+        usecols = list(sample.columns[:8])
+
+        print(f"{args.rows:,} rows x {sample.shape[1]} columns, {size/1024/1024:.1f} MB, "
+              f"{os.cpu_count()} CPUs, best of {args.runs}")
+        print(f"{'parser':44s} {'best':>11s} {'median':>11s} {'throughput':>13s}")
+        bench("pandas C parser", lambda: pd.read_csv(path), size, args.rows, args.runs)
+        if csv_reader.pa_csv is not None:
+            pa_csv = csv_reader.pa_csv
+            bench("pyarrow, 1 thread",
+                  lambda: pa_csv.read_csv(path, read_options=pa_csv.ReadOptions(use_threads=False)).to_pandas(),
+                  size, args.rows, args.runs)
+            bench("pyarrow, multi-threaded (csv_reader)",
+                  lambda: csv_reader._read_pyarrow(path), size, args.rows, args.runs)
+            bench("pyarrow, multi-threaded + Doris types",
+                  lambda: csv_reader.read_csv(path, doris_types=doris_types), size, args.rows, args.runs)
+            bench("pyarrow, multi-threaded + usecols (8 cols)",
+                  lambda: csv_reader.read_csv(path, usecols=usecols), size, args.rows, args.runs)
+    finally:
+        os.remove(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# bench_fast_path.py
+"""
+Cost of the transform fast path (fast_path.is_clean + byte copy).
+
+The fast path only replaces 3_transform: the load stage still parses the
+staged file (it assigns ids and validates types), so what the is_clean()
+pass has to pay for is the pandas transform it skips. Times, on a clean
+file and on one that is dirty only on its last line (the worst case: the
+full check runs and then the full transform anyway):
+  - is_clean() alone
+  - transform() with TRANSFORM_FAST_PATH=1 and =0
+
+Usage: python3 benchmarks/bench_fast_path.py [--rows N] [--cols N] [--runs N]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+os.environ.setdefault("PIPELINE_BASE_DIR", tempfile.mkdtemp(prefix="bench_fast_path_"))
+
+def build_file(rows, cols, dirty_tail=False):
+    """Unique rows, normalized header, no nulls - unless `dirty_tail` blanks a field on the last line"""
+    fd, path = tempfile.mkstemp(suffix=".csv", prefix="clean_")
+    with os.fdopen(fd, "w") as out:
+        out.write(",".join(f"col_{c}" for c in range(cols)) + "\n")
+        for i in range(rows):
+            fields = [str(i)] + [f"{i * 0.5 + c:.2f}" if c % 2 else f"v{c}_{i % 997}" for c in range(1, cols)]
+            if dirty_tail and i == rows - 1:
+                fields[1] = ""
+            out.write(",".join(fields) + "\n")
+    return path
+
+def bench(label, fn, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    print(f"{label:52s} {min(timings)*1000:9.1f}ms {statistics.median(timings)*1000:9.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Transform fast path benchmark")
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--cols", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    from fast_path import is_clean
+    transform = __import__("3_transform").transform
+    import local_config
+
+    print(f"{args.rows:,} rows x {args.cols} columns, best/median of {args.runs}")
+    print(f"{'step':52s} {'best':>11s} {'median':>11s}")
+    for dirty in (False, True):
+        path = build_file(args.rows, args.cols, dirty_tail=dirty)
+        kind = "dirty last line" if dirty else "clean"
+        name = os.path.basename(path)
+        try:
+            bench(f"{kind}: is_clean()", lambda: is_clean(path), args.runs)
+            for flag in ("1", "0"):
+                os.environ["TRANSFORM_FAST_PATH"] = flag
+                bench(f"{kind}: transform(), TRANSFORM_FAST_PATH={flag}",
+                      lambda: transform(name, src=path), args.runs)
+        finally:
+            os.remove(path)
+            for staged in os.listdir(local_config.STAGE_DIR):
+                os.remove(os.path.join(local_config.STAGE_DIR, staged))
+
+if __name__ == "__main__":
+    main()
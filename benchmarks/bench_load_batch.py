@@ -0,0 +1,96 @@
+# bench_load_batch.py
+"""
+Memory and time to prepare a load batch from a parsed wide file.
+
+Compares the previous row loop (a list of tuples of boxed Python values,
+as handed to executemany) with the column-wise LoadBatch (typed NumPy
+buffers + validity masks). Peak memory is measured with tracemalloc, on
+top of the already parsed DataFrame.
+
+Then measures parse + batch from the CSV on disk: a pandas DataFrame
+(read_csv) against a pyarrow Table (read_table), which the batch converts
+one column at a time. Peaks include the parsed data and the Python
+allocations pyarrow reports to tracemalloc; Arrow's own buffers are counted
+separately via pyarrow.total_allocated_bytes().
+
+Usage: python3 benchmarks/bench_load_batch.py [--rows N]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+SOURCE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "data_1.csv")
+sys.path.insert(0, SCRIPTS_DIR)
+os.environ.setdefault("PIPELINE_BASE_DIR", tempfile.mkdtemp(prefix="bench_batch_"))
+
+import pandas as pd
+
+def tuple_rows(df, column_types):
+    """The previous representation: one tuple of Python values per row"""
+    data = []
+    for row in df.itertuples(index=False):
+        cleaned = []
+        for col, value in zip(df.columns, row):
+            if pd.isna(value):
+                cleaned.append(None)
+            elif "INT" in column_types[col]:
+                cleaned.append(int(float(value)))
+            elif "DOUBLE" in column_types[col]:
+                cleaned.append(float(value))
+            else:
+                cleaned.append(value)
+        data.append(tuple(cleaned))
+    return data
+
+def measure(label, fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:36s} {elapsed*1000:9.1f}ms  peak {peak/1024/1024:8.1f} MB")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Load batch memory benchmark")
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    from load_batch import LoadBatch
+    load = __import__("4_load_to_doris")
+
+    sample = pd.read_csv(SOURCE_FILE)
+    df = pd.concat([sample] * (args.rows // len(sample) + 1), ignore_index=True).iloc[:args.rows]
+    column_types = {c: load.infer_doris_type(sample[c]) for c in sample.columns}
+    print(f"{len(df):,} rows x {df.shape[1]} columns, DataFrame {df.memory_usage(deep=True).sum()/1024/1024:.1f} MB")
+
+    measure("list of tuples (previous)", lambda: tuple_rows(df, column_types))
+    batch, _ = measure("LoadBatch column buffers", lambda: LoadBatch.from_frame(df, column_types))
+    print(f"LoadBatch buffers: {batch.nbytes/1024/1024:.1f} MB")
+    del batch
+
+    from csv_reader import read_csv, read_table
+    path = os.path.join(os.environ["PIPELINE_BASE_DIR"], "bench_load_batch.csv")
+    df.to_csv(path, index=False)
+    del df
+    print()
+    measure("read_csv + from_frame (DataFrame)", lambda: LoadBatch.from_frame(read_csv(path, doris_types=column_types), column_types))
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return
+    arrow_peak = [0]
+    def from_table():
+        table = read_table(path, doris_types=column_types)
+        arrow_peak[0] = pa.total_allocated_bytes()
+        return LoadBatch.from_frame(table, column_types)
+    measure("read_table + from_frame (Arrow)", from_table)
+    print(f"  + Arrow table buffers {arrow_peak[0]/1024/1024:.1f} MB (outside tracemalloc)")
+
+if __name__ == "__main__":
+    main()
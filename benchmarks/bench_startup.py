@@ -0,0 +1,106 @@
+# bench_startup.py
+"""
+Startup benchmark for the pipeline.
+
+Measures, in fresh interpreters:
+  - bare interpreter startup (`python -c pass`) as the floor
+  - `import pipeline_local` (what every run pays before doing anything)
+  - a full "nothing to do" run against a throwaway base dir with every CSV
+    already checkpointed - the case that took 1.19 s in pipeline.log
+  - `import pandas` for reference, which the no-op run must never pay
+
+Also prints the slowest imports reported by `python -X importtime`.
+
+Usage: python3 benchmarks/bench_startup.py [--runs N]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+
+def time_command(cmd, env, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=SCRIPTS_DIR, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def top_imports(env, limit=10):
+    """Parse `-X importtime` output and return the slowest cumulative imports"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import pipeline_local"],
+                            cwd=SCRIPTS_DIR, env=env, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:  self [us] | cumulative | imported package"
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), name.rstrip()))
+    return sorted(rows, reverse=True)[:limit]
+
+def make_base_dir():
+    """Throwaway BASE_DIR with a few CSVs, all already checkpointed"""
+    base = tempfile.mkdtemp(prefix="bench_startup_")
+    os.makedirs(os.path.join(base, "data"))
+    names = [f"data_{i}.csv" for i in range(1, 5)]
+    for name in names:
+        with open(os.path.join(base, "data", name), "w") as f:
+            f.write("name,age\nAlice,30\n")
+    with open(os.path.join(base, "checkpoint.txt"), "w") as f:
+        f.write("\n".join(names) + "\n")
+    return base
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipeline startup benchmark")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    base = make_base_dir()
+    env = os.environ.copy()
+    env["PIPELINE_BASE_DIR"] = base
+
+    cases = [
+        ("interpreter (python -c pass)", [sys.executable, "-c", "pass"]),
+        ("import pipeline_local", [sys.executable, "-c", "import pipeline_local"]),
+        ("no-op run (pipeline_local.py)", [sys.executable, "pipeline_local.py"]),
+        ("import pandas (reference)", [sys.executable, "-c", "import pandas"]),
+    ]
+
+    try:
+        print(f"Startup benchmark ({args.runs} runs each, Python {sys.version.split()[0]})")
+        print(f"{'case':36s} {'min':>9s} {'median':>9s} {'max':>9s}")
+        for label, cmd in cases:
+            try:
+                timings = time_command(cmd, env, args.runs)
+            except subprocess.CalledProcessError:
+                print(f"{label:36s} {'(failed)':>9s}")
+                continue
+            print(f"{label:36s} {min(timings)*1000:8.1f}ms {statistics.median(timings)*1000:8.1f}ms "
+                  f"{max(timings)*1000:8.1f}ms")
+
+        print("\nSlowest imports for `import pipeline_local` (cumulative):")
+        for cumulative_us, name in top_imports(env):
+            print(f"  {cumulative_us/1000:8.2f}ms  {name}")
+
+        # The no-op run must not drag in pandas/numpy
+        probe = subprocess.run(
+            [sys.executable, "-c",
+             "import sys, runpy; sys.argv=['pipeline_local.py']; "
+             "runpy.run_path('pipeline_local.py', run_name='__main__'); "
+             "print('pandas' in sys.modules)"],
+            cwd=SCRIPTS_DIR, env=env, capture_output=True, text=True)
+        loaded = probe.stdout.strip().splitlines()[-1:] == ["True"]
+        print(f"\npandas imported during no-op run: {'YES (regression!)' if loaded else 'no'}")
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
 # 0_ingest.py
 import os
 from local_config import CSV_DIR, logging
+from input_files import is_csv
 
 def ingest():
-    files = [f for f in os.listdir(CSV_DIR) if f.lower().endswith(".csv")]
+    files = [f for f in os.listdir(CSV_DIR) if is_csv(f)]
     if not files:
         print("No CSVs found.")
         return
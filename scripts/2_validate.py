@@ -1,27 +1,145 @@
 # 2_validate.py
 import os
-import pandas as pd
+import io
+import csv
 import sys
-from local_config import CSV_DIR, logging
+import json
+import time
+import shutil
+from local_config import CSV_DIR, ERROR_DIR, TABLE_MAP_FILE, logging, get_table_routing
+from column_names import header_mapping
+from input_files import compression_of, open_binary
+
+# csv.reader holds a whole record in memory; raise the default 128 KB field cap
+csv.field_size_limit(sys.maxsize)
+
+def expected_schema():
+    """The main schema every file must match in single-table routing mode"""
+    if get_table_routing() != "single" or not os.path.exists(TABLE_MAP_FILE):
+        return None
+    with open(TABLE_MAP_FILE) as f:
+        return json.load(f).get("main_schema")
+
+def read_manifest(path):
+    """Optional `<file>.manifest` sidecar from the producer: {"bytes": N, "rows": N}"""
+    manifest_path = f"{path}.manifest"
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+def validate_file(path, schema=None):
+    """
+    Validate a raw CSV in a single streaming pass, stopping at the first problem.
+    Returns a dict with ok, reason, retryable (the file may still be arriving,
+    so it should be retried later rather than rejected) and rows.
+    """
+    result = {"ok": False, "reason": "", "retryable": False, "rows": 0}
+
+    def reject(reason, retryable=False):
+        result.update(reason=reason, retryable=retryable)
+        return result
+
+    size = os.path.getsize(path)
+    if size == 0:
+        return reject("empty file", retryable=True)
+
+    # Truncation: producer manifest first (O(1))
+    manifest = read_manifest(path)
+    expected_bytes = manifest.get("bytes")
+    if expected_bytes is not None and size < expected_bytes:
+        return reject(f"truncated: {size} of {expected_bytes} bytes", retryable=True)
+    if expected_bytes is not None and size > expected_bytes:
+        return reject(f"larger than manifest: {size} > {expected_bytes} bytes")
+
+    compressed = compression_of(path) is not None
+    with open_binary(path) as raw:
+        # Many producers omit the final newline, so a missing one only marks the
+        # file as truncated if its last record also turns out to be incomplete.
+        # A compressed stream can't be peeked at the end - a cut-off archive
+        # fails while decompressing instead
+        missing_newline = False
+        if not compressed:
+            raw.seek(-1, os.SEEK_END)
+            missing_newline = raw.read(1) != b"\n"
+            raw.seek(0)
+
+        text = io.TextIOWrapper(raw, encoding="utf-8-sig", errors="strict", newline="")
+        reader = csv.reader(text, strict=True)
+        try:
+            # Header: names present, unique after normalization, expected schema
+            header = next(reader, None)
+            if not header:
+                return reject("missing header")
+            mapping = header_mapping(header)
+            if any(not c for c in mapping.columns):
+                return reject(f"empty column name in header: {header}")
+            if mapping.collisions:
+                return reject(f"duplicate columns after normalization: {sorted(mapping.collisions)}")
+            if schema is not None and mapping.schema_key != schema:
+                return reject(f"schema mismatch. Expected: {schema}, Got: {mapping.schema_key}")
+
+            # Body: every record has exactly as many fields as the header
+            n_fields = len(header)
+            rows = 0
+            for record in reader:
+                if not record:
+                    continue  # blank line - skipped by the parser too
+                if len(record) != n_fields:
+                    line_num = reader.line_num
+                    if missing_newline and next(reader, None) is None:
+                        return reject(f"truncated: last record has {len(record)} of {n_fields} fields",
+                                      retryable=True)
+                    return reject(f"line {line_num}: expected {n_fields} fields, saw {len(record)}")
+                rows += 1
+        except UnicodeDecodeError as e:
+            return reject(f"encoding error near line {reader.line_num + 1}: {e.reason} (expected UTF-8)")
+        except csv.Error as e:
+            # An open quote at EOF without a final newline is a cut-off write
+            return reject(f"line {reader.line_num}: {e}", retryable=missing_newline)
+        except (EOFError, OSError) as e:
+            if not compressed:
+                raise
+            # gzip/bz2 raise EOFError on a cut-off archive, the zstd codec OSError
+            truncated = isinstance(e, EOFError) or "truncated" in str(e).lower()
+            return reject(f"{'truncated' if truncated else 'corrupt'} compressed file near line "
+                          f"{reader.line_num + 1}: {e}", retryable=truncated)
+
+    expected_rows = manifest.get("rows")
+    if expected_rows is not None and rows != expected_rows:
+        return reject(f"row count {rows} doesn't match manifest ({expected_rows})")
+
+    result.update(ok=True, rows=rows)
+    return result
+
+def quarantine(filename, reason):
+    """Copy a rejected raw file to error_files/rejected_<filename>"""
+    os.makedirs(ERROR_DIR, exist_ok=True)
+    dst = os.path.join(ERROR_DIR, f"rejected_{filename}")
+    shutil.copyfile(os.path.join(CSV_DIR, filename), dst)
+    logging.error(f"REJECTED: {filename} - {reason}\n  Saved to: {dst}")
+    return dst
 
 def validate(filename):
+    """Validate CSV_DIR/<filename>; returns the validate_file() result dict"""
     path = os.path.join(CSV_DIR, filename)
     if not os.path.exists(path):
         print(f"Missing: {path}")
-        return False
-    
-    try:
-        # Just read a few rows to validate
-        pd.read_csv(path, nrows=3)
-        print(f"Validated: {filename}")
-        logging.info(f"Validated: {filename}")
-        return True
-    except Exception as e:
-        print(f"Invalid: {e}")
-        return False
+        return {"ok": False, "reason": "missing", "retryable": True, "rows": 0}
+
+    start = time.perf_counter()
+    result = validate_file(path, expected_schema())
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if result["ok"]:
+        print(f"Validated: {filename} ({result['rows']} rows in {elapsed_ms:.1f} ms)")
+        logging.info(f"Validated: {filename} ({result['rows']} rows in {elapsed_ms:.1f} ms)")
+    else:
+        print(f"Invalid: {filename}: {result['reason']}")
+        logging.warning(f"Invalid: {filename}: {result['reason']} ({elapsed_ms:.1f} ms)")
+    return result
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         sys.exit(1)
-    
-    sys.exit(0 if validate(sys.argv[1]) else 1)
\ No newline at end of file
+
+    sys.exit(0 if validate(sys.argv[1])["ok"] else 1)
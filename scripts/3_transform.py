@@ -1,25 +1,80 @@
 # 3_transform.py
 import os
 import pandas as pd
-from local_config import CSV_DIR, STAGE_DIR, logging
+from local_config import CSV_DIR, STAGE_DIR, logging, get_null_mode, get_null_policies, get_transform_fast_path
+from csv_reader import read_csv, NULL_MARKER
+from column_names import header_mapping
+from input_files import csv_stem
+from fast_path import is_clean, stage_copy
+from pipeline_logging import verbose
 
-def transform(filename):
-    src = os.path.join(CSV_DIR, filename)
-    dst = os.path.join(STAGE_DIR, f"staged_{filename}")
+# Typed-mode null policies per column type; "null" keeps the value missing
+NULL_POLICIES = {
+    "numeric": ("null", "zero", "mean", "median"),
+    "string": ("null", "literal"),
+}
+
+def null_policies():
+    """Parse NULL_POLICIES ("numeric=zero,string=null") over the all-null defaults"""
+    policies = {kind: "null" for kind in NULL_POLICIES}
+    for item in filter(None, (i.strip() for i in get_null_policies().split(","))):
+        kind, _, policy = item.partition("=")
+        kind, policy = kind.strip(), policy.strip()
+        if policy not in NULL_POLICIES.get(kind, ()):
+            raise ValueError(f"Invalid NULL_POLICIES entry '{item}'")
+        policies[kind] = policy
+    return policies
+
+def null_fills(df, columns, policies):
+    """Fill value per column for the columns that have nulls, by column type"""
+    fills = {}
+    for col in columns:
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            policy = policies["numeric"]
+            if policy == "zero":
+                fills[col] = 0
+            elif policy == "mean":
+                fills[col] = series.mean()
+            elif policy == "median":
+                fills[col] = series.median()
+        elif policies["string"] == "literal":
+            fills[col] = "NULL"
+    # Columns without a fill value (all-null numerics included) stay missing
+    return {col: value for col, value in fills.items() if not pd.isna(value)}
+
+def transform(filename, src=None):
+    """Clean CSV_DIR/<filename> (or `src`, e.g. a tail segment of it) into STAGE_DIR"""
+    src = src or os.path.join(CSV_DIR, filename)
+    dst = os.path.join(STAGE_DIR, f"staged_{csv_stem(filename)}")
 
     print(f"\n[TRANSFORM] {filename}")
+
+    # Already clean: stage the bytes as they are (still compressed, if they were)
+    if get_transform_fast_path():
+        clean, reason = is_clean(src)
+        if clean:
+            dst += src[len(csv_stem(src)):]
+            stage_copy(src, dst)
+            print(f"  Already clean - staged as-is: {os.path.basename(dst)}")
+            print(dst)
+            logging.info(f"Transformed {filename} -> fast path, staged without parsing")
+            return dst
+        if verbose():
+            print(f"  Full transform needed: {reason}")
     
     # Read CSV
-    df = pd.read_csv(src)
+    df = read_csv(src)
     original_rows = len(df)
     original_cols = list(df.columns)
     print(f"  Input: {original_rows} rows, {len(original_cols)} columns")
-    print(f"  Original columns: {original_cols}")
+    if verbose():
+        print(f"  Original columns: {original_cols}")
 
     # Clean column names
-    df.columns = [c.strip().lower().replace(' ', '_').replace('.', '_').replace('(', '').replace(')', '') for c in df.columns]
+    df.columns = header_mapping(df.columns).columns
     cleaned_cols = list(df.columns)
-    if cleaned_cols != original_cols:
+    if cleaned_cols != original_cols and verbose():
         print(f"  Cleaned columns: {cleaned_cols}")
 
     # Drop duplicates
@@ -32,15 +87,29 @@ def transform(filename):
     # Fill missing values
     null_counts = df.isnull().sum()
     total_nulls = null_counts.sum()
+    filled_nulls = 0
     if total_nulls > 0:
         print(f"  Found {total_nulls} null values across columns")
-        for col, count in null_counts[null_counts > 0].items():
-            print(f"    - {col}: {count} nulls")
-        df = df.fillna("NULL")
-        print(f"  Filled nulls with 'NULL'")
+        if verbose():
+            for col, count in null_counts[null_counts > 0].items():
+                print(f"    - {col}: {count} nulls")
+        if get_null_mode() == "legacy":
+            df = df.fillna("NULL")
+            filled_nulls = total_nulls
+            print(f"  Filled nulls with 'NULL'")
+        else:
+            # Numeric columns stay numeric; nulls not covered by a policy are
+            # written as \N and load as real NULLs
+            fills = null_fills(df, null_counts[null_counts > 0].index, null_policies())
+            if fills:
+                df = df.fillna(fills)
+                print(f"  Filled nulls in {len(fills)} columns per NULL_POLICIES")
+            kept_nulls = int(df.isnull().sum().sum())
+            filled_nulls = total_nulls - kept_nulls
+            print(f"  Kept {kept_nulls} nulls as {NULL_MARKER}")
 
     # Save staged file
-    df.to_csv(dst, index=False)
+    df.to_csv(dst, index=False, na_rep=NULL_MARKER)
     final_rows = len(df)
     print(f"  Output: {final_rows} rows")
     print(f"  Saved to: {os.path.basename(dst)}")
@@ -48,7 +117,7 @@ def transform(filename):
     # This is what gets returned to pipeline
     print(dst)
     
-    logging.info(f"Transformed {filename} -> {final_rows} rows (removed {duplicates_removed} dupes, filled {total_nulls} nulls)")
+    logging.info(f"Transformed {filename} -> {final_rows} rows (removed {duplicates_removed} dupes, filled {filled_nulls} of {total_nulls} nulls)")
     return dst
 
 if __name__ == "__main__":
@@ -4,13 +4,29 @@ import numpy as np
 import os
 import json
 import sys
+import time
+import threading
 from datetime import datetime
 from local_config import (
     logging, get_doris_host, get_doris_port, get_doris_user, get_doris_pass, 
-    get_doris_db, TABLE_MAP_FILE, BASE_DIR
+    get_doris_db, get_doris_fe, get_doris_fe_http_port, get_doris_be_http, get_table_routing, get_load_chunk_rows,
+    get_load_mode, TABLE_MAP_FILE, ERROR_DIR
 )
+from coordination import locked, write_json_atomic, reserve_id_range
+from error_sink import ErrorSink
+from table_router import get_router
+from csv_reader import read_csv, read_table, read_header
+from column_names import header_mapping
+from load_batch import LoadBatch
+from load_progress import LoadProgress
+from load_control import LoadController, get_load_controller, record_metrics
+from quality_rules import get_quality_rules, record_counts
+from resilience import DorisConnection, DorisLoadError, with_retry
+from pipeline_logging import verbose
+from profiling import in_stage
 
-ERROR_DIR = os.path.join(BASE_DIR, "error_files")
+class SchemaMismatchError(Exception):
+    """Raised when a file's columns don't match the main table schema"""
 
 def infer_doris_type(series):
     """
@@ -132,7 +148,7 @@ def infer_doris_type(series):
     return "VARCHAR(255)"
 
 def get_columns_key(df):
-    return "|".join(sorted(df.columns))
+    return header_mapping(df.columns).schema_key
 
 def get_main_table_name():
     """Get or create the main table name for the first schema"""
@@ -151,14 +167,10 @@ def get_main_schema():
     return table_map.get("main_schema", None)
 
 def save_error_csv(df, original_filename, reason):
-    """Save mismatched data to error CSV with simple naming"""
-    os.makedirs(ERROR_DIR, exist_ok=True)
-    
-    # Simple naming: error_<filename>.csv
-    base_name = os.path.splitext(original_filename)[0]
-    error_file = os.path.join(ERROR_DIR, f"error_{base_name}.csv")
-    
-    df.to_csv(error_file, index=False)
+    """Stream mismatched data to the file's error sink"""
+    with ErrorSink(ERROR_DIR, original_filename, df.columns) as sink:
+        sink.write_rows(df.itertuples(index=False, name=None), reason="SCHEMA_MISMATCH")
+    error_file = sink.path
     
     # Log the error
     error_msg = f"SCHEMA_MISMATCH: {original_filename} - {reason}\n  Saved to: {error_file}"
@@ -167,72 +179,9 @@ def save_error_csv(df, original_filename, reason):
     
     return error_file
 
-def save_bad_rows_csv(bad_rows_df, original_filename, reason):
-    """Save rows that failed validation/conversion to error CSV"""
-    os.makedirs(ERROR_DIR, exist_ok=True)
-    
-    # Simple naming: error_<filename>.csv
-    base_name = os.path.splitext(original_filename)[0]
-    error_file = os.path.join(ERROR_DIR, f"error_{base_name}.csv")
-    
-    bad_rows_df.to_csv(error_file, index=False)
-    
-    # Log the error
-    error_msg = f"BAD_ROWS: {original_filename} - {reason}\n  Saved {len(bad_rows_df)} bad rows to: {error_file}"
-    print(f"\n[WARN] {error_msg}")
-    logging.warning(error_msg)
-    
-    return error_file
-
-def get_or_create_table(df, col_key):
-    import pymysql
-    conn = pymysql.connect(host=get_doris_host(), port=get_doris_port(),
-                           user=get_doris_user(), password=get_doris_pass(),
-                           database=get_doris_db())
-    cur = conn.cursor()
-
-    table_map = {}
-    if os.path.exists(TABLE_MAP_FILE):
-        with open(TABLE_MAP_FILE) as f:
-            table_map = json.load(f)
-
-    if col_key in table_map:
-        table_name = table_map[col_key]
-        cur.execute(f"SELECT MAX(id) FROM `{table_name}`")
-        max_id = cur.fetchone()[0] or 0
-        cur.close(); conn.close()
-        return table_name, max_id
-
-    table_name = f"tbl_{len(table_map)+1}"
-    df = df.copy()
-    df.insert(0, 'id', range(1, len(df) + 1))
-
-    # NO PRIMARY KEY — DUPLICATE KEY MODEL
-    cols = [f"`id` BIGINT NOT NULL"] + \
-           [f"`{c}` VARCHAR(65533)" for c in df.columns[1:]]
-    col_defs = ",\n    ".join(cols)
-
-    sql = f"""
-    CREATE TABLE IF NOT EXISTS `{table_name}` (
-        {col_defs}
-    )
-    DUPLICATE KEY(`id`)
-    DISTRIBUTED BY HASH(`id`) BUCKETS 3
-    PROPERTIES ("replication_num" = "1");
-    """
-    print(f"Creating table `{table_name}`...")
-    cur.execute(sql)
-    conn.commit()
-
-    table_map[col_key] = table_name
-    with open(TABLE_MAP_FILE, "w") as f:
-        json.dump(table_map, f)
-
-    cur.close(); conn.close()
-    return table_name, 0
-
 def check_fe_api(timeout=3):
     """Quick GET to FE root or /api to verify connectivity."""
+    import requests
     health_url = f"{get_doris_fe()}/api"
     try:
         r = requests.get(health_url, auth=(get_doris_user(), get_doris_pass()), timeout=timeout)
@@ -240,191 +189,342 @@ def check_fe_api(timeout=3):
     except Exception:
         return False
 
-def stream_load_to_doris(file_path, table_name, timeout=300):
+def stream_load_target(url, auth, timeout=30):
+    """
+    The BE URL that takes a Stream Load body. The FE answers _stream_load with
+    a 307 to a BE; requests can't replay a body on a redirect (and drops the
+    credentials when the host changes), so the redirect is resolved first with
+    a bodiless, unlabelled PUT. DORIS_BE_HTTP skips the FE altogether.
+    """
+    import requests
+    from urllib.parse import urlsplit
+    be_http = get_doris_be_http()
+    if be_http:
+        return f"http://{be_http}{urlsplit(url).path}"
+    response = requests.put(url, data=b"", auth=auth, headers={"Expect": "100-continue"},
+                            timeout=timeout, allow_redirects=False)
+    if response.is_redirect and response.headers.get("Location"):
+        return response.headers["Location"]
+    raise RuntimeError(f"Stream Load: FE did not redirect to a BE: HTTP {response.status_code} {response.text[:200]}")
+
+def stream_load_to_doris(source, table_name, timeout=300, label=None, attempts=None, two_phase_commit=False,
+                         on_retry=None):
+    """
+    Stream Load a plain CSV file, or a LoadBatch serialized from its column buffers.
+    With `two_phase_commit` the load is only pre-committed (commit it with
+    transactions.finish); an existing label is returned for the caller to resolve.
+    `on_retry(exc)` sees every failed attempt that is retried.
+    The body goes straight to a BE (stream_load_target), so the BE's HTTP
+    port has to be reachable from the pipeline.
+    """
+    import requests
     doris_host = get_doris_host()
     doris_http_port = get_doris_fe_http_port()
     doris_db = get_doris_db()
     url = f"http://{doris_host}:{doris_http_port}/api/{doris_db}/{table_name}/_stream_load"
     auth = (get_doris_user(), get_doris_pass())
+    columns = source.columns if isinstance(source, LoadBatch) else read_header(source)
     headers = {
-        "Expect": "100-continue",
         "column_separator": ",",
-        "columns": ",".join([f"`{c}`" for c in pd.read_csv(file_path, nrows=0).columns]),
+        "columns": header_mapping(columns).columns_header,
         "format": "csv",
         "strip_outer_array": "true"
     }
 
-    print(f"Stream loading → `{table_name}` … to URL: {url}")
-    with open(file_path, 'rb') as f:
-        response = requests.put(url, data=f, auth=auth, headers=headers, timeout=timeout)
+    if label:
+        # Same label on every retry - Doris won't commit the same load twice
+        headers["label"] = label
+    if two_phase_commit:
+        headers["two_phase_commit"] = "true"
+    if isinstance(source, LoadBatch):
+        # Body serialized from the buffers; no header row, NULL as \N
+        headers.update({"enclose": '"', "escape": '"'})
+
+    def attempt():
+        # The body is rebuilt per attempt - a file can't be replayed. A batch
+        # (one chunk of a load) goes as bytes, so the request has a length
+        target = stream_load_target(url, auth)
+        if isinstance(source, LoadBatch):
+            body = b"".join(source.csv_chunks(get_load_chunk_rows()))
+            response = requests.put(target, data=body, auth=auth, headers=headers, timeout=timeout,
+                                    allow_redirects=False)
+        else:
+            with open(source, 'rb') as f:
+                response = requests.put(target, data=f, auth=auth, headers=headers, timeout=timeout,
+                                        allow_redirects=False)
 
-    if response.status_code != 200:
-        print(f"Stream Load FAILED: {response.status_code} {response.text}")
-        raise RuntimeError(f"Stream Load failed: {response.text}")
+        if response.status_code != 200:
+            print(f"Stream Load FAILED: {response.status_code} {response.text}")
+            raise DorisLoadError(f"Stream Load failed: HTTP {response.status_code} {response.text}",
+                                 http_status=response.status_code)
 
-    result = response.json()
-    if result.get("Status") != "Success":
-        print(f"Stream Load FAILED: {result}")
-        raise RuntimeError(f"Stream Load failed: {result}")
+        result = response.json()
+        if result.get("Status") == "Label Already Exists" and two_phase_commit:
+            return result
+        if result.get("Status") == "Label Already Exists" and result.get("ExistingJobStatus") == "FINISHED":
+            logging.info(f"Stream Load {label} was already committed")
+            return result
+        if result.get("Status") != "Success":
+            print(f"Stream Load FAILED: {result}")
+            raise DorisLoadError(f"Stream Load failed: {result.get('Status')}: {result.get('Message')}",
+                                 status=result.get("Status"))
+        return result
 
-    return result
+    print(f"Stream loading → `{table_name}` … to URL: {url}")
+    return with_retry(attempt, description=f"Stream Load into {table_name}", attempts=attempts, on_retry=on_retry)
 
-def load_file(staged_path, original_filename=None):
-    df = pd.read_csv(staged_path)
+def create_table(db, table_name, df, original_filename=None):
+    """Create `table_name` with column types inferred from `df`"""
+    df_temp = df.copy()
+    df_temp.insert(0, 'id', range(1, len(df_temp) + 1))
     
-    # Get the main table and schema
-    main_table = get_main_table_name()
-    main_schema = get_main_schema()
-    current_schema = get_columns_key(df)
-    
-    # First file - create main table
-    if main_table is None:
-        print("[NEW] First file - creating main table...")
-        table_name = "main_data_table"
-        last_id = 0
-        
-        # Save to table map
-        table_map = {
-            "main_table": table_name,
-            "main_schema": current_schema
-        }
-        with open(TABLE_MAP_FILE, "w") as f:
-            json.dump(table_map, f, indent=2)
-        
-        # Create table
-        import pymysql
-        conn = pymysql.connect(
-            host=get_doris_host(), port=get_doris_port(),
-            user=get_doris_user(), password=get_doris_pass(),
-            database=get_doris_db()
-        )
-        cur = conn.cursor()
-        
-        df_temp = df.copy()
-        df_temp.insert(0, 'id', range(1, len(df_temp) + 1))
+    # Intelligently detect column types with detailed logging
+    print(f"\n[SCHEMA] Schema Detection for: {original_filename or 'unknown.csv'}")
+    print(f"  Total rows: {len(df)}")
+    print(f"  Columns: {len(df.columns)}")
+    print(f"\n  Column Type Analysis:")
+    cols = [f"`id` BIGINT NOT NULL"]
+    for col in df_temp.columns[1:]:
+        col_type = infer_doris_type(df_temp[col])
+        cols.append(f"`{col}` {col_type}")
         
-        # Intelligently detect column types with detailed logging
-        print(f"\n[SCHEMA] Schema Detection for: {original_filename or 'unknown.csv'}")
-        print(f"  Total rows: {len(df)}")
-        print(f"  Columns: {len(df.columns)}")
-        print(f"\n  Column Type Analysis:")
-        cols = [f"`id` BIGINT NOT NULL"]
-        for col in df_temp.columns[1:]:
-            col_type = infer_doris_type(df_temp[col])
-            cols.append(f"`{col}` {col_type}")
-            
-            # Show sample values and detection logic
+        # Show sample values and detection logic (LOG_LEVEL=DEBUG)
+        if verbose():
             sample_vals = df_temp[col].head(3).tolist()
             print(f"    - {col:20s} -> {col_type:15s} (samples: {sample_vals})")
-        
-        col_defs = ",\n    ".join(cols)
-        
-        sql = f"""
-        CREATE TABLE IF NOT EXISTS `{table_name}` (
-            {col_defs}
+    
+    col_defs = ",\n    ".join(cols)
+    
+    sql = f"""
+    CREATE TABLE IF NOT EXISTS `{table_name}` (
+        {col_defs}
+    )
+    DUPLICATE KEY(`id`)
+    DISTRIBUTED BY HASH(`id`) BUCKETS 3
+    PROPERTIES ("replication_num" = "1");
+    """
+    print(f"Creating table `{table_name}`...")
+    db.execute(sql, description=f"CREATE TABLE {table_name}")
+
+def insert_chunk(db, table_name, column_names, label, values_sql, on_retry=None):
+    """INSERT one labelled chunk; a label Doris already committed counts as loaded"""
+    sql = f"INSERT INTO `{table_name}` WITH LABEL {label} ({column_names}) VALUES {values_sql}"
+    try:
+        db.execute(sql, description=f"INSERT {label}", on_retry=on_retry)
+    except Exception as e:
+        if "already" in str(e).lower() and "label" in str(e).lower():
+            logging.info(f"Chunk {label} was already committed, skipping")
+            return
+        raise
+
+def load_chunks(batch, progress, controller, send):
+    """
+    Call send(start, stop) for row ranges covering the batch, up to the
+    controller's in-flight limit at once. Ranges sent by an earlier attempt
+    and never acknowledged go first with their original boundaries; new
+    ranges are cut at the controller's current chunk size and recorded
+    before they are sent. Unless the controller keeps chunk boundaries
+    fixed (2pc labels), a chunk rejected for memory is split in two and
+    sent again; any other error stops new chunks, lets the ones in flight
+    finish and is raised.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    total = len(batch)
+    row_bytes = batch.nbytes / max(total, 1)
+    replay = progress.unacknowledged()
+    cursor = progress.next_start()
+    in_flight = {}
+    failure = None
+
+    # Profiled (PROFILE=1) as part of the calling thread's load stage
+    @in_stage
+    def run(start, stop):
+        try:
+            started = time.monotonic()
+            send(start, stop)
+            controller.observe(stop - start, started, time.monotonic())
+        finally:
+            controller.release()
+
+    with ThreadPoolExecutor(max_workers=controller.max_concurrency, thread_name_prefix="load") as pool:
+        while in_flight or (failure is None and (replay or cursor < total)):
+            # Fill the free slots; wait for one only when nothing of ours is in flight
+            # (the slots are shared with the other loads into this table)
+            while failure is None and (replay or cursor < total) and controller.acquire(block=not in_flight):
+                if replay:
+                    start, stop = replay.pop(0)
+                else:
+                    start, stop = cursor, min(total, cursor + controller.chunk_size(row_bytes))
+                    cursor = stop
+                    progress.plan(start, stop)
+                in_flight[pool.submit(run, start, stop)] = (start, stop)
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                start, stop = in_flight.pop(future)
+                error = future.exception()
+                if error is None:
+                    progress.mark_done(start, stop)
+                elif controller.observe_error(error) == "memory" and failure is None and stop - start > 1 \
+                        and not controller.fixed_chunks:
+                    # Rejected outright - nothing committed under this label
+                    middle = (start + stop) // 2
+                    logging.warning(f"Chunk {start}-{stop} of {progress.filename} hit a memory limit, splitting it")
+                    progress.unplan(start, stop)
+                    progress.plan(start, middle)
+                    progress.plan(middle, stop)
+                    replay[:0] = [(start, middle), (middle, stop)]
+                elif failure is None:
+                    failure = error
+    if failure is not None:
+        raise failure
+
+def send_insert(table_name, batch, progress, controller):
+    """
+    send() for load_chunks: a labelled multi-row INSERT serialized from the
+    buffers, one Doris connection per loading thread. Returns (send, close)
+    """
+    column_names = ", ".join([f"`{c}`" for c in batch.columns])
+    local = threading.local()
+    connections = []
+
+    def send(start, stop):
+        db = getattr(local, "db", None)
+        if db is None:
+            db = local.db = DorisConnection()
+            connections.append(db)
+        insert_chunk(db, table_name, column_names, progress.label(start, stop),
+                     batch.sql_values(start, stop, db.escape_string), on_retry=controller.observe_error)
+
+    def close():
+        for db in connections:
+            db.close()
+    return send, close
+
+def send_2pc(table_name, batch, progress, controller, digest):
+    """
+    send() for load_chunks in LOAD_MODE=2pc: Stream Load the chunk
+    pre-committed, journal its txn id, then commit - chunks an earlier
+    attempt got through are not loaded twice
+    """
+    import transactions
+
+    def send(start, stop):
+        label = transactions.txn_label(table_name, digest, start, stop)
+        result = stream_load_to_doris(batch.slice(start, stop), table_name, timeout=controller.request_timeout(),
+                                      label=label, two_phase_commit=True, on_retry=controller.observe_error)
+        txn_id = result.get("TxnId")
+        if result.get("Status") == "Label Already Exists":
+            state = transactions.load_state(label)
+            if state in transactions.DONE_STATES:
+                logging.info(f"Stream Load {label} was already committed")
+                return
+            if state != "PRECOMMITTED":
+                raise RuntimeError(f"Stream Load {label} exists in state {state}")
+            # Pre-committed by an attempt that died before journaling it
+            txn_id = None
+        transactions.journal(label, txn_id, table_name, progress.filename, stop - start)
+        transactions.finish(label, txn_id)
+        transactions.forget(label)
+    return send
+
+def load_file(staged_path, original_filename=None, chunk_rows=None):
+    # Route on the header alone - the full parse waits until the target
+    # table's column types are known. Staged headers are already normalized,
+    # and their schema key comes from the per-header mapping cache
+    file_columns = read_header(staged_path)
+    
+    # Route the file to its target table - under the table map lock so
+    # parallel shards agree on new table assignments
+    current_schema = header_mapping(file_columns).schema_key
+    router = get_router()
+    expected_schema = None
+    with locked(TABLE_MAP_FILE):
+        table_name, match = router.route(file_columns, key=current_schema)
+        main_table = get_main_table_name()
+        if get_table_routing() == "single" and main_table is not None and \
+                (table_name, match) != (main_table, "exact"):
+            # Legacy mode: everything must match the main table exactly
+            expected_schema = get_main_schema()
+        elif table_name is None:
+            table_name = router.register(file_columns)
+            match = "new"
+    
+    # Schema mismatch - save to error CSV
+    if expected_schema is not None:
+        df = read_csv(staged_path)
+        error_file = save_error_csv(
+            df, 
+            original_filename or "unknown.csv",
+            f"Schema mismatch. Expected: {expected_schema}, Got: {current_schema}"
         )
-        DUPLICATE KEY(`id`)
-        DISTRIBUTED BY HASH(`id`) BUCKETS 3
-        PROPERTIES ("replication_num" = "1");
-        """
-        print(f"Creating table `{table_name}`...")
-        cur.execute(sql)
-        conn.commit()
-        cur.close()
-        conn.close()
+        print(f"\n[ERR] SCHEMA_MISMATCH")
+        raise SchemaMismatchError(f"Schema mismatch for {original_filename or 'unknown.csv'}, saved to {error_file}")
+    
+    # Every Doris call below retries transient errors (reconnecting if needed)
+    db = DorisConnection()
+    
+    # New schema - create its table
+    if match == "new":
+        if table_name == main_table or main_table is None:
+            print("[NEW] First file - creating main table...")
+        else:
+            print(f"[NEW] New schema - routing {original_filename or 'unknown.csv'} to new table `{table_name}`...")
+        last_id = 0
+        df = read_csv(staged_path)
+        create_table(db, table_name, df, original_filename)
         
-    # Subsequent files - check schema
+    # Known schema - get last ID, check if table exists first
     else:
-        table_name = main_table
-        
-        # Schema mismatch - save to error CSV
-        if current_schema != main_schema:
-            error_file = save_error_csv(
-                df, 
-                original_filename or "unknown.csv",
-                f"Schema mismatch. Expected: {main_schema}, Got: {current_schema}"
-            )
-            print(f"\n[ERR] SCHEMA_MISMATCH")
-            sys.exit(1)  # Exit with error code
-        
-        # Get last ID - check if table exists first
-        import pymysql
-        conn = pymysql.connect(
-            host=get_doris_host(), port=get_doris_port(),
-            user=get_doris_user(), password=get_doris_pass(),
-            database=get_doris_db()
-        )
-        cur = conn.cursor()
+        if match == "subset":
+            print(f"[ROUTE] Columns are a subset of `{table_name}` - missing columns load as NULL")
         
         # Check if table exists
-        cur.execute("SHOW TABLES")
-        existing_tables = [row[0] for row in cur.fetchall()]
+        existing_tables = [row[0] for row in db.execute("SHOW TABLES")]
         
         if table_name not in existing_tables:
             # Table in map but doesn't exist in DB - recreate it
             print(f"[WARN] Table '{table_name}' not found in database, recreating...")
             last_id = 0
-            
-            # Create table with schema detection
-            df_temp = df.copy()
-            df_temp.insert(0, 'id', range(1, len(df_temp) + 1))
-            
-            print(f"\n[SCHEMA] Schema Detection for: {original_filename or 'unknown.csv'}")
-            print(f"  Total rows: {len(df)}")
-            print(f"  Columns: {len(df.columns)}")
-            print(f"\n  Column Type Analysis:")
-            cols = [f"`id` BIGINT NOT NULL"]
-            for col in df_temp.columns[1:]:
-                col_type = infer_doris_type(df_temp[col])
-                cols.append(f"`{col}` {col_type}")
-                sample_vals = df_temp[col].head(3).tolist()
-                print(f"    - {col:20s} -> {col_type:15s} (samples: {sample_vals})")
-            
-            col_defs = ",\n    ".join(cols)
-            
-            sql = f"""
-            CREATE TABLE IF NOT EXISTS `{table_name}` (
-                {col_defs}
-            )
-            DUPLICATE KEY(`id`)
-            DISTRIBUTED BY HASH(`id`) BUCKETS 3
-            PROPERTIES ("replication_num" = "1");
-            """
-            print(f"Creating table `{table_name}`...")
-            cur.execute(sql)
-            conn.commit()
+            df = read_csv(staged_path)
+            create_table(db, table_name, df, original_filename)
         else:
             # Table exists - get last ID
-            cur.execute(f"SELECT MAX(id) FROM `{table_name}`")
-            last_id = cur.fetchone()[0] or 0
-        
-        cur.close()
-        conn.close()
+            last_id = db.execute(f"SELECT MAX(id) FROM `{table_name}`")[0][0] or 0
+            
+            # Parse with the table's column types (falls back to inference on bad values),
+            # into an Arrow table the batch converts column by column
+            doris_types = {row[0]: row[1] for row in db.execute(f"DESC `{table_name}`") if row[0] in file_columns}
+            df = read_table(staged_path, doris_types=doris_types)
     
-    # ALWAYS add IDs (starting from last_id + 1)
-    df.insert(0, 'id', range(last_id + 1, last_id + 1 + len(df)))
+    # Resume an interrupted load of this staged file: same ids, acknowledged
+    # chunks skipped. A stale record's rows are removed before starting over
+    progress = LoadProgress(original_filename or os.path.basename(staged_path), staged_path, table_name)
+    resumed = progress.check(len(df))
+    if progress.stale is not None:
+        stale = progress.stale
+        print(f"[WARN] Removing {stale['rows']} rows of an interrupted earlier load from `{stale['table']}`")
+        db.execute(f"DELETE FROM `{stale['table']}` WHERE id >= {stale['first_id']} "
+                   f"AND id < {stale['first_id'] + stale['rows']}")
+        progress.finish()
+    
+    # ALWAYS add IDs - reserved from the shared counter (never below last_id + 1)
+    # so concurrent shards loading into the same table get disjoint ranges
+    if resumed:
+        first_id = progress.first_id
+        print(f"[RESUME] {progress.done_count()} chunks already loaded")
+    else:
+        first_id = reserve_id_range(table_name, len(df), last_id)
+        progress.start(first_id, len(df))
     
     # Use MySQL INSERT with row-level error handling
     print(f"\n[LOAD] Loading Data to Doris:")
     print(f"  Table: {table_name}")
     print(f"  Total rows: {len(df)}")
     
-    import pymysql
-    import math
-    
-    conn = pymysql.connect(
-        host=get_doris_host(), 
-        port=get_doris_port(),
-        user=get_doris_user(), 
-        password=get_doris_pass(),
-        database=get_doris_db()
-    )
-    cursor = conn.cursor()
-    
     try:
         # Get column types from table schema
-        cursor.execute(f"DESC `{table_name}`")
-        schema_info = cursor.fetchall()
+        schema_info = db.execute(f"DESC `{table_name}`")
         column_types = {}
         for row in schema_info:
             col_name = row[0]
@@ -433,120 +533,115 @@ def load_file(staged_path, original_filename=None):
         
         print(f"  Table schema loaded: {len(column_types)} columns")
         
-        # Build INSERT statement
-        columns = list(df.columns)
-        placeholders = ", ".join(["%s"] * len(columns))
-        column_names = ", ".join([f"`{c}`" for c in columns])
-        insert_sql = f"INSERT INTO `{table_name}` ({column_names}) VALUES ({placeholders})"
-        
+        # Validate column-wise into typed buffers - no per-row Python tuples.
+        # Rejected rows stream straight to the error sink
         print(f"  Validating rows against schema...")
+        batch, rejects = LoadBatch.from_frame(df, column_types)
+        del df
+        # Row i of the file gets id first_id + i, rejected rows leave their id unused
+        batch.insert_column(0, "id", first_id + batch.row_numbers - 2)
         
-        # Convert dataframe to list of tuples with TYPE validation
-        data = []
-        bad_rows_indices = []
-        bad_row_details = []
+        # Declarative quality rules (quality_rules.json) - vectorized masks over the buffers
+        quality = get_quality_rules().check(table_name, batch)
+        for rule_name, count in quality.counts.items():
+            if count:
+                print(f"  [WARN] Quality rule '{rule_name}': {count} rows")
+        if quality.counts:
+            logging.info(f"Quality rules on {original_filename or staged_path} → {table_name}: {quality.counts}")
+        record_counts(table_name, quality.counts)
+        rule_rejects = np.flatnonzero(quality.rejected)
         
-        for idx, row in enumerate(df.itertuples(index=False)):
-            try:
-                cleaned_row = []
-                is_valid_row = True
-                error_msg = ""
-                
-                for col_idx, (col_name, value) in enumerate(zip(columns, row)):
-                    # Handle NULL/NaN
-                    if pd.isna(value) or (isinstance(value, float) and math.isnan(value)):
-                        cleaned_row.append(None)
-                        continue
-                    
-                    # Get expected type for this column
-                    expected_type = column_types.get(col_name, "VARCHAR")
-                    
-                    # Validate based on column type
-                    if "TINYINT" in expected_type or "SMALLINT" in expected_type or "INT" in expected_type or "BIGINT" in expected_type:
-                        # Must be a valid integer
-                        try:
-                            int_val = int(float(str(value).strip()))
-                            cleaned_row.append(int_val)
-                        except (ValueError, TypeError):
-                            is_valid_row = False
-                            error_msg = f"Column '{col_name}' expects INT, got '{value}'"
-                            break
-                    
-                    elif "DOUBLE" in expected_type or "FLOAT" in expected_type or "DECIMAL" in expected_type:
-                        # Must be a valid number
-                        try:
-                            float_val = float(str(value).strip())
-                            cleaned_row.append(float_val)
-                        except (ValueError, TypeError):
-                            is_valid_row = False
-                            error_msg = f"Column '{col_name}' expects FLOAT, got '{value}'"
-                            break
-                    
-                    elif "DATETIME" in expected_type or "DATE" in expected_type:
-                        # Must be a valid date/datetime
-                        try:
-                            pd.to_datetime(value)
-                            cleaned_row.append(value)
-                        except:
-                            is_valid_row = False
-                            error_msg = f"Column '{col_name}' expects DATE, got '{value}'"
-                            break
-                    
-                    else:
-                        # VARCHAR/STRING - accept anything
-                        cleaned_row.append(value)
-                
-                # Add row if valid, otherwise track as bad
-                if is_valid_row:
-                    data.append(tuple(cleaned_row))
-                else:
-                    bad_rows_indices.append(idx)
-                    bad_row_details.append(f"Row {idx+2}: {error_msg}")
-                    if len(bad_row_details) <= 5:  # Show first 5 errors
-                        print(f"    [WARN] Row {idx+2} invalid: {error_msg}")
-                        
-            except Exception as e:
-                # Track rows that failed conversion
-                bad_rows_indices.append(idx)
-                bad_row_details.append(f"Row {idx+2}: {str(e)[:50]}")
-                if len(bad_row_details) <= 5:  # Show first 5 errors
-                    print(f"    [WARN] Row {idx+2} failed: {e}")
+        type_rejects = len(rejects)
+        bad_count = type_rejects + len(rule_rejects)
+        error_file = None
+        if bad_count:
+            error_sink = ErrorSink(ERROR_DIR, original_filename or "unknown.csv", batch.columns[1:])
+            if progress.rejects_written:
+                # A resumed load: the interrupted attempt already saved these rows
+                print("  [INFO] Bad rows were saved by the interrupted attempt, not written again")
+            else:
+                with error_sink:
+                    for values, reason in zip(rejects.records(), rejects.reasons()):
+                        error_sink.write(values, *reason)
+                    for values, row_number, rule_idx in zip(batch.records(rule_rejects),
+                                                            batch.row_numbers[rule_rejects], quality.rule[rule_rejects]):
+                        rule = quality.rules[rule_idx]
+                        error_sink.write(values[1:], row_number, rule.column, rule.reason())
+                progress.mark_rejects_written()
+            error_file = error_sink.path
+            for row_number, _, reason in rejects.reasons(limit=5):  # Show first 5 errors
+                print(f"    [WARN] Row {row_number} invalid: {reason}")
+        del rejects
+        if len(rule_rejects):
+            batch = batch.filter(~quality.rejected)
         
-        # If there are bad rows, save them to error file
-        if bad_rows_indices:
-            print(f"\n  [ERR] Found {len(bad_rows_indices)} bad rows!")
-            bad_rows_df = df.iloc[bad_rows_indices].copy()
-            bad_rows_df.drop('id', axis=1, inplace=True, errors='ignore')  # Remove auto-generated ID
-            error_file = save_bad_rows_csv(
-                bad_rows_df, 
-                original_filename or "unknown.csv",
-                f"{len(bad_rows_indices)} rows failed data type validation"
-            )
+        # If there are bad rows, they are already in the error file
+        if bad_count:
+            print(f"\n  [ERR] Found {bad_count} bad rows!")
+            error_msg = f"BAD_ROWS: {original_filename or 'unknown.csv'} - {type_rejects} rows failed data type validation, {len(rule_rejects)} failed quality rules\n  Saved {bad_count} bad rows to: {error_file}"
+            print(f"\n[WARN] {error_msg}")
+            logging.warning(error_msg)
             print(f"  [INFO] Bad rows saved to: {os.path.basename(error_file)}")
-            print(f"  [OK]   Proceeding with {len(data)} valid rows")
+            print(f"  [OK]   Proceeding with {len(batch)} valid rows")
         else:
-            print(f"  [OK]   All {len(data)} rows valid")
+            print(f"  [OK]   All {len(batch)} rows valid")
         
-        # Execute batch insert only for good rows
-        if data:
-            print(f"  Inserting {len(data)} rows to database...")
-            cursor.executemany(insert_sql, data)
-            conn.commit()
+        # Multi-row INSERTs serialized chunk by chunk straight from the buffers,
+        # or two-phase Stream Loads of the same chunks. An explicit chunk_rows
+        # (coalesced groups: one INSERT) is fixed; otherwise the table's
+        # controller sizes the chunks and how many are in flight
+        if chunk_rows:
+            controller = LoadController(table_name, chunk_rows, adaptive=False,
+                                        fixed_chunks=get_load_mode() == "2pc")
+        else:
+            controller = get_load_controller(table_name)
+        tuning = None
+        if len(batch):
+            started = time.monotonic()
+            if get_load_mode() == "2pc":
+                from transactions import load_digest
+                digest = load_digest(progress.filename, staged_path)
+                print(f"  Stream loading {len(batch)} rows with two-phase commit (labels {table_name}_{digest}_*)...")
+                load_chunks(batch, progress, controller, send_2pc(table_name, batch, progress, controller, digest))
+                method = "Stream Load (2PC)"
+            else:
+                print(f"  Inserting {len(batch)} rows to database ({batch.nbytes / 1024 / 1024:.1f} MB in column buffers)...")
+                send, close = send_insert(table_name, batch, progress, controller)
+                try:
+                    load_chunks(batch, progress, controller, send)
+                finally:
+                    close()
+                method = "MySQL INSERT"
+            seconds = time.monotonic() - started
+            tuning = controller.snapshot()
+            if controller.adaptive:
+                record_metrics(table_name)
+                print(f"  Adaptive load: {tuning['chunk_rows']} rows/chunk x {tuning['concurrency']} in flight, "
+                      f"{len(batch) / max(seconds, 1e-6):,.0f} rows/s")
             
-            print(f"\n[OK]   Successfully loaded {len(data)} rows into `{table_name}`")
-            if bad_rows_indices:
-                print(f"[WARN] Skipped {len(bad_rows_indices)} bad rows (saved to error file)")
-            logging.info(f"MySQL INSERT loaded {staged_path} → {table_name}, {len(data)} rows ({len(bad_rows_indices)} rows skipped)")
+            print(f"\n[OK]   Successfully loaded {len(batch)} rows into `{table_name}`")
+            if bad_count:
+                print(f"[WARN] Skipped {bad_count} bad rows (saved to error file)")
+            logging.info(f"{method} loaded {staged_path} → {table_name}, {len(batch)} rows ({bad_count} rows skipped)")
         else:
             print(f"\n[ERR]  No valid rows to load!")
             logging.error(f"All rows failed validation in {staged_path}")
         
+        progress.finish()
+        return {
+            "table": table_name,
+            "first_id": first_id,
+            "loaded_rows": len(batch),
+            "bad_rows": bad_count,
+            "quality": quality.counts,
+            "tuning": tuning,
+        }
+        
     except Exception as e:
         print(f"\n[ERR] MySQL INSERT failed: {e}")
         raise
     finally:
-        cursor.close()
-        conn.close()
+        db.close()
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
@@ -556,4 +651,7 @@ if __name__ == "__main__":
     staged_path = sys.argv[1]
     original_filename = sys.argv[2] if len(sys.argv) > 2 else None
     
-    load_file(staged_path, original_filename)
+    try:
+        load_file(staged_path, original_filename)
+    except SchemaMismatchError:
+        sys.exit(1)  # Exit with error code
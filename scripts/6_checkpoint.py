@@ -1,12 +1,70 @@
 # 6_checkpoint.py
-from local_config import CHECKPOINT_FILE, logging
+import os
+from local_config import CHECKPOINT_FILE, CHECKPOINT_SHARD_DIR, logging
+from coordination import locked
+from file_registry import record_done
 
-def mark_done(filename):
-    with open(CHECKPOINT_FILE, "a") as f:
-        f.write(filename + "\n")
+def shard_checkpoint_file(shard_id):
+    """Per-shard checkpoint so parallel pods never append to the same file"""
+    os.makedirs(CHECKPOINT_SHARD_DIR, exist_ok=True)
+    return os.path.join(CHECKPOINT_SHARD_DIR, f"shard_{shard_id}.txt")
+
+def mark_done(filename, checkpoint_file=CHECKPOINT_FILE):
+    with locked(checkpoint_file):
+        with open(checkpoint_file, "a") as f:
+            f.write(filename + "\n")
+    # Remember the content too, so a re-delivery with new content is picked up
+    record_done(filename)
     print(f"Checkpoint: {filename}")
     logging.info(f"Checkpoint: {filename}")
 
+def mark_done_many(filenames, checkpoint_file=CHECKPOINT_FILE):
+    """Checkpoint a group of files loaded together - one locked write, all or nothing"""
+    with locked(checkpoint_file):
+        with open(checkpoint_file, "a") as f:
+            f.write("".join(name + "\n" for name in filenames))
+            f.flush()
+            os.fsync(f.fileno())
+    record_done(*filenames)
+    print(f"Checkpoint: {', '.join(filenames)}")
+    logging.info(f"Checkpoint: {len(filenames)} files ({', '.join(filenames)})")
+
+def consolidate_checkpoints():
+    """Fold all shard checkpoints into checkpoint.txt, then remove them"""
+    if not os.path.isdir(CHECKPOINT_SHARD_DIR):
+        return 0
+    shard_files = sorted(
+        os.path.join(CHECKPOINT_SHARD_DIR, f) for f in os.listdir(CHECKPOINT_SHARD_DIR)
+        if f.startswith("shard_") and f.endswith(".txt")
+    )
+    added = 0
+    with locked(CHECKPOINT_FILE):
+        done = set()
+        if os.path.exists(CHECKPOINT_FILE):
+            with open(CHECKPOINT_FILE) as f:
+                done = {line.strip() for line in f if line.strip()}
+        with open(CHECKPOINT_FILE, "a") as out:
+            for shard_file in shard_files:
+                # Lock the shard too, in case its pod is still appending;
+                # its lock file goes while we hold it, never from under a holder
+                with locked(shard_file, remove=True):
+                    with open(shard_file) as f:
+                        names = [line.strip() for line in f if line.strip()]
+                    for name in names:
+                        if name not in done:
+                            out.write(name + "\n")
+                            done.add(name)
+                            added += 1
+                    out.flush()
+                    os.fsync(out.fileno())
+                    os.remove(shard_file)
+    print(f"Consolidated {len(shard_files)} shard checkpoints ({added} files)")
+    logging.info(f"Consolidated {len(shard_files)} shard checkpoints ({added} files)")
+    return added
+
 if __name__ == "__main__":
     import sys
-    mark_done(sys.argv[1])
\ No newline at end of file
+    if sys.argv[1:] == ["--consolidate"]:
+        consolidate_checkpoints()
+    else:
+        mark_done(sys.argv[1])
@@ -0,0 +1,154 @@
+# async_pipeline.py
+"""
+Overlapping variant of the batch run, for backlogs where loading is network-bound.
+
+The sequential run waits on every Doris round trip while the next file's
+transform sits idle. Here the stages overlap. asyncio only schedules the
+work; it is not async I/O. Every Doris call (pymysql, requests) is a
+blocking call in a worker thread, and no async HTTP or MySQL client is used:
+  - validate + transform run in a process pool (TRANSFORM_WORKERS), so the
+    CPU-bound pandas work never shares the event loop's GIL
+  - up to LOAD_CONCURRENCY loads are in flight at once, each in one of
+    LOAD_CONCURRENCY threads - pymysql and requests block, but release the
+    GIL while they wait on the socket
+  - a bounded queue between the two gives backpressure: at most
+    TRANSFORM_WORKERS + LOAD_CONCURRENCY files are staged or being staged
+    ahead of the loads, so a slow Doris doesn't fill the stage directory
+
+Table routing, id reservation and checkpoints already go through fcntl
+locks, and every file is leased before it is prepared, so concurrent loads
+in one process coordinate the same way parallel shard pods and overlapping
+runs do.
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from local_config import CHECKPOINT_FILE, get_load_concurrency, get_transform_workers
+from pipeline_steps import log_step, load_stage
+from pipeline_logging import log_context
+
+def prepare_file(filename):
+    """Validate and transform one file (runs in a pool process). Returns (status, staged, reason)"""
+    validator = load_stage("2_validate")
+    with log_context(file=filename, stage="validate"):
+        validation = validator.validate(filename)
+        if not validation["ok"]:
+            if validation["retryable"]:
+                return "retry", None, validation["reason"]
+            validator.quarantine(filename, validation["reason"])
+            return "rejected", None, validation["reason"]
+    # An interrupted load resumes from its staged file - no second transform
+    from load_progress import resumable_stage
+    staged = resumable_stage(filename)
+    if staged is None:
+        with log_context(file=filename, stage="transform"):
+            staged = load_stage("3_transform").transform(filename)
+    return "staged", staged, ""
+
+def claim_file(filename):
+    """The lease on `filename`, or None if another run has it or loaded it meanwhile"""
+    from coordination import Lease
+    from discover_next_1 import is_pending
+    lease = Lease(filename)
+    if not lease.acquire():
+        return None
+    if not is_pending(filename):
+        lease.release()
+        return None
+    return lease
+
+def leased(fn, lease):
+    """Wrap `fn` to check `lease` right before it runs, like process_file before load and checkpoint"""
+    def run(*args):
+        lease.check()
+        return fn(*args)
+    return run
+
+def in_context(fn, filename, stage):
+    """Wrap `fn` so records it logs in an executor thread carry file/stage"""
+    def run(*args):
+        with log_context(file=filename, stage=stage):
+            return fn(*args)
+    return run
+
+async def _run(files, concurrency, workers, checkpoint_file):
+    loop = asyncio.get_running_loop()
+    loader = load_stage("4_load_to_doris")
+    mark_done = load_stage("6_checkpoint").mark_done
+    staged_queue = asyncio.Queue(maxsize=concurrency)
+    slots = asyncio.Semaphore(workers + concurrency)
+    result = {"loaded": 0, "rejected": 0, "bad_rows": 0, "failed": []}
+    leases = {}
+
+    # spawn: the parent already runs loader threads, which fork() doesn't mix with
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool, \
+            ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="load") as threads:
+
+        async def prepare(filename):
+            lease = await loop.run_in_executor(threads, claim_file, filename)
+            if lease is None:
+                await staged_queue.put((filename, "claimed", None, "claimed by another run"))
+                return
+            leases[filename] = lease
+            try:
+                status, staged, reason = await loop.run_in_executor(pool, prepare_file, filename)
+            except Exception as e:
+                status, staged, reason = "failed", None, str(e)
+            await staged_queue.put((filename, status, staged, reason))
+
+        async def feed():
+            tasks = []
+            for filename in files:
+                await slots.acquire()
+                tasks.append(asyncio.create_task(prepare(filename)))
+            await asyncio.gather(*tasks)
+            for _ in range(concurrency):
+                await staged_queue.put(None)
+
+        async def load_worker():
+            while (item := await staged_queue.get()) is not None:
+                filename, status, staged, reason = item
+                try:
+                    if status == "staged":
+                        lease = leases[filename]
+                        try:
+                            summary = await loop.run_in_executor(
+                                threads, in_context(leased(loader.load_file, lease), filename, "load"),
+                                staged, filename)
+                            await loop.run_in_executor(
+                                threads, in_context(leased(mark_done, lease), filename, "checkpoint"),
+                                filename, checkpoint_file)
+                        except loader.SchemaMismatchError:
+                            status, reason = "rejected", "schema mismatch"
+                        except Exception as e:
+                            status, reason = "failed", str(e)
+                        else:
+                            result["loaded"] += 1
+                            result["bad_rows"] += summary["bad_rows"] if summary else 0
+                            log_step(f"COMPLETED: {filename}", "SUCCESS")
+
+                    if status == "rejected":
+                        result["rejected"] += 1
+                        await loop.run_in_executor(threads, mark_done, filename, checkpoint_file)
+                        log_step(f"Rejected {filename}: {reason}", "WARN")
+                    elif status == "claimed":
+                        log_step(f"Skipped: {filename} is being processed by another run", "INFO")
+                    elif status in ("retry", "failed"):
+                        # Not checkpointed - picked up again by the next run
+                        result["failed"].append(filename)
+                        log_step(f"Processing failed: {filename}: {reason}", "ERROR")
+                finally:
+                    if filename in leases:
+                        leases.pop(filename).release()
+                    slots.release()
+
+        await asyncio.gather(feed(), *(load_worker() for _ in range(concurrency)))
+    return result
+
+def run(files, concurrency=None, workers=None, checkpoint_file=None):
+    """Process `files` with overlapping transforms and loads; returns the run counts"""
+    concurrency = max(1, concurrency or get_load_concurrency())
+    workers = max(1, min(workers or get_transform_workers(), len(files) or 1))
+    log_step(f"Async run: {len(files)} files, {workers} transform workers, "
+             f"{concurrency} loads in flight", "START")
+    return asyncio.run(_run(files, concurrency, workers, checkpoint_file or CHECKPOINT_FILE))
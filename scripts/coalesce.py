@@ -0,0 +1,254 @@
+# coalesce.py
+"""
+Small-file coalescing: load many tiny same-schema CSVs as one Doris load.
+
+Producers drop lots of 3-8 row files. Loaded one by one, each pays for
+SHOW TABLES / MAX(id) / DESC and its own INSERT, and every INSERT is a new
+rowset version in Doris (compaction pressure, "-235 too many versions").
+
+With COALESCE=1 (or --coalesce) the batch run groups pending files by raw
+header schema, up to COALESCE_MAX_BYTES / COALESCE_MAX_FILES per group
+(files larger than the byte limit load on their own). A group is:
+  1. validated and transformed member by member - rejects are quarantined
+     and checkpointed individually, as in process_file
+  2. capped at COALESCE_MAX_ROWS valid rows (the rest form the next group)
+  3. concatenated into one staged file and loaded as a single INSERT, i.e.
+     one transaction and one rowset version
+  4. checkpointed with one locked write for all members, only after the
+     load succeeded
+
+Members are concatenated only with members whose staged header is the
+same. In TABLE_ROUTING=single mode a group that does not match the main
+table is rejected as a whole: its rows go to one error file and its members
+are checkpointed. The other groups of the batch still load.
+
+A group's name (and so its load progress record and labels) is a hash of
+its members. load_groups/pending.json keeps each group's membership from
+just before its load until it is checkpointed. The next plan puts those
+files back into the same group under the same name. An interrupted load
+then resumes, or has its rows removed as stale (load_progress.py), instead
+of being loaded again under a new group name. A group that finished loading
+but was not checkpointed is only checkpointed.
+
+Provenance: load_groups/<group>.json records, for every member, the id
+range its rows were given in the target table.
+"""
+import os
+import csv
+import json
+import hashlib
+from contextlib import ExitStack
+from local_config import (
+    CSV_DIR, STAGE_DIR, LOAD_GROUP_DIR, CHECKPOINT_FILE,
+    get_coalesce_max_bytes, get_coalesce_max_files, get_coalesce_max_rows
+)
+from coordination import locked, write_json_atomic
+from column_names import header_mapping
+from input_files import open_text
+from pipeline_steps import log_step, load_stage, process_file, claim, FileClaimedError
+from pipeline_logging import log_context
+from profiling import profile_stage
+
+def raw_schema_key(filename):
+    """Schema key of a raw file's header, without pandas"""
+    with open_text(os.path.join(CSV_DIR, filename)) as f:
+        header = next(csv.reader(f), None)
+    return header_mapping(header).schema_key if header else None
+
+PENDING_GROUPS_FILE = os.path.join(LOAD_GROUP_DIR, "pending.json")
+
+def pending_groups():
+    """{group name: member files} of group loads started but not checkpointed"""
+    if not os.path.exists(PENDING_GROUPS_FILE):
+        return {}
+    with open(PENDING_GROUPS_FILE) as f:
+        return json.load(f)
+
+def _set_pending(name, members):
+    """Record a group's members before its load; members=None once it is checkpointed"""
+    os.makedirs(LOAD_GROUP_DIR, exist_ok=True)
+    with locked(PENDING_GROUPS_FILE):
+        groups = pending_groups()
+        if members is None:
+            groups.pop(name, None)
+        else:
+            groups[name] = members
+        write_json_atomic(PENDING_GROUPS_FILE, groups, indent=1)
+
+def plan_groups(files):
+    """Split pending files into load groups; every file appears in exactly one group"""
+    max_bytes = get_coalesce_max_bytes()
+    max_files = get_coalesce_max_files()
+    groups = []
+    # Interrupted groups first, with the members they were loading
+    remaining = set(files)
+    for members in pending_groups().values():
+        members = [f for f in members if f in remaining]
+        if members:
+            groups.append(members)
+            remaining.difference_update(members)
+    open_groups = {}  # schema key -> (group, bytes)
+    for filename in [f for f in files if f in remaining]:
+        size = os.path.getsize(os.path.join(CSV_DIR, filename))
+        key = raw_schema_key(filename) if size < max_bytes else None
+        if key is None:
+            groups.append([filename])
+            continue
+        group, group_bytes = open_groups.get(key, (None, 0))
+        if group is None or group_bytes + size > max_bytes or len(group) >= max_files:
+            group, group_bytes = [], 0
+            groups.append(group)
+        group.append(filename)
+        open_groups[key] = (group, group_bytes + size)
+    return groups
+
+def group_name(filenames):
+    digest = hashlib.blake2b("\n".join(filenames).encode("utf-8"), digest_size=6).hexdigest()
+    return f"group_{len(filenames)}_{digest}"
+
+def _prepare_members(filenames, checkpoint_file):
+    """Validate + transform each member; returns [(filename, staged, rows)] and the rejected count"""
+    mark_done = load_stage("6_checkpoint").mark_done
+    validator = load_stage("2_validate")
+    transformer = load_stage("3_transform")
+    prepared, rejected = [], 0
+    for filename in filenames:
+        with log_context(file=filename, stage="validate"), profile_stage("validate"):
+            validation = validator.validate(filename)
+            if not validation["ok"]:
+                if validation["retryable"]:
+                    log_step(f"Not ready: {filename}: {validation['reason']}", "WARN")
+                    continue
+                validator.quarantine(filename, validation["reason"])
+                log_step(f"Rejected {filename}: {validation['reason']}", "WARN")
+                mark_done(filename, checkpoint_file)
+                rejected += 1
+                continue
+        with log_context(file=filename, stage="transform"), profile_stage("transform"):
+            prepared.append((filename, transformer.transform(filename), validation["rows"]))
+    return prepared, rejected
+
+def _load_group(members, checkpoint_file, leases, name=None):
+    """
+    Concatenate the staged members, load them in one INSERT and checkpoint
+    them together. `name` is given when the group is resuming an interrupted
+    load under its recorded name.
+    """
+    import pandas as pd
+    from csv_reader import read_csv, NULL_MARKER
+    from load_progress import resumable_stage
+    loader = load_stage("4_load_to_doris")
+    names = [m[0] for m in members]
+    resumed = name is not None
+    name = name or group_name(names)
+    provenance_path = os.path.join(LOAD_GROUP_DIR, f"{name}.json")
+
+    if resumed and os.path.exists(provenance_path):
+        # Loaded before the interruption - only the checkpoint is missing
+        with open(provenance_path) as f:
+            provenance = json.load(f)
+        summary = provenance["summary"]
+        log_step(f"Group {name} was already loaded, checkpointing {', '.join(names)}", "INFO")
+    else:
+        if not resumed:
+            _set_pending(name, names)
+        frames = [read_csv(staged) for _, staged, _ in members]
+        rows = sum(len(frame) for frame in frames)
+        staged_path = resumable_stage(f"{name}.csv") if resumed else None
+        if staged_path is None:
+            staged_path = os.path.join(STAGE_DIR, f"staged_{name}.csv")
+            pd.concat(frames, ignore_index=True).to_csv(staged_path, index=False, na_rep=NULL_MARKER)
+
+        log_step(f"Coalesced {len(members)} files into {name} ({rows} rows): {', '.join(names)}", "PROCESS")
+        with log_context(file=name, stage="load"), profile_stage("load"):
+            summary = loader.load_file(staged_path, f"{name}.csv", chunk_rows=max(1, rows))
+
+        # Per-file provenance: member rows were given consecutive ids in order
+        provenance = {"group": name, "table": summary["table"], "members": [], "summary": summary}
+        next_id = summary["first_id"]
+        for (filename, _, _), frame in zip(members, frames):
+            provenance["members"].append({"file": filename, "rows": len(frame),
+                                          "first_id": next_id, "last_id": next_id + len(frame) - 1})
+            next_id += len(frame)
+        os.makedirs(LOAD_GROUP_DIR, exist_ok=True)
+        write_json_atomic(provenance_path, provenance, indent=1)
+
+    for filename in names:
+        leases[filename].check()
+    load_stage("6_checkpoint").mark_done_many(names, checkpoint_file)
+    _set_pending(name, None)
+    for _, staged, _ in members:
+        os.remove(staged)
+    return summary
+
+def _batches(prepared, max_rows):
+    """
+    Cut prepared members into load groups: an interrupted group's members
+    keep their recorded group, the rest are split by staged header and
+    capped at `max_rows`. Yields (members, recorded name or None).
+    """
+    from csv_reader import read_header
+    owner = {f: name for name, files in pending_groups().items() for f in files}
+    resumed, fresh = {}, {}
+    for member in prepared:
+        if member[0] in owner:
+            resumed.setdefault(owner[member[0]], []).append(member)
+        else:
+            fresh.setdefault(tuple(read_header(member[1])), []).append(member)
+    for name, members in resumed.items():
+        yield members, name
+    for members in fresh.values():
+        batch, batch_rows = [], 0
+        for member in members:
+            if batch and batch_rows + member[2] > max_rows:
+                yield batch, None
+                batch, batch_rows = [], 0
+            batch.append(member)
+            batch_rows += member[2]
+        if batch:
+            yield batch, None
+
+def process_group(filenames, checkpoint_file=None):
+    """
+    Load a planned group. Returns {"loaded": files, "rejected": files,
+    "bad_rows": rows, "summaries": [...]}; raises if a load fails (nothing in
+    the failed sub-group is checkpointed). Members another run holds are skipped.
+    """
+    checkpoint_file = checkpoint_file or CHECKPOINT_FILE
+    if len(filenames) == 1 and not any(filenames[0] in files for files in pending_groups().values()):
+        try:
+            summary = process_file(filenames[0], checkpoint_file)
+        except FileClaimedError as e:
+            log_step(f"Skipped: {e}", "INFO")
+            return {"loaded": 0, "rejected": 0, "bad_rows": 0, "summaries": []}
+        return {"loaded": int(summary is not None), "rejected": int(summary is None),
+                "bad_rows": summary["bad_rows"] if summary else 0, "summaries": [summary]}
+
+    # Every member's lease is held until the group is checkpointed
+    with ExitStack() as stack:
+        leases = {}
+        for filename in filenames:
+            try:
+                leases[filename] = stack.enter_context(claim(filename))
+            except FileClaimedError as e:
+                log_step(f"Skipped: {e}", "INFO")
+
+        prepared, rejected = _prepare_members(list(leases), checkpoint_file)
+        result = {"loaded": 0, "rejected": rejected, "bad_rows": 0, "summaries": []}
+        loader = load_stage("4_load_to_doris")
+        for batch, name in _batches(prepared, get_coalesce_max_rows()):
+            names = [m[0] for m in batch]
+            try:
+                summary = _load_group(batch, checkpoint_file, leases, name)
+            except loader.SchemaMismatchError as e:
+                # Same staged header, so every member mismatches - reject them
+                # like process_file does and go on with the other groups
+                log_step(f"Schema mismatch in {', '.join(names)} - files skipped ({e})", "WARN")
+                load_stage("6_checkpoint").mark_done_many(names, checkpoint_file)
+                _set_pending(name or group_name(names), None)
+                result["rejected"] += len(batch)
+                continue
+            result["loaded"] += len(batch)
+            result["bad_rows"] += summary["bad_rows"]
+            result["summaries"].append(summary)
+        return result
@@ -0,0 +1,139 @@
+# column_names.py
+"""
+Column-name normalization shared by the validate, transform and load stages.
+
+The rules are compiled once into a str.translate table (plus optional
+unicode folding and aliases) and every distinct raw header is mapped once:
+header_mapping() caches raw header -> normalized names -> target columns,
+the schema key used for routing and the Stream Load `columns` header, keyed
+by a fingerprint of the raw header. All stages run in one process, so a
+header is normalized once per run, not once per stage per file.
+
+Rules come from COLUMN_RULES_FILE (column_rules.json next to table_map.json)
+when it exists; the defaults reproduce the original
+strip().lower().replace(' ', '_').replace('.', '_') minus '(' and ')':
+
+    {
+      "unicode": "none",            # "nfkc", or "ascii" to also drop accents
+      "replace": {" ": "_", ".": "_"},
+      "delete": "()",
+      "collapse_underscores": false,
+      "collisions": "reject",       # or "suffix": age, age -> age, age_2
+      "aliases": {}                 # normalized name -> target column
+    }
+
+e.g. "replace": {" ": "_", ".": "_", "/": "_per_"} turns
+"Workout_Frequency (days/week)" into "workout_frequency_days_per_week".
+"""
+import os
+import re
+import json
+import hashlib
+import unicodedata
+from local_config import COLUMN_RULES_FILE
+
+DEFAULT_RULES = {
+    "unicode": "none",
+    "replace": {" ": "_", ".": "_"},
+    "delete": "()",
+    "collapse_underscores": False,
+    "collisions": "reject",
+    "aliases": {},
+}
+
+class HeaderMapping:
+    """How one raw header maps onto target columns"""
+
+    def __init__(self, raw, normalized, columns, collisions):
+        self.raw = list(raw)
+        self.normalized = normalized      # per raw column, before collision handling
+        self.columns = columns            # target column names, in file order
+        self.collisions = collisions      # normalized names produced more than once
+        self.schema_key = "|".join(sorted(columns))
+        self.columns_header = ",".join(f"`{c}`" for c in columns)
+
+class ColumnRules:
+    def __init__(self, rules=None):
+        rules = {**DEFAULT_RULES, **(rules or {})}
+        if rules["unicode"] not in ("none", "nfkc", "ascii"):
+            raise ValueError(f"Invalid column rule unicode={rules['unicode']!r}")
+        if rules["collisions"] not in ("reject", "suffix"):
+            raise ValueError(f"Invalid column rule collisions={rules['collisions']!r}")
+        self.rules = rules
+        table = {ch: None for ch in rules["delete"]}
+        multi = {}
+        for src, dst in rules["replace"].items():
+            if len(src) == 1:
+                table[ord(src)] = dst
+            else:
+                multi[src] = dst
+        self._table = str.maketrans(table) if table else {}
+        self._multi = re.compile("|".join(map(re.escape, sorted(multi, key=len, reverse=True)))) if multi else None
+        self._multi_map = multi
+        self._underscores = re.compile("_{2,}") if rules["collapse_underscores"] else None
+        self._cache = {}
+
+    def normalize(self, name):
+        name = name.strip()
+        if self.rules["unicode"] != "none":
+            name = unicodedata.normalize("NFKC", name)
+            if self.rules["unicode"] == "ascii":
+                name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+        name = name.lower()
+        if self._multi is not None:
+            name = self._multi.sub(lambda m: self._multi_map[m.group(0)], name)
+        name = name.translate(self._table)
+        if self._underscores is not None:
+            name = self._underscores.sub("_", name).strip("_")
+        return name
+
+    def mapping(self, header):
+        """Cached HeaderMapping for a raw header (a sequence of column names)"""
+        fingerprint = hashlib.blake2b("\x1f".join(header).encode("utf-8"), digest_size=16).digest()
+        cached = self._cache.get(fingerprint)
+        if cached is not None:
+            return cached
+
+        normalized = [self.normalize(c) for c in header]
+        aliases = self.rules["aliases"]
+        columns, seen, collisions = [], {}, []
+        for name in normalized:
+            target = aliases.get(name, name)
+            if target in seen:
+                if target not in collisions:
+                    collisions.append(target)
+                if self.rules["collisions"] == "suffix":
+                    n = seen[target] + 1
+                    while f"{target}_{n}" in seen:
+                        n += 1
+                    seen[target] = n
+                    target = f"{target}_{n}"
+            seen.setdefault(target, 1)
+            columns.append(target)
+
+        if self.rules["collisions"] == "suffix":
+            collisions = []
+        mapping = HeaderMapping(header, normalized, columns, collisions)
+        self._cache[fingerprint] = mapping
+        return mapping
+
+def load_rules(path=COLUMN_RULES_FILE):
+    if not os.path.exists(path):
+        return ColumnRules()
+    with open(path) as f:
+        return ColumnRules(json.load(f))
+
+_rules = None
+
+def get_rules():
+    """Process-wide compiled rules, so the header cache survives across files"""
+    global _rules
+    if _rules is None:
+        _rules = load_rules()
+    return _rules
+
+def header_mapping(header):
+    return get_rules().mapping(list(header))
+
+def normalize_column(name):
+    return get_rules().normalize(name)
@@ -0,0 +1,196 @@
+# coordination.py
+"""
+Cross-process coordination on the shared data volume.
+
+Several pipeline pods (fan-out shards, overlapping runs) share checkpoint.txt,
+table_map.json and the target table's `id` sequence. These helpers serialize
+access with fcntl locks on sidecar `.lock` files next to the shared files.
+
+Files are claimed with leases (leases/<file>.json: owner + expiry), so
+overlapping cron runs, shards or extra instances never process the same file
+at once. Releasing a lease deletes its file and its `.lock` under the lock. A process renews the leases it holds from one heartbeat thread
+every LEASE_TTL_SECONDS / 3; a lease whose owner died (no heartbeat) expires
+and can be taken over - the new owner resumes from the load progress record.
+Expiry uses wall-clock time, so all instances must share a clock (pods on
+one node sharing the hostPath volume do; fcntl locks need that too).
+"""
+import os
+import json
+import time
+import uuid
+import fcntl
+import socket
+import threading
+from contextlib import contextmanager
+from local_config import ID_RANGE_FILE, LEASE_DIR, logging, get_lease_ttl
+
+@contextmanager
+def locked(path, remove=False):
+    """
+    Hold an exclusive fcntl lock for `path` (via `<path>.lock`). With
+    `remove` the lock file is deleted before the lock is released; a waiter
+    that then gets the lock on the deleted file sees that and locks the
+    path's current lock file instead.
+    """
+    lock_path = f"{path}.lock"
+    while True:
+        lock_file = open(lock_path, "a")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            held = os.fstat(lock_file.fileno())
+            try:
+                current = os.stat(lock_path)
+            except FileNotFoundError:
+                current = None
+        except BaseException:
+            lock_file.close()
+            raise
+        if current is not None and (held.st_dev, held.st_ino) == (current.st_dev, current.st_ino):
+            break
+        lock_file.close()  # removed by the holder we waited for
+    try:
+        yield
+    finally:
+        if remove:
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        lock_file.close()
+
+def write_json_atomic(path, data, **dump_kwargs):
+    """Write JSON to a temp file and rename it over `path`"""
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, **dump_kwargs)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def reserve_id_range(table_name, count, last_id=0):
+    """
+    Reserve `count` consecutive ids for `table_name` and return the first one.
+    `last_id` is the table's current MAX(id); the shared counter never hands
+    out anything at or below it, so concurrent loaders never overlap.
+    """
+    with locked(ID_RANGE_FILE):
+        ranges = {}
+        if os.path.exists(ID_RANGE_FILE):
+            with open(ID_RANGE_FILE) as f:
+                ranges = json.load(f)
+        first_id = max(ranges.get(table_name, 1), int(last_id) + 1)
+        ranges[table_name] = first_id + count
+        write_json_atomic(ID_RANGE_FILE, ranges, indent=2)
+    return first_id
+
+class LeaseLostError(RuntimeError):
+    """Our lease expired and was taken over - stop before loading/checkpointing"""
+
+_owner = f"{socket.gethostname()}:{os.getpid()}"
+_held = {}            # name -> Lease, renewed by the heartbeat thread
+_held_lock = threading.Lock()
+_heartbeat = None
+
+def lease_path(name):
+    return os.path.join(LEASE_DIR, f"{name}.json")
+
+def _read_lease(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def lease_holder(name):
+    """Owner of an unexpired lease on `name`, or None"""
+    record = _read_lease(lease_path(name))
+    if record is None or record["expires"] <= time.time():
+        return None
+    return record["owner"]
+
+class Lease:
+    """Exclusive, expiring claim on one input file"""
+
+    def __init__(self, name, ttl=None):
+        self.name = name
+        self.ttl = ttl or get_lease_ttl()
+        self.path = lease_path(name)
+        self.owner = f"{_owner}:{uuid.uuid4().hex[:8]}"
+        self.lost = False
+
+    def acquire(self):
+        """Take the lease if it is free or expired; False if someone else holds it"""
+        os.makedirs(LEASE_DIR, exist_ok=True)
+        with locked(self.path):
+            record = _read_lease(self.path)
+            now = time.time()
+            if record is not None and record["owner"] != self.owner and record["expires"] > now:
+                return False
+            if record is not None and record["owner"] != self.owner:
+                logging.warning(f"Lease on {self.name} held by {record['owner']} expired - taking over")
+            write_json_atomic(self.path, {"owner": self.owner, "acquired": now, "expires": now + self.ttl})
+        with _held_lock:
+            _held[self.name] = self
+        _start_heartbeat()
+        return True
+
+    def renew(self):
+        with _held_lock:
+            if _held.get(self.name) is not self:
+                return  # released meanwhile
+        with locked(self.path):
+            record = _read_lease(self.path)
+            if record is None or record["owner"] != self.owner:
+                self.lost = True
+                logging.error(f"Lease on {self.name} lost to {record['owner'] if record else 'nobody'}")
+                return
+            record["expires"] = time.time() + self.ttl
+            write_json_atomic(self.path, record)
+
+    def check(self):
+        """Raise LeaseLostError unless we still hold the lease"""
+        if self.lost or lease_holder(self.name) != self.owner:
+            self.lost = True
+            raise LeaseLostError(f"Lease on {self.name} was lost (expired and taken over)")
+
+    def release(self):
+        with _held_lock:
+            _held.pop(self.name, None)
+        with locked(self.path, remove=True):
+            record = _read_lease(self.path)
+            if record is not None and record["owner"] == self.owner:
+                os.remove(self.path)
+
+def _renew_held():
+    while True:
+        with _held_lock:
+            leases = list(_held.values())
+        interval = min((lease.ttl for lease in leases), default=get_lease_ttl()) / 3
+        time.sleep(interval)
+        with _held_lock:
+            leases = [lease for lease in _held.values() if not lease.lost]
+        for lease in leases:
+            try:
+                lease.renew()
+            except OSError as e:
+                logging.warning(f"Lease heartbeat for {lease.name} failed: {e}")
+
+def _start_heartbeat():
+    global _heartbeat
+    with _held_lock:
+        if _heartbeat is None:
+            _heartbeat = threading.Thread(target=_renew_held, name="lease-heartbeat", daemon=True)
+            _heartbeat.start()
+
+@contextmanager
+def file_lease(name, ttl=None):
+    """Hold the lease on `name` for the block; yields the Lease, or None if it is taken"""
+    lease = Lease(name, ttl)
+    if not lease.acquire():
+        yield None
+        return
+    try:
+        yield lease
+    finally:
+        lease.release()
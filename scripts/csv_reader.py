@@ -0,0 +1,122 @@
+# csv_reader.py
+"""
+Pluggable CSV reader shared by the validate/transform/load stages.
+
+CSV_ENGINE selects the parser:
+  - "auto" (default): pyarrow when it is installed, else pandas
+  - "pyarrow": pyarrow.csv with multi-threaded block parsing
+  - "pandas": pandas' single-threaded C parser (the previous behaviour)
+
+The pyarrow path supports `usecols` pushdown (unused columns are never
+converted) and explicit column types derived from the Doris table schema.
+Anything it can't handle - nrows, a value that doesn't fit the declared type,
+quoted newlines - falls back to pandas, which the row-level validation in
+4_load_to_doris.py is built around.
+
+Compressed inputs (.csv.gz/.csv.bz2/.csv.zst, see input_files.py) are
+decompressed as a stream by either engine, never unpacked on disk.
+
+Both engines read `\\N` (the Doris/MySQL NULL marker the transform stage
+writes) as a missing value, on top of their default null strings.
+"""
+import pandas as pd
+from local_config import logging, get_csv_engine, get_csv_block_size
+from input_files import compression_of, open_binary
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+    pa_csv = None
+
+NULL_MARKER = "\\N"
+
+def doris_to_arrow_type(doris_type):
+    """Map a Doris column type (as shown by DESC) to a pyarrow type, or None"""
+    if pa is None:
+        return None
+    t = doris_type.upper()
+    if t.startswith(("TINYINT", "SMALLINT", "INT", "BIGINT", "LARGEINT",
+                     "DOUBLE", "FLOAT", "DECIMAL")):
+        # Integer columns are parsed as float64 too: producers write "1952.0"
+        # for integers and the loader already converts with int(float(value))
+        return pa.float64()
+    if t.startswith("BOOLEAN"):
+        return pa.bool_()
+    if t.startswith(("VARCHAR", "CHAR", "STRING", "TEXT", "DATE")):
+        # Dates stay strings - the loader validates and passes them through as-is
+        return pa.string()
+    return None
+
+def resolve_engine():
+    engine = get_csv_engine()
+    if engine == "auto":
+        return "pyarrow" if pa_csv is not None else "pandas"
+    if engine == "pyarrow" and pa_csv is None:
+        logging.warning("CSV_ENGINE=pyarrow but pyarrow is not installed, using pandas")
+        return "pandas"
+    return engine
+
+def _read_pyarrow(path, usecols=None, column_types=None):
+    read_options = pa_csv.ReadOptions(use_threads=True, block_size=get_csv_block_size())
+    convert_options = pa_csv.ConvertOptions(
+        include_columns=list(usecols) if usecols is not None else None,
+        column_types=column_types or None,
+        # Keep date-like strings as strings, like pandas does by default
+        timestamp_parsers=[],
+        strings_can_be_null=True,
+        null_values=pa_csv.ConvertOptions().null_values + [NULL_MARKER],
+    )
+    # pyarrow picks the codec from the extension and decompresses on its I/O thread
+    return pa_csv.read_csv(path, read_options=read_options, convert_options=convert_options)
+
+def _arrow_types(doris_types):
+    column_types = {}
+    for col, doris_type in (doris_types or {}).items():
+        arrow_type = doris_to_arrow_type(doris_type)
+        if arrow_type is not None:
+            column_types[col] = arrow_type
+    return column_types
+
+def read_csv(path, usecols=None, doris_types=None, **kwargs):
+    """
+    Read a CSV into a DataFrame.
+    `doris_types` maps column name -> Doris type string (from DESC) and is
+    turned into explicit parse types on the pyarrow path.
+    Extra keyword arguments (nrows, dtype, ...) force the pandas parser.
+    """
+    if resolve_engine() == "pyarrow" and not kwargs:
+        try:
+            return _read_pyarrow(path, usecols, _arrow_types(doris_types)).to_pandas()
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowKeyError) as e:
+            logging.info(f"pyarrow could not parse {path} ({str(e)[:120]}), falling back to pandas")
+    return _read_pandas(path, usecols, **kwargs)
+
+def _read_pandas(path, usecols=None, **kwargs):
+    kwargs.setdefault("na_values", [NULL_MARKER])
+    if compression_of(path):
+        # Same streams as validation (pandas itself needs zstandard for .zst)
+        with open_binary(path) as f:
+            return pd.read_csv(f, usecols=usecols, **kwargs)
+    return pd.read_csv(path, usecols=usecols, **kwargs)
+
+def read_table(path, doris_types=None):
+    """
+    Read a CSV for LoadBatch.from_frame: a pyarrow Table when the pyarrow
+    engine can parse it (columns are converted to pandas one at a time by the
+    batch, never all at once), else a DataFrame from read_csv.
+    """
+    if resolve_engine() == "pyarrow":
+        try:
+            return _read_pyarrow(path, column_types=_arrow_types(doris_types))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowKeyError) as e:
+            logging.info(f"pyarrow could not parse {path} ({str(e)[:120]}), falling back to pandas")
+    return _read_pandas(path)
+
+def read_header(path):
+    """Column names only, without parsing any rows (or decompressing past the header)"""
+    if compression_of(path):
+        with open_binary(path) as f:
+            return list(pd.read_csv(f, nrows=0).columns)
+    return list(pd.read_csv(path, nrows=0).columns)
@@ -3,6 +3,7 @@ Streamlit Dashboard for Doris Data Analysis
 Automatically connects to Doris, analyzes tables, and generates insights
 """
 
+import os
 import streamlit as st
 import pymysql
 import pandas as pd
@@ -10,7 +11,7 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
 import numpy as np
-from local_config import DORIS_CONFIG
+from local_config import DORIS_CONFIG, BASE_DIR
 
 # Override with actual Doris host for local dashboard
 DORIS_CONFIG = {
@@ -21,6 +22,11 @@ DORIS_CONFIG = {
     'database': 'updated_test2'
 }
 
+# Raw data export settings
+EXPORT_DIR = os.path.join(BASE_DIR, "exports")
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "50000"))
+EXPORT_DOWNLOAD_MAX_MB = int(os.getenv("EXPORT_DOWNLOAD_MAX_MB", "50"))
+
 # Page configuration
 st.set_page_config(
     page_title="Doris Data Insights Dashboard",
@@ -128,6 +134,227 @@ def get_table_data(_conn, table_name, limit=10000):
         st.error(f"Error fetching data from {table_name}: {e}")
         return pd.DataFrame()
 
+FILTER_OPERATORS = ["=", "!=", ">", ">=", "<", "<=", "LIKE", "IS NULL", "IS NOT NULL"]
+
+def build_where_clause(filters, allowed_columns):
+    """
+    Build a parameterized WHERE clause from (column, operator, value) filters.
+    Columns are checked against the table schema so nothing user-typed ends
+    up in the SQL text; values are always passed as query parameters.
+    """
+    clauses = []
+    params = []
+    for col, op, value in filters:
+        if col not in allowed_columns or op not in FILTER_OPERATORS:
+            continue
+        if op in ("IS NULL", "IS NOT NULL"):
+            clauses.append(f"`{col}` {op}")
+        else:
+            clauses.append(f"`{col}` {op} %s")
+            params.append(value)
+    return " AND ".join(clauses), params
+
+def fetch_page(_conn, table_name, after_id=None, page_size=500, where="", params=None):
+    """
+    Fetch one page of rows using keyset pagination on `id`.
+    Only `page_size` rows ever leave Doris, no matter how deep the page is.
+    """
+    conditions = []
+    query_params = []
+    if after_id is not None:
+        conditions.append("`id` > %s")
+        query_params.append(int(after_id))
+    if where:
+        conditions.append(f"({where})")
+        query_params.extend(params or [])
+
+    query = f"SELECT * FROM `{table_name}`"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY `id` LIMIT {int(page_size)}"
+    return pd.read_sql(query, _conn, params=query_params or None)
+
+def get_table_page(_conn, table_name, after_id=None, page_size=500, where="", params=None):
+    """Fetch one page for display, reporting errors in the UI"""
+    try:
+        return fetch_page(_conn, table_name, after_id, page_size, where, params)
+    except Exception as e:
+        st.error(f"Error fetching page from {table_name}: {e}")
+        return pd.DataFrame()
+
+def count_filtered_rows(_conn, table_name, where="", params=None):
+    """Count rows matching the pushed-down filters"""
+    query = f"SELECT COUNT(*) AS count FROM `{table_name}`"
+    if where:
+        query += f" WHERE {where}"
+    try:
+        return int(pd.read_sql(query, _conn, params=params or None)['count'].iloc[0])
+    except Exception as e:
+        st.error(f"Error counting rows in {table_name}: {e}")
+        return 0
+
+def arrow_schema(_conn, table_name):
+    """
+    Arrow schema from the table's DESC types, so every Parquet chunk is written
+    with the same types (an all-NULL column in one chunk would otherwise infer `null`)
+    """
+    import re
+    import pyarrow as pa
+    ints = {"TINYINT": pa.int8(), "SMALLINT": pa.int16(), "INT": pa.int32(), "BIGINT": pa.int64(),
+            "LARGEINT": pa.decimal128(38, 0)}
+    fields = []
+    for name, doris_type in pd.read_sql(f"DESC `{table_name}`", _conn)[["Field", "Type"]].itertuples(index=False):
+        base = re.match(r"\w+", str(doris_type).upper()).group(0)
+        if base in ints:
+            arrow_type = ints[base]
+        elif base in ("BOOLEAN", "BOOL"):
+            arrow_type = pa.bool_()
+        elif base == "FLOAT":
+            arrow_type = pa.float32()
+        elif base in ("DOUBLE", "DECIMAL", "DECIMALV2", "DECIMALV3"):
+            arrow_type = pa.float64()  # read_sql coerces DECIMAL values to float
+        elif base in ("DATE", "DATEV2"):
+            arrow_type = pa.date32()
+        elif base in ("DATETIME", "DATETIMEV2"):
+            arrow_type = pa.timestamp("us")
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+def export_table(_conn, table_name, where="", params=None, fmt="csv", chunk_size=EXPORT_CHUNK_ROWS):
+    """
+    Stream a table (or a filtered subset) to a file under EXPORT_DIR.
+    Rows are pulled in keyset chunks on `id` and appended to the output,
+    so at most one chunk is held in memory at a time.
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    out_path = os.path.join(EXPORT_DIR, f"{table_name}_{timestamp}.{fmt}")
+
+    writer = None
+    if fmt == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+        schema = arrow_schema(_conn, table_name)
+
+    total_rows = 0
+    after_id = None
+    try:
+        while True:
+            chunk = fetch_page(_conn, table_name, after_id, chunk_size, where, params)
+            if chunk.empty:
+                break
+
+            if fmt == "parquet":
+                if writer is None:
+                    writer = pq.ParquetWriter(out_path, schema)
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            else:
+                chunk.to_csv(out_path, mode='a', header=(total_rows == 0), index=False)
+
+            total_rows += len(chunk)
+            after_id = chunk['id'].iloc[-1]
+            if len(chunk) < chunk_size:
+                break
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return out_path, total_rows
+
+def show_raw_data(conn, table_name):
+    """Paginated raw data browser with pushed-down filters and streamed export"""
+    st.markdown(f"### 🗃️ Raw Data from `{table_name}`")
+
+    _, schema_df = get_table_info(conn, table_name)
+    columns = schema_df['Field'].tolist() if not schema_df.empty else []
+
+    # Filters (pushed down to Doris as WHERE clauses)
+    filters = []
+    with st.expander("🔎 Filters", expanded=False):
+        filter_count = st.number_input("Number of filters", min_value=0, max_value=5,
+                                       value=0, key=f"raw_filter_count_{table_name}")
+        for i in range(int(filter_count)):
+            c1, c2, c3 = st.columns([2, 1, 2])
+            with c1:
+                col = st.selectbox("Column", columns, key=f"raw_filter_col_{table_name}_{i}")
+            with c2:
+                op = st.selectbox("Operator", FILTER_OPERATORS, key=f"raw_filter_op_{table_name}_{i}")
+            with c3:
+                value = st.text_input("Value", key=f"raw_filter_val_{table_name}_{i}",
+                                      disabled=op in ("IS NULL", "IS NOT NULL"))
+            filters.append((col, op, value))
+
+    where, params = build_where_clause(filters, columns)
+
+    # Keyset cursor stack: one `after_id` per visited page, reset when filters change
+    state_key = f"raw_cursor_{table_name}"
+    filter_signature = (where, tuple(params))
+    if st.session_state.get(f"{state_key}_filters") != filter_signature:
+        st.session_state[f"{state_key}_filters"] = filter_signature
+        st.session_state[state_key] = [None]
+    cursor_stack = st.session_state[state_key]
+
+    page_size = st.selectbox("Rows per page", [100, 500, 1000, 5000], index=1,
+                             key=f"raw_page_size_{table_name}")
+    page = get_table_page(conn, table_name, cursor_stack[-1], page_size, where, params)
+    matching_rows = count_filtered_rows(conn, table_name, where, params)
+
+    st.markdown(f"*Page {len(cursor_stack)} · showing {len(page):,} of {matching_rows:,} matching rows*")
+    st.dataframe(page, use_container_width=True, height=600)
+
+    nav1, nav2 = st.columns(2)
+    with nav1:
+        if st.button("⬅️ Previous", disabled=len(cursor_stack) <= 1, use_container_width=True,
+                     key=f"raw_prev_{table_name}"):
+            cursor_stack.pop()
+            st.rerun()
+    with nav2:
+        if st.button("Next ➡️", disabled=len(page) < page_size, use_container_width=True,
+                     key=f"raw_next_{table_name}"):
+            cursor_stack.append(page['id'].iloc[-1])
+            st.rerun()
+
+    # Streamed export (full table or filtered subset)
+    st.markdown("#### 📥 Export")
+    e1, e2 = st.columns(2)
+    with e1:
+        scope = st.radio("Rows", ["Filtered subset", "Full table"], horizontal=True,
+                         key=f"raw_export_scope_{table_name}")
+    with e2:
+        fmt = st.radio("Format", ["csv", "parquet"], horizontal=True,
+                       key=f"raw_export_fmt_{table_name}")
+
+    if st.button("📦 Export to file", use_container_width=True, key=f"raw_export_{table_name}"):
+        export_where, export_params = (where, params) if scope == "Filtered subset" else ("", [])
+        try:
+            with st.spinner(f"Exporting `{table_name}` in chunks of {EXPORT_CHUNK_ROWS:,} rows..."):
+                out_path, exported = export_table(conn, table_name, export_where, export_params, fmt)
+            st.session_state[f"raw_export_path_{table_name}"] = out_path
+            st.success(f"✅ Exported {exported:,} rows to `{out_path}`")
+        except Exception as e:
+            st.error(f"Export failed: {e}")
+
+    # Only offer an in-browser download for exports small enough to hand to Streamlit
+    out_path = st.session_state.get(f"raw_export_path_{table_name}")
+    if out_path and os.path.exists(out_path):
+        size_mb = os.path.getsize(out_path) / 1024 / 1024
+        if size_mb <= EXPORT_DOWNLOAD_MAX_MB:
+            with open(out_path, "rb") as f:
+                st.download_button(
+                    label=f"📥 Download {os.path.basename(out_path)} ({size_mb:.1f} MB)",
+                    data=f,
+                    file_name=os.path.basename(out_path),
+                    mime="text/csv" if out_path.endswith(".csv") else "application/octet-stream",
+                    use_container_width=True
+                )
+        else:
+            st.info(f"Export is {size_mb:.1f} MB - download it directly from `{out_path}`")
+
 def analyze_column(series):
     """Generate insights for a single column"""
     insights = []
@@ -393,19 +620,7 @@ def main():
             generate_visualizations(df, selected_table)
         
         with tab3:
-            st.markdown(f"### 🗃️ Raw Data from `{selected_table}`")
-            st.markdown(f"*Showing first 10,000 rows*")
-            st.dataframe(df, use_container_width=True, height=600)
-            
-            # Download button
-            csv = df.to_csv(index=False)
-            st.download_button(
-                label="📥 Download CSV",
-                data=csv,
-                file_name=f"{selected_table}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv",
-                use_container_width=True
-            )
+            show_raw_data(conn, selected_table)
     
     # Footer
     st.markdown("---")
@@ -1,17 +1,51 @@
 # discover_next_1.py
 import os
-from local_config import CSV_DIR, CHECKPOINT_FILE, logging
+from local_config import CSV_DIR, CHECKPOINT_FILE, CHECKPOINT_SHARD_DIR, logging
+from input_files import is_csv
 
-def discover_next():
-    files = sorted([f for f in os.listdir(CSV_DIR) if f.lower().endswith(".csv")])
+def load_processed():
+    # checkpoint.txt plus shard checkpoints not yet consolidated
+    checkpoint_files = [CHECKPOINT_FILE]
+    if os.path.isdir(CHECKPOINT_SHARD_DIR):
+        checkpoint_files += [os.path.join(CHECKPOINT_SHARD_DIR, f) for f in os.listdir(CHECKPOINT_SHARD_DIR)
+                             if f.startswith("shard_") and f.endswith(".txt")]
     processed = set()
-    if os.path.exists(CHECKPOINT_FILE):
-        with open(CHECKPOINT_FILE) as f:
-            processed = {line.strip() for line in f if line.strip()}
-    for f in files:
-        if f not in processed:
-            logging.info(f"Next: {f}")
-            return f
+    for path in checkpoint_files:
+        if os.path.exists(path):
+            with open(path) as f:
+                processed |= {line.strip() for line in f if line.strip()}
+    return processed
+
+def list_csv_files():
+    """Plain and compressed (.csv.gz/.csv.zst/.csv.bz2) CSVs in CSV_DIR"""
+    return sorted([f for f in os.listdir(CSV_DIR) if is_csv(f)])
+
+def pending_files(tail=False):
+    """Files whose content hasn't been loaded yet (see file_registry.py)"""
+    from file_registry import classify_files
+    pending, _ = classify_files(list_csv_files(), load_processed(), tail=tail)
+    return pending
+
+def is_pending(name):
+    """
+    Cheap re-check of a file discovery listed as pending, once its lease is
+    held: False if another run has loaded it since (its registry entry now
+    matches the file).
+    """
+    from file_registry import load_registry
+    entry = load_registry()["files"].get(name)
+    if entry is None:
+        return name not in load_processed()
+    st = os.stat(os.path.join(CSV_DIR, name))
+    return (st.st_size, st.st_mtime_ns) != (entry["size"], entry["mtime_ns"])
+
+def discover_next():
+    from coordination import lease_holder
+    for f in pending_files():
+        if lease_holder(f) is not None:
+            continue  # being processed by another run
+        logging.info(f"Next: {f}")
+        return f
     return None
 
 if __name__ == "__main__":
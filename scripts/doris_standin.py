@@ -0,0 +1,246 @@
+# doris_standin.py
+"""
+Local stand-in for the Doris HTTP API used by LOAD_MODE=2pc, for testing
+exactly-once loads (and their crash recovery) without a cluster.
+
+Like a real cluster it listens as an FE (--port) and a BE (--be-port):
+  PUT /api/<db>/<table>/_stream_load       FE: 307 to the BE, body not read
+                                           (requires `Expect: 100-continue`);
+                                           BE: labels, two_phase_commit; requires
+                                           basic auth, which requests drops when
+                                           it follows a redirect to another host
+  PUT /api/<db>[/<table>]/_stream_load_2pc txn_operation commit/abort by txn_id or label
+  GET /api/<db>/get_load_state?label=      UNKNOWN / PRECOMMITTED / VISIBLE / ABORTED
+  GET /api                                 health check (check_fe_api)
+  GET /standin/state                       per table: visible rows, duplicate ids,
+                                           pre-committed loads (for assertions)
+
+Transactions and loaded bodies are kept under --dir and survive a restart of
+the stand-in, like a real FE. --lose-commit-acks N applies the first N
+commits but drops the connection before replying, to exercise retried
+commits. Only HTTP is emulated: load_file also needs the MySQL port (DDL,
+DESC, MAX(id)), so a full pipeline run needs a real Doris. The Stream Load,
+2PC and reconcile path is exercised against it by tests/test_transactions.py.
+
+Usage:
+  python3 doris_standin.py --port 8030 --be-port 8040 --dir /tmp/doris_standin
+"""
+import os
+import re
+import json
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+_STREAM_LOAD = re.compile(r"^/api/([^/]+)/([^/]+)/_stream_load$")
+_TWO_PC = re.compile(r"^/api/([^/]+)(?:/[^/]+)?/_stream_load_2pc$")
+_LOAD_STATE = re.compile(r"^/api/([^/]+)/get_load_state$")
+
+class StandinState:
+    """Labels -> transactions, persisted to <dir>/state.json"""
+
+    def __init__(self, data_dir, lose_commit_acks=0):
+        self.data_dir = data_dir
+        self.path = os.path.join(data_dir, "state.json")
+        self.lose_commit_acks = lose_commit_acks
+        self.lock = threading.Lock()
+        os.makedirs(data_dir, exist_ok=True)
+        self.state = {"next_txn": 1000, "labels": {}}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.state = json.load(f)
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def body_path(self, db, label):
+        return os.path.join(self.data_dir, db, f"{label}.csv")
+
+    def by_txn(self, db, txn_id=None, label=None):
+        for name, txn in self.state["labels"].items():
+            if txn["db"] == db and (name == label or (txn_id is not None and str(txn["txn_id"]) == str(txn_id))):
+                return name, txn
+        return None, None
+
+    def tables(self):
+        """Visible rows and duplicate ids (first column) per table"""
+        out = {}
+        for label, txn in self.state["labels"].items():
+            table = out.setdefault(f"{txn['db']}.{txn['table']}",
+                                   {"visible_rows": 0, "precommitted": [], "ids": {}})
+            if txn["state"] == "PRECOMMITTED":
+                table["precommitted"].append(label)
+            if txn["state"] != "VISIBLE":
+                continue
+            table["visible_rows"] += txn["rows"]
+            with open(self.body_path(txn["db"], label), encoding="utf-8") as f:
+                for line in f:
+                    row_id = line.split(",", 1)[0].strip('"')
+                    table["ids"][row_id] = table["ids"].get(row_id, 0) + 1
+        for table in out.values():
+            ids = table.pop("ids")
+            table["duplicate_ids"] = sum(1 for n in ids.values() if n > 1)
+        return out
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    standin = None
+    role = "fe"          # "fe" redirects Stream Loads to be_address, "be" runs them
+    be_address = None
+
+    def log_message(self, fmt, *args):
+        print(f"[standin] {self.command} {self.path} -> {fmt % args}")
+
+    def _reply(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            parts = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return b"".join(parts)
+                parts.append(self.rfile.read(size))
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/api":
+            return self._reply({"msg": "success", "code": 0})
+        if url.path == "/standin/state":
+            with self.standin.lock:
+                return self._reply(self.standin.tables())
+        m = _LOAD_STATE.match(url.path)
+        if m:
+            label = parse_qs(url.query).get("label", [""])[0]
+            with self.standin.lock:
+                _, txn = self.standin.by_txn(m.group(1), label=label)
+            return self._reply({"msg": "success", "code": 0, "data": txn["state"] if txn else "UNKNOWN", "count": 0})
+        self._reply({"msg": "not found"}, 404)
+
+    def do_PUT(self):
+        path = urlparse(self.path).path
+        m = _STREAM_LOAD.match(path)
+        if m and self.role == "fe":
+            return self._redirect()
+        body = self._body()
+        if m:
+            if not self.headers.get("Authorization"):
+                return self._reply({"status": "FAILED", "msg": "no valid Basic authorization"}, 401)
+            return self._stream_load(m.group(1), m.group(2), body)
+        m = _TWO_PC.match(path)
+        if m:
+            return self._two_phase(m.group(1))
+        self._reply({"msg": "not found"}, 404)
+
+    def _redirect(self):
+        """What the FE does: pick a BE and 307 there without reading the body"""
+        if self.headers.get("Expect", "").lower() != "100-continue":
+            return self._reply({"status": "FAILED", "msg": "There is no 100-continue header"})
+        self.send_response(307)
+        self.send_header("Location", f"http://{self.be_address}{self.path}")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        self.close_connection = True
+
+    def _stream_load(self, db, table, body):
+        label = self.headers.get("label") or f"standin_{os.urandom(8).hex()}"
+        two_pc = self.headers.get("two_phase_commit", "").lower() == "true"
+        standin = self.standin
+        with standin.lock:
+            existing = standin.state["labels"].get(label)
+            if existing is not None and existing["state"] != "ABORTED":
+                return self._reply({
+                    "TxnId": existing["txn_id"], "Label": label, "Status": "Label Already Exists",
+                    "ExistingJobStatus": "FINISHED" if existing["state"] == "VISIBLE" else "RUNNING",
+                    "Message": f"Label [{label}] has already been used.",
+                })
+            txn_id = standin.state["next_txn"]
+            standin.state["next_txn"] += 1
+            rows = body.count(b"\n") + (1 if body and not body.endswith(b"\n") else 0)
+            os.makedirs(os.path.join(standin.data_dir, db), exist_ok=True)
+            with open(standin.body_path(db, label), "wb") as f:
+                f.write(body)
+            standin.state["labels"][label] = {
+                "txn_id": txn_id, "db": db, "table": table, "rows": rows,
+                "state": "PRECOMMITTED" if two_pc else "VISIBLE",
+            }
+            standin.save()
+        self._reply({
+            "TxnId": txn_id, "Label": label, "TwoPhaseCommit": str(two_pc).lower(), "Status": "Success",
+            "Message": "OK", "NumberTotalRows": rows, "NumberLoadedRows": rows,
+            "NumberFilteredRows": 0, "LoadBytes": len(body),
+        })
+
+    def _two_phase(self, db):
+        operation = self.headers.get("txn_operation", "").lower()
+        standin = self.standin
+        with standin.lock:
+            label, txn = standin.by_txn(db, txn_id=self.headers.get("txn_id"), label=self.headers.get("label"))
+            if txn is None:
+                return self._reply({"status": "Fail", "msg": "transaction not found"})
+            if operation == "commit":
+                if txn["state"] == "VISIBLE":
+                    return self._reply({"status": "Fail",
+                                        "msg": f"transaction [{txn['txn_id']}] is already visible, not pre-committed."})
+                if txn["state"] != "PRECOMMITTED":
+                    return self._reply({"status": "Fail", "msg": f"transaction [{txn['txn_id']}] is {txn['state']}"})
+                txn["state"] = "VISIBLE"
+            elif operation == "abort":
+                if txn["state"] != "PRECOMMITTED":
+                    return self._reply({"status": "Fail", "msg": f"transaction [{txn['txn_id']}] is {txn['state']}"})
+                txn["state"] = "ABORTED"
+            else:
+                return self._reply({"status": "Fail", "msg": f"unknown txn_operation {operation!r}"})
+            standin.save()
+            if operation == "commit" and standin.lose_commit_acks > 0:
+                standin.lose_commit_acks -= 1
+                self.close_connection = True
+                self.connection.close()
+                return
+        self._reply({"status": "Success", "msg": f"transaction [{txn['txn_id']}] {operation} successfully."})
+
+def serve(host, port, be_port, standin):
+    """Start the FE and BE servers in background threads; returns both (shutdown() to stop)"""
+    be = ThreadingHTTPServer((host, be_port), type("BEHandler", (Handler,), {"standin": standin, "role": "be"}))
+    be_address = f"{host}:{be.server_address[1]}"
+    fe = ThreadingHTTPServer((host, port), type("FEHandler", (Handler,), {
+        "standin": standin, "role": "fe", "be_address": be_address}))
+    for server in (fe, be):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return fe, be
+
+def main():
+    parser = argparse.ArgumentParser(description="Doris Stream Load / 2PC stand-in for local tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8030, help="FE HTTP port")
+    parser.add_argument("--be-port", type=int, default=8040, help="BE HTTP port Stream Loads are redirected to")
+    parser.add_argument("--dir", default="doris_standin", help="where transactions and bodies are kept")
+    parser.add_argument("--lose-commit-acks", type=int, default=0,
+                        help="apply the first N commits without replying")
+    args = parser.parse_args()
+    fe, be = serve(args.host, args.port, args.be_port, StandinState(args.dir, args.lose_commit_acks))
+    print(f"Doris stand-in: FE http://{args.host}:{args.port}, BE http://{args.host}:{be.server_address[1]}, "
+          f"state in {args.dir}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fe.shutdown()
+        be.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# error_sink.py
+"""
+Streaming sink for rejected rows.
+
+Rows are written to error_files/error_<base>.csv (or .csv.gz) as they are
+rejected, instead of being collected into a DataFrame copy first. Each row
+carries three extra fields - the source line number, the failing column and
+the reason. Existing error files are appended to (a retry no longer wipes
+earlier errors) and rolled over to error_<base>.<n>.csv once they pass the
+configured size.
+"""
+import os
+import csv
+import gzip
+import io
+from local_config import logging, get_error_sink_format, get_error_sink_max_bytes
+from input_files import csv_stem
+
+ERROR_FIELDS = ["_error_row", "_error_column", "_error_reason"]
+
+class ErrorSink:
+    """Append-only, size-rotated writer for one source file's rejected rows"""
+
+    def __init__(self, error_dir, original_filename, columns, fmt=None, max_bytes=None):
+        self.error_dir = error_dir
+        self.base_name = os.path.splitext(csv_stem(original_filename))[0]
+        self.header = list(columns) + ERROR_FIELDS
+        self.fmt = fmt or get_error_sink_format()
+        self.max_bytes = get_error_sink_max_bytes() if max_bytes is None else max_bytes
+        self.extension = ".csv.gz" if self.fmt == "gzip" else ".csv"
+        self.path = os.path.join(error_dir, f"error_{self.base_name}{self.extension}")
+        self.rows_written = 0
+        self._raw = None
+        self._stream = None
+        self._writer = None
+
+    def _open_text(self, mode):
+        if self.fmt == "gzip":
+            # Appending to a gzip file adds a new member - still one valid .gz
+            return gzip.open(self.path, mode + "t", newline="", encoding="utf-8")
+        return open(self.path, mode, newline="", encoding="utf-8")
+
+    def _existing_header(self):
+        try:
+            with self._open_text("r") as f:
+                return next(csv.reader(f), None)
+        except (OSError, EOFError, UnicodeDecodeError, csv.Error):
+            return None
+
+    def _rotate(self):
+        """Move the current error file aside to the next free numbered name"""
+        n = 1
+        while True:
+            rotated = os.path.join(self.error_dir, f"error_{self.base_name}.{n}{self.extension}")
+            if not os.path.exists(rotated):
+                os.replace(self.path, rotated)
+                return rotated
+            n += 1
+
+    def _open(self):
+        os.makedirs(self.error_dir, exist_ok=True)
+        if os.path.exists(self.path):
+            if os.path.getsize(self.path) >= self.max_bytes or self._existing_header() != self.header:
+                self._rotate()
+        write_header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+
+        self._raw = open(self.path, "ab")
+        if self.fmt == "gzip":
+            self._stream = io.TextIOWrapper(gzip.GzipFile(fileobj=self._raw, mode="ab"),
+                                            newline="", encoding="utf-8")
+        else:
+            self._stream = io.TextIOWrapper(self._raw, newline="", encoding="utf-8")
+        self._writer = csv.writer(self._stream)
+        if write_header:
+            self._writer.writerow(self.header)
+
+    def write(self, values, row_number="", column="", reason=""):
+        """Write one rejected row (original values, without the generated id)"""
+        if self._writer is None:
+            self._open()
+        # NaN/None become empty fields, the same as DataFrame.to_csv
+        self._writer.writerow(["" if v is None or v != v else v for v in values]
+                              + [row_number, column, reason])
+        self.rows_written += 1
+        if self.rows_written % 1000 == 0 and self._raw.tell() >= self.max_bytes:
+            self.close()
+            self._rotate()
+
+    def write_rows(self, rows, column="", reason="", first_row_number=2):
+        """Stream an iterable of row tuples (e.g. df.itertuples(index=False, name=None))"""
+        for offset, values in enumerate(rows):
+            self.write(values, first_row_number + offset, column, reason)
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()  # flushes and finishes the gzip member
+        if self._raw is not None and not self._raw.closed:
+            self._raw.close()
+        self._raw = self._stream = self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        if self.rows_written:
+            logging.info(f"Error sink: {self.rows_written} rows -> {self.path}")
+        return False
@@ -0,0 +1,76 @@
+# fast_path.py
+"""
+Transform fast path: detect files that are already clean, without pandas.
+
+The transform stage parses the whole file, renames columns, drops duplicate
+rows, fills nulls and writes it back out - for a file that needs none of it
+that is a full parse plus a full rewrite for nothing. is_clean() decides in
+one streaming csv.reader pass:
+  - header: already the normalized column names
+  - nulls: no empty field and no null token pandas/pyarrow would read as NA
+  - duplicates: a 64-bit hash per row (8 bytes per row, no row copies),
+    sorted once at the end; a repeated hash - a real duplicate or a
+    vanishingly rare collision - just sends the file down the normal path
+Clean files are staged with stage_copy(): a kernel-side copy, no parsing.
+
+This only replaces the transform. The load stage still parses the staged
+file (it assigns the id range and validates types), so clean files are not
+sent to Stream Load as raw bytes. The check is an extra pass on files that
+turn out dirty; benchmarks/bench_fast_path.py (300k x 20) measures it:
+clean file 1.1 s instead of a 5.2 s pandas transform, dirty last line
+(worst case) about 0.5 s on top of the transform.
+
+Rows that only become duplicates after type conversion ("1" vs "1.0") are
+not caught by the byte-level check and stay in the staged file.
+"""
+import csv
+import sys
+import shutil
+from array import array
+from column_names import header_mapping
+from input_files import open_text
+
+csv.field_size_limit(sys.maxsize)
+
+# pandas' default na_values (pyarrow's null_values are a subset) plus \N
+NULL_TOKENS = frozenset([
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None",
+    "n/a", "nan", "null", "\\N",
+])
+
+def has_duplicates(row_hashes):
+    """Any repeated 64-bit row hash (sort, then compare neighbours)"""
+    import numpy as np
+    hashes = np.sort(np.frombuffer(row_hashes, dtype=np.int64))
+    return bool((hashes[1:] == hashes[:-1]).any())
+
+def is_clean(path):
+    """
+    Whether transform() would leave the file unchanged (normalized header, no
+    nulls, no duplicate rows). Returns (clean, reason it isn't).
+    """
+    row_hashes = array("q")
+    with open_text(path) as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
+            return False, "no header"
+        if header_mapping(header).columns != header:
+            return False, "header not normalized"
+        isdisjoint = NULL_TOKENS.isdisjoint
+        append = row_hashes.append
+        for record in reader:
+            if not record:
+                continue
+            if not isdisjoint(record):
+                return False, f"null at line {reader.line_num}"
+            append(hash(tuple(record)))
+    if has_duplicates(row_hashes):
+        return False, "duplicate rows"
+    return True, ""
+
+def stage_copy(src, dst):
+    """Copy without reading into Python (shutil uses sendfile on Linux)"""
+    shutil.copyfile(src, dst)
+    return dst
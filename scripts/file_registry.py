@@ -0,0 +1,129 @@
+# file_registry.py
+"""
+Content-addressed registry of processed input files.
+
+checkpoint.txt only knows file names, so a re-delivered data_2.csv with new
+content was silently ignored and an identical file under a new name was
+fully re-ingested. file_registry.json sits next to the checkpoint and keeps,
+per file name, its size, mtime and a BLAKE2b hash of the content (computed
+over an mmap of the file, so no read copies).
+
+Discovery consults the registry:
+  - same name, same size + mtime     -> done, no hashing at all
+  - same name, changed size/mtime    -> re-hash; new content is pending again
+  - new name, hash already known     -> duplicate delivery, skipped
+  - new name, new hash               -> pending
+
+In tail mode (tail.py) entries also carry a "tail" offset; a changed
+size/mtime makes them pending without re-hashing the whole file. A run
+without tail mode skips a changed tailed file (with a warning) rather than
+reloading rows that are already in Doris.
+"""
+import os
+import json
+import mmap
+import hashlib
+from local_config import FILE_REGISTRY_FILE, CSV_DIR, logging
+from coordination import locked, write_json_atomic
+
+def file_hash(path, length=None):
+    """BLAKE2b-128 of the file content (or its first `length` bytes), hashed straight from an mmap"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return h.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            h.update(memoryview(mm)[:length] if length is not None else mm)
+    return h.hexdigest()
+
+def fingerprint(path, entry=None):
+    """size/mtime/hash of `path`, reusing `entry`'s hash when size and mtime match"""
+    st = os.stat(path)
+    if entry and entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns:
+        return entry
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": file_hash(path)}
+
+def load_registry():
+    if not os.path.exists(FILE_REGISTRY_FILE):
+        return {"files": {}}
+    with open(FILE_REGISTRY_FILE) as f:
+        return json.load(f)
+
+def classify_files(names, legacy_processed=(), tail=False):
+    """
+    Split `names` (files in CSV_DIR) into pending files and skipped duplicates.
+    Files checkpointed before the registry existed (`legacy_processed`) are
+    fingerprinted once and treated as done. Returns (pending, duplicates)
+    where duplicates maps a new name to the file that had the same content.
+    With `tail`, tailed files that changed are pending (tail.py loads the new rows).
+    """
+    registry = load_registry()
+    files = registry["files"]
+    by_hash = {entry["hash"]: name for name, entry in files.items() if entry.get("hash")}
+
+    pending = []
+    duplicates = {}
+    updates = {}
+    for name in names:
+        path = os.path.join(CSV_DIR, name)
+        entry = files.get(name)
+        if entry is None and name not in legacy_processed:
+            fp = fingerprint(path)
+            original = by_hash.get(fp["hash"])
+            if original is not None and original != name:
+                duplicates[name] = original
+                updates[name] = {**fp, "duplicate_of": original}
+            else:
+                pending.append(name)
+            continue
+        if entry is not None and "tail" in entry:
+            st = os.stat(path)
+            if (st.st_size, st.st_mtime_ns) != (entry["size"], entry["mtime_ns"]):
+                if tail:
+                    pending.append(name)
+                else:
+                    # Its rows up to the tail offset are in Doris already - a full
+                    # reload would duplicate every one of them
+                    logging.warning(f"Registry: {name} is tailed and has changed - skipped; run with --tail "
+                                    f"(TAIL_MODE=1), or remove its file_registry.json entry to reload it in full")
+            continue
+
+        fp = fingerprint(path, entry)
+        if entry is None:
+            # Checkpointed by name before the registry existed - adopt as done
+            updates[name] = fp
+        elif fp is not entry:
+            if fp["hash"] == entry.get("hash"):
+                updates[name] = {**entry, **fp}  # touched, same content
+            else:
+                logging.info(f"Registry: {name} re-delivered with new content")
+                pending.append(name)
+
+    if updates:
+        record(updates)
+    for name, original in duplicates.items():
+        logging.info(f"Registry: {name} has the same content as {original}, skipped")
+    return pending, duplicates
+
+def record(entries, merge=False):
+    """
+    Store {name: fingerprint} in the registry under its lock; with `merge` the
+    fields are merged into the existing entries (a tail offset keeps the hash)
+    """
+    with locked(FILE_REGISTRY_FILE):
+        registry = load_registry()
+        files = registry["files"]
+        for name, entry in entries.items():
+            files[name] = {**files.get(name, {}), **entry} if merge else entry
+        write_json_atomic(FILE_REGISTRY_FILE, registry, indent=1)
+
+def record_done(*names):
+    """Register the content of files that have just been checkpointed (one registry write)"""
+    files = load_registry()["files"]
+    entries = {}
+    for name in names:
+        path = os.path.join(CSV_DIR, name)
+        if os.path.exists(path):
+            entries[name] = fingerprint(path, files.get(name))
+    if entries:
+        record(entries)
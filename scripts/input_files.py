@@ -0,0 +1,62 @@
+# input_files.py
+"""
+Input file names and (compressed) input streams.
+
+Producers may drop data_1.csv, data_1.csv.gz, data_1.csv.zst or
+data_1.csv.bz2. Discovery, the watcher and validation go through this module,
+which doesn't import pandas (discovery stays cheap). Compressed files are
+never unpacked on disk:
+  - open_binary()/open_text() decompress as a stream (gzip/bz2 from the
+    standard library, zstd through pyarrow's codec, or the zstandard package
+    when pyarrow is missing)
+  - the pyarrow CSV reader decompresses on its I/O thread while its worker
+    threads parse the blocks already decompressed
+"""
+import io
+import os
+import bz2
+import gzip
+
+# Suffix after ".csv" -> codec name (as pandas/pyarrow spell it)
+COMPRESSED_SUFFIXES = {".gz": "gzip", ".bz2": "bz2", ".zst": "zstd"}
+CSV_SUFFIXES = (".csv",) + tuple(f".csv{suffix}" for suffix in COMPRESSED_SUFFIXES)
+
+def is_csv(name):
+    return name.lower().endswith(CSV_SUFFIXES)
+
+def compression_of(path):
+    """Codec of a compressed CSV ("gzip", "bz2", "zstd"), or None for plain CSV"""
+    name = path.lower()
+    for suffix, codec in COMPRESSED_SUFFIXES.items():
+        if name.endswith(f".csv{suffix}"):
+            return codec
+    return None
+
+def csv_stem(name):
+    """data_1.csv.gz -> data_1.csv (staged files are always plain CSV)"""
+    if compression_of(name):
+        return os.path.splitext(name)[0]
+    return name
+
+def _open_zstd(path):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return pa.input_stream(path, compression="zstd")
+
+def open_binary(path):
+    """Binary stream of the decompressed content"""
+    codec = compression_of(path)
+    if codec == "gzip":
+        return gzip.open(path, "rb")
+    if codec == "bz2":
+        return bz2.open(path, "rb")
+    if codec == "zstd":
+        return _open_zstd(path)
+    return open(path, "rb")
+
+def open_text(path, errors="replace"):
+    """Text stream for csv.reader (BOM stripped, newlines untranslated)"""
+    return io.TextIOWrapper(open_binary(path), encoding="utf-8-sig", errors=errors, newline="")
@@ -0,0 +1,239 @@
+# load_control.py
+"""
+Adaptive chunk size and load concurrency, tuned from observed Doris latency.
+
+A fixed LOAD_CHUNK_ROWS sent one chunk at a time is either too small (one
+round trip and one rowset version per few KB, "too many versions" under
+compaction pressure) or too large (a multi-second chunk that trips a BE
+memory limit or the request timeout) depending on BE load, row width and
+the network RTT from minikube. With LOAD_ADAPTIVE=1 (the default) every
+table gets an AIMD controller that load_file consults per chunk:
+
+  chunk size   + LOAD_CHUNK_ROWS/4 rows after each chunk acknowledged well
+                 within LOAD_TARGET_CHUNK_SECONDS, up to LOAD_MAX_CHUNK_ROWS
+                 and LOAD_MAX_CHUNK_MB of column buffers;
+               x 1/2 on a chunk slower than the target, a timeout or a
+                 memory-limit error
+  in flight    + 1 after a round of chunks whose aggregate rows/s beat the
+                 best seen at the previous level by 5%, up to
+                 LOAD_MAX_CHUNKS_IN_FLIGHT; - 1 when a round is 10% slower;
+               x 1/2 on "too many versions" / busy-BE back-pressure
+
+In LOAD_MODE=2pc the chunk boundaries are part of the transaction labels
+(transactions.py), and a rerun after a crash between load and checkpoint
+has no progress record left to take them from - so there chunks stay at
+fixed LOAD_CHUNK_ROWS ranges and only the in-flight limit adapts (a memory
+limit halves it instead of the chunk size).
+
+The in-flight limit is shared by all loads into the table in this process
+(--async runs several files at once). Error signals come from every failed
+attempt, including the ones with_retry() retries. The values reached are
+written per run and table to pipeline_logs/run_metrics.json, and the next
+run starts from them.
+"""
+import os
+import json
+import threading
+from datetime import datetime, timezone
+from local_config import (
+    RUN_METRICS_FILE, logging, get_load_chunk_rows, get_load_adaptive, get_load_min_chunk_rows,
+    get_load_max_chunk_rows, get_load_max_chunk_bytes, get_load_max_in_flight,
+    get_load_target_chunk_seconds, get_load_mode
+)
+from coordination import locked, write_json_atomic
+from pipeline_logging import run_id
+
+METRICS_RUNS = 100     # runs kept in run_metrics.json
+
+# Doris error text -> congestion signal
+ERROR_SIGNALS = (
+    ("versions", ("too many versions", "-235", "too many tasks", "is busy", "too many running")),
+    ("memory", ("mem_limit_exceeded", "memory limit", "memory exceed", "exceed memory", "mem limit")),
+    ("timeout", ("timeout", "timed out")),
+)
+
+def classify_error(exc):
+    """'versions', 'memory', 'timeout' or None for errors that say nothing about load pressure"""
+    message = str(exc).lower()
+    for kind, needles in ERROR_SIGNALS:
+        if any(n in message for n in needles):
+            return kind
+    return None
+
+class LoadController:
+    """AIMD chunk size + in-flight limit for the loads into one table"""
+
+    def __init__(self, table_name, chunk_rows=None, concurrency=1, adaptive=True, fixed_chunks=False):
+        self.table_name = table_name
+        self.adaptive = adaptive
+        self.fixed_chunks = fixed_chunks
+        self.min_rows = get_load_min_chunk_rows()
+        self.max_rows = get_load_max_chunk_rows()
+        self.max_bytes = get_load_max_chunk_bytes()
+        self.max_concurrency = max(1, get_load_max_in_flight()) if adaptive else 1
+        self.target = get_load_target_chunk_seconds()
+        self.step = max(1, get_load_chunk_rows() // 4)
+        self.chunk_rows = chunk_rows or get_load_chunk_rows()
+        if adaptive and not fixed_chunks:
+            self.chunk_rows = max(self.min_rows, min(self.max_rows, self.chunk_rows))
+        self.concurrency = max(1, min(self.max_concurrency, concurrency))
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._round = []              # (rows, started, finished) of successes at this concurrency
+        self._best = 0.0              # best round rows/s seen at the previous level
+        self._slowest = 0.0
+        self.stats = {"chunks": 0, "rows": 0, "seconds": 0.0, "errors": {}, "increases": 0, "decreases": 0}
+
+    def chunk_size(self, row_bytes):
+        """Rows for the next chunk, capped so its column buffers stay under LOAD_MAX_CHUNK_MB"""
+        with self._cond:
+            if not self.adaptive or self.fixed_chunks:
+                return self.chunk_rows
+            return max(1, min(self.chunk_rows, int(self.max_bytes // max(row_bytes, 1))))
+
+    def request_timeout(self):
+        """HTTP timeout for one chunk: generous next to the slowest chunk so far, never above 300 s"""
+        with self._cond:
+            return min(300.0, max(60.0, 5 * self._slowest))
+
+    def acquire(self, block=True):
+        """Take an in-flight slot; False (non-blocking) if the table is at its limit"""
+        with self._cond:
+            while self._in_flight >= self.concurrency:
+                if not block:
+                    return False
+                self._cond.wait()
+            self._in_flight += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _adjust(self, reason, chunk_rows=None, concurrency=None):
+        old = (self.chunk_rows, self.concurrency)
+        if chunk_rows is not None and not self.fixed_chunks:
+            self.chunk_rows = max(self.min_rows, min(self.max_rows, int(chunk_rows)))
+        if concurrency is not None:
+            self.concurrency = max(1, min(self.max_concurrency, int(concurrency)))
+        if (self.chunk_rows, self.concurrency) == old:
+            return
+        grew = self.chunk_rows > old[0] or self.concurrency > old[1]
+        self.stats["increases" if grew else "decreases"] += 1
+        if self.concurrency != old[1]:
+            self._round = []
+        self._cond.notify_all()
+        message = (f"Load tuning {self.table_name}: {old[0]} rows x {old[1]} -> "
+                   f"{self.chunk_rows} rows x {self.concurrency} in flight ({reason})")
+        # Additive steps happen every few chunks - only back-offs are worth an INFO line
+        if grew:
+            logging.debug(message)
+        else:
+            logging.info(message)
+
+    def observe(self, rows, started, finished):
+        """A chunk of `rows` was acknowledged; started/finished are time.monotonic() values"""
+        seconds = finished - started
+        with self._cond:
+            self.stats["chunks"] += 1
+            self.stats["rows"] += rows
+            self.stats["seconds"] += seconds
+            self._slowest = max(self._slowest, seconds)
+            if not self.adaptive:
+                return
+            if seconds > self.target:
+                self._adjust(f"chunk took {seconds:.1f}s", chunk_rows=self.chunk_rows / 2)
+            elif seconds < self.target / 2 and rows >= self.chunk_rows:
+                self._adjust(f"chunk took {seconds:.2f}s", chunk_rows=self.chunk_rows + self.step)
+
+            # Concurrency: compare whole rounds (a few chunks per slot) by aggregate rows/s
+            self._round.append((rows, started, finished))
+            if len(self._round) < 4 * self.concurrency:
+                return
+            span = max(f for _, _, f in self._round) - min(s for _, s, _ in self._round)
+            rate = sum(r for r, _, _ in self._round) / max(span, 1e-6)
+            self._round = []
+            if rate > self._best * 1.05:
+                self._best = rate
+                self._adjust(f"{rate:,.0f} rows/s", concurrency=self.concurrency + 1)
+            elif rate < self._best * 0.9:
+                self._best = rate
+                self._adjust(f"{rate:,.0f} rows/s, below the previous level", concurrency=self.concurrency - 1)
+
+    def observe_error(self, exc):
+        """A chunk attempt failed; back off multiplicatively on congestion signals. Returns the signal"""
+        kind = classify_error(exc)
+        with self._cond:
+            errors = self.stats["errors"]
+            errors[kind or "other"] = errors.get(kind or "other", 0) + 1
+            if not self.adaptive or kind is None:
+                return kind
+            self._best = 0.0
+            if kind == "versions":
+                self._adjust("too many versions / busy", concurrency=self.concurrency // 2)
+            elif kind == "memory" and self.fixed_chunks:
+                self._adjust("memory limit", concurrency=self.concurrency // 2)
+            elif kind == "memory":
+                self._adjust("memory limit", chunk_rows=self.chunk_rows / 2)
+            else:
+                self._adjust("timeout", chunk_rows=self.chunk_rows / 2, concurrency=self.concurrency // 2)
+        return kind
+
+    def snapshot(self):
+        """Current values and totals; seconds and rows_per_second count chunk latency, not wall time"""
+        with self._cond:
+            stats = dict(self.stats, errors=dict(self.stats["errors"]))
+            stats["seconds"] = round(stats["seconds"], 3)
+            stats["rows_per_second"] = round(stats["rows"] / stats["seconds"]) if stats["seconds"] else None
+            return {"chunk_rows": self.chunk_rows, "concurrency": self.concurrency,
+                    "adaptive": self.adaptive, **stats}
+
+def _load_metrics():
+    if not os.path.exists(RUN_METRICS_FILE):
+        return {"runs": []}
+    with open(RUN_METRICS_FILE) as f:
+        return json.load(f)
+
+def last_tuning(table_name):
+    """(chunk_rows, concurrency) the most recent run settled on for the table, or None"""
+    for run in reversed(_load_metrics()["runs"]):
+        tuning = run["tables"].get(table_name)
+        if tuning and tuning.get("adaptive"):
+            return tuning["chunk_rows"], tuning["concurrency"]
+    return None
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+def get_load_controller(table_name):
+    """Process-wide controller per table, warm-started from the last run's values"""
+    with _controllers_lock:
+        controller = _controllers.get(table_name)
+        if controller is None:
+            adaptive = get_load_adaptive()
+            fixed_chunks = get_load_mode() == "2pc"
+            chunk_rows, concurrency = (last_tuning(table_name) if adaptive else None) or (None, 1)
+            controller = LoadController(table_name, None if fixed_chunks else chunk_rows, concurrency,
+                                        adaptive=adaptive, fixed_chunks=fixed_chunks)
+            _controllers[table_name] = controller
+        return controller
+
+def record_metrics(table_name):
+    """Write the table's current tuning and totals into this run's entry of run_metrics.json"""
+    controller = _controllers.get(table_name)
+    if controller is None:
+        return
+    snapshot = controller.snapshot()
+    with locked(RUN_METRICS_FILE):
+        metrics = _load_metrics()
+        runs = metrics["runs"]
+        now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        entry = next((r for r in reversed(runs) if r["run"] == run_id()), None)
+        if entry is None:
+            entry = {"run": run_id(), "started": now, "tables": {}}
+            runs.append(entry)
+        entry["tables"][table_name] = snapshot
+        entry["updated"] = now
+        metrics["runs"] = runs[-METRICS_RUNS:]
+        write_json_atomic(RUN_METRICS_FILE, metrics, indent=1)
@@ -0,0 +1,146 @@
+# load_progress.py
+"""
+Per-chunk progress records, so a failed load resumes instead of restarting.
+
+While a file loads, load_progress/<file>.json records the staged file it
+came from (size + mtime), the target table, the id range reserved for it,
+and per chunk - a row range [start, stop) of the batch - whether it has
+been sent ("planned", written before the chunk goes out) or acknowledged
+("done"). Chunk sizes vary (load_control.py), so a chunk is named by its
+range: INSERT ... WITH LABEL <table>_<first_id>_<start>_<stop>. The label
+is the same on every retry and Doris itself rejects a chunk it already
+committed ("Label ... already used") - a commit whose acknowledgement was
+lost is not loaded twice.
+
+On the next attempt process_file reuses the staged file (no transform) and
+load_file reuses the id range, skips the acknowledged chunks and re-sends
+the planned ones with their original boundaries (so their labels match)
+before cutting new chunks from the rest. The record also notes once the
+load's rejected rows are in the error file, so a resumed load doesn't
+append them a second time. If the staged file is gone or has changed, the
+record is stale: the rows it already loaded (its id range) are deleted
+before the file is loaded from scratch.
+The record is removed once the whole file is loaded.
+"""
+import os
+import json
+from local_config import LOAD_PROGRESS_DIR, STAGE_DIR
+from coordination import write_json_atomic
+from input_files import csv_stem
+
+def progress_path(filename):
+    return os.path.join(LOAD_PROGRESS_DIR, f"{filename}.json")
+
+def _staged_signature(staged_path):
+    try:
+        st = os.stat(staged_path)
+    except FileNotFoundError:
+        return None
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def resumable_stage(filename):
+    """The staged file of an interrupted load of `filename`, if it can be resumed as-is"""
+    path = progress_path(filename)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        record = json.load(f)
+    staged = record.get("staged_path") or os.path.join(STAGE_DIR, f"staged_{csv_stem(filename)}")
+    if _staged_signature(staged) != record.get("staged"):
+        return None
+    return staged
+
+class LoadProgress:
+    def __init__(self, filename, staged_path, table_name):
+        self.path = progress_path(filename)
+        self.filename = filename
+        self.staged_path = staged_path
+        self.table_name = table_name
+        self.record = None
+        self.stale = None
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                record = json.load(f)
+            if record.get("table") == table_name and \
+                    record.get("staged") == _staged_signature(staged_path):
+                self.record = record
+            elif record.get("done") or record.get("planned") or record.get("done_chunks"):
+                self.stale = record
+
+    @property
+    def first_id(self):
+        return self.record["first_id"] if self.record else None
+
+    def check(self, rows):
+        """Keep the record only if it covers the same rows; True if resumable"""
+        if self.record is not None and "done_chunks" in self.record:
+            # Written with a fixed chunk size - its chunks become ranges
+            size = self.record["chunk_rows"]
+            self.record["done"] = [[c * size, min((c + 1) * size, self.record["rows"])]
+                                   for c in self.record.pop("done_chunks")]
+            self.record["planned"] = []
+        if self.record is not None and self.record["rows"] != rows:
+            if self.record["done"] or self.record["planned"]:
+                self.stale = self.record
+            self.record = None
+        return self.record is not None
+
+    def start(self, first_id, rows):
+        self.record = {
+            "file": self.filename,
+            "table": self.table_name,
+            "staged_path": self.staged_path,
+            "staged": _staged_signature(self.staged_path),
+            "first_id": first_id,
+            "rows": rows,
+            "done": [],
+            "planned": [],
+            "rejects_written": False,
+        }
+        self._save()
+
+    @property
+    def rejects_written(self):
+        """True once this load's rejected rows were saved to the error file"""
+        return bool(self.record and self.record.get("rejects_written"))
+
+    def mark_rejects_written(self):
+        self.record["rejects_written"] = True
+        self._save()
+
+    def label(self, start, stop):
+        return f"{self.table_name}_{self.record['first_id']}_{start}_{stop}"
+
+    def unacknowledged(self):
+        """Chunks sent by an earlier attempt but never acknowledged - re-send exactly these"""
+        return sorted(tuple(r) for r in self.record["planned"])
+
+    def next_start(self):
+        """First row not yet covered by any chunk"""
+        return max((stop for _, stop in self.record["done"] + self.record["planned"]), default=0)
+
+    def done_count(self):
+        return len(self.record["done"])
+
+    def plan(self, start, stop):
+        self.record["planned"].append([start, stop])
+        self._save()
+
+    def unplan(self, start, stop):
+        """A chunk Doris rejected outright (nothing committed) - it will be cut again"""
+        self.record["planned"].remove([start, stop])
+        self._save()
+
+    def mark_done(self, start, stop):
+        if [start, stop] in self.record["planned"]:
+            self.record["planned"].remove([start, stop])
+        self.record["done"].append([start, stop])
+        self._save()
+
+    def finish(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _save(self):
+        os.makedirs(LOAD_PROGRESS_DIR, exist_ok=True)
+        write_json_atomic(self.path, self.record, indent=1)
@@ -2,12 +2,22 @@
 import os
 import logging
 
-BASE_DIR = "/app"
+BASE_DIR = os.getenv("PIPELINE_BASE_DIR", "/app")
 CSV_DIR       = os.path.join(BASE_DIR, "data")
 STAGE_DIR     = os.path.join(BASE_DIR, "stage_test")
 LOG_DIR       = os.path.join(BASE_DIR, "pipeline_logs")
+ERROR_DIR     = os.path.join(BASE_DIR, "error_files")
 CHECKPOINT_FILE = os.path.join(BASE_DIR, "checkpoint.txt")
 TABLE_MAP_FILE  = os.path.join(BASE_DIR, "table_map.json")
+CHECKPOINT_SHARD_DIR = os.path.join(BASE_DIR, "checkpoint_shards")
+ID_RANGE_FILE   = os.path.join(BASE_DIR, "id_ranges.json")
+FILE_REGISTRY_FILE = os.path.join(BASE_DIR, "file_registry.json")
+COLUMN_RULES_FILE  = os.path.join(BASE_DIR, "column_rules.json")
+LOAD_PROGRESS_DIR  = os.path.join(BASE_DIR, "load_progress")
+LOAD_GROUP_DIR     = os.path.join(BASE_DIR, "load_groups")
+QUALITY_RULES_FILE = os.path.join(BASE_DIR, "quality_rules.json")
+LEASE_DIR          = os.path.join(BASE_DIR, "leases")
+TXN_JOURNAL_FILE   = os.path.join(BASE_DIR, "load_transactions.json")
 
 # DORIS Configuration - Use functions to read at runtime, not at import time
 def get_doris_host():
@@ -31,6 +41,151 @@ def get_doris_fe_http_port():
 def get_doris_fe():
     return f"http://{get_doris_host()}:{get_doris_fe_http_port()}"
 
+def get_doris_be_http():
+    # "host:port" of a BE HTTP server for Stream Load bodies; empty = the BE
+    # the FE redirects to (its advertised address must be reachable from here)
+    return os.getenv("DORIS_BE_HTTP", "")
+
+# Watch mode configuration
+def get_watch_backend():
+    # "auto" uses inotify when available, "scan" forces the mtime-indexed directory scan
+    return os.getenv("WATCH_BACKEND", "auto")
+
+def get_watch_settle_seconds():
+    # How long a file must stay unchanged before it is considered fully written
+    return float(os.getenv("WATCH_SETTLE_SECONDS", "0.5"))
+
+def get_watch_rescan_seconds():
+    # Full catch-up scan interval (missed events, retries of failed files)
+    return float(os.getenv("WATCH_RESCAN_SECONDS", "60"))
+
+# Table routing: "multi" routes each schema to its own table (created on demand),
+# "single" rejects anything that doesn't match the main table to error_files/
+def get_table_routing():
+    return os.getenv("TABLE_ROUTING", "multi")
+
+# CSV parsing: "auto" (pyarrow if installed), "pyarrow" or "pandas"
+def get_csv_engine():
+    return os.getenv("CSV_ENGINE", "auto")
+
+def get_csv_block_size():
+    # pyarrow parses blocks of this size in parallel
+    return int(float(os.getenv("CSV_BLOCK_SIZE_MB", "16")) * 1024 * 1024)
+
+# Transform null handling: "typed" keeps nulls as real missing values (written
+# to staged files as \N), "legacy" fills every null with the string "NULL"
+def get_null_mode():
+    return os.getenv("TRANSFORM_NULL_MODE", "typed")
+
+def get_null_policies():
+    # Typed mode, per column type: numeric=null|zero|mean|median, string=null|literal
+    # e.g. NULL_POLICIES="numeric=zero,string=null"
+    return os.getenv("NULL_POLICIES", "")
+
+# Files with a normalized header, no nulls and no duplicates skip the pandas
+# transform and are staged as a byte copy
+def get_transform_fast_path():
+    return os.getenv("TRANSFORM_FAST_PATH", "1") == "1"
+
+# Error sink configuration
+def get_error_sink_format():
+    # "csv" or "gzip" (error_<file>.csv.gz)
+    return os.getenv("ERROR_SINK_FORMAT", "csv")
+
+def get_error_sink_max_bytes():
+    # Error files roll over to error_<file>.<n>.csv past this size
+    return int(float(os.getenv("ERROR_SINK_MAX_MB", "100")) * 1024 * 1024)
+
+# Loading: rows per multi-row INSERT statement / Stream Load body chunk (the
+# starting point when adaptive: see load_control.py)
+def get_load_chunk_rows():
+    return int(os.getenv("LOAD_CHUNK_ROWS", "10000"))
+
+def get_load_adaptive():
+    return os.getenv("LOAD_ADAPTIVE", "1") == "1"
+
+def get_load_min_chunk_rows():
+    return int(os.getenv("LOAD_MIN_CHUNK_ROWS", "1000"))
+
+def get_load_max_chunk_rows():
+    return int(os.getenv("LOAD_MAX_CHUNK_ROWS", "200000"))
+
+def get_load_max_chunk_bytes():
+    # Column buffers per chunk - bounds client memory and the BE's per-load memory
+    return int(float(os.getenv("LOAD_MAX_CHUNK_MB", "64")) * 1024 * 1024)
+
+def get_load_target_chunk_seconds():
+    return float(os.getenv("LOAD_TARGET_CHUNK_SECONDS", "5"))
+
+def get_load_max_in_flight():
+    # Chunks of one table loading at once (all files of this process)
+    return int(os.getenv("LOAD_MAX_CHUNKS_IN_FLIGHT", "4"))
+
+# Load mode: "insert" (labelled multi-row INSERTs over MySQL) or "2pc"
+# (Stream Load with two-phase commit, txn ids journaled - see transactions.py)
+def get_load_mode():
+    return os.getenv("LOAD_MODE", "insert")
+
+# Doris call resilience: retries with jittered exponential backoff, and a
+# circuit breaker that fails fast after repeated consecutive failures
+def get_retry_attempts():
+    return int(os.getenv("DORIS_RETRY_ATTEMPTS", "5"))
+
+def get_retry_base_delay():
+    return float(os.getenv("DORIS_RETRY_BASE_DELAY", "0.5"))
+
+def get_retry_max_delay():
+    return float(os.getenv("DORIS_RETRY_MAX_DELAY", "30"))
+
+def get_breaker_failures():
+    return int(os.getenv("DORIS_BREAKER_FAILURES", "5"))
+
+def get_breaker_cooldown():
+    return float(os.getenv("DORIS_BREAKER_COOLDOWN", "30"))
+
+# Small-file coalescing (COALESCE=1 or --coalesce): same-schema files are
+# loaded together as one INSERT, within these limits per group
+def get_coalesce_enabled():
+    return os.getenv("COALESCE", "0") == "1"
+
+def get_coalesce_max_bytes():
+    # Files at or above this size are always loaded on their own
+    return int(float(os.getenv("COALESCE_MAX_MB", "8")) * 1024 * 1024)
+
+def get_coalesce_max_files():
+    return int(os.getenv("COALESCE_MAX_FILES", "200"))
+
+def get_coalesce_max_rows():
+    return int(os.getenv("COALESCE_MAX_ROWS", "50000"))
+
+# Tail mode (TAIL_MODE=1 or --tail): grown files load only their appended rows
+def get_tail_enabled():
+    return os.getenv("TAIL_MODE", "0") == "1"
+
+# Profiling (PROFILE=1 or --profile): cProfile + stack samples + tracemalloc
+# per file and stage, written to pipeline_logs/profiles/<run id>/
+def get_profile_enabled():
+    return os.getenv("PROFILE", "0") == "1"
+
+def get_profile_sample_ms():
+    return float(os.getenv("PROFILE_SAMPLE_MS", "5"))
+
+# Dry-run planning (--plan): bytes read per sampled block (head, middle, end)
+def get_plan_sample_bytes():
+    return int(float(os.getenv("PLAN_SAMPLE_KB", "256")) * 1024)
+
+# File leases: how long a claim on a file survives without a heartbeat
+# (renewed every third of this while the file is processed)
+def get_lease_ttl():
+    return float(os.getenv("LEASE_TTL_SECONDS", "300"))
+
+# Async runs (--async): loads in flight at once, and transform worker processes
+def get_load_concurrency():
+    return int(os.getenv("LOAD_CONCURRENCY", "4"))
+
+def get_transform_workers():
+    return int(os.getenv("TRANSFORM_WORKERS", str(min(4, os.cpu_count() or 1))))
+
 # Legacy compatibility - these read at import time but can be overridden by env
 DORIS_HOST = get_doris_host()
 DORIS_PORT = get_doris_port()
@@ -54,12 +209,35 @@ for d in [CSV_DIR, STAGE_DIR, LOG_DIR]:
     os.makedirs(d, exist_ok=True)
 
 LOG_FILE = os.path.join(LOG_DIR, "pipeline.log")
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    filemode='a'
+QUALITY_COUNTS_FILE = os.path.join(LOG_DIR, "quality_counters.json")
+RUN_METRICS_FILE = os.path.join(LOG_DIR, "run_metrics.json")
+
+# Logging: "text" (the classic format) or "json" with run/file/stage ids.
+# Records go through a queue; a background thread writes them
+def get_log_format():
+    return os.getenv("LOG_FORMAT", "text")
+
+def get_log_level():
+    # DEBUG also prints the verbose per-column output
+    return os.getenv("LOG_LEVEL", "INFO")
+
+def get_log_max_bytes():
+    return int(float(os.getenv("LOG_MAX_MB", "50")) * 1024 * 1024)
+
+def get_log_backups():
+    return int(os.getenv("LOG_BACKUPS", "5"))
+
+def get_run_id():
+    return os.getenv("PIPELINE_RUN_ID")
+
+from pipeline_logging import configure_logging, run_id
+configure_logging(
+    LOG_FILE,
+    fmt=get_log_format(),
+    level=get_log_level(),
+    max_bytes=get_log_max_bytes(),
+    backups=get_log_backups(),
+    run_id=get_run_id(),
 )
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-logging.getLogger().addHandler(console)
\ No newline at end of file
+# Child processes (async transform workers) log under the same run id
+os.environ.setdefault("PIPELINE_RUN_ID", run_id())
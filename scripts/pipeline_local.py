@@ -1,52 +1,131 @@
 # pipeline_local.py
-import subprocess
 import os
+import sys
+import json
 import time
+import argparse
 from datetime import datetime
-from local_config import logging, CSV_DIR
+from local_config import (
+    logging, CSV_DIR, get_watch_backend, get_watch_settle_seconds, get_watch_rescan_seconds,
+    get_coalesce_enabled, get_tail_enabled, get_profile_enabled, get_load_mode
+)
+from pipeline_steps import log_step, load_stage, FileClaimedError, process_file
 
-def log_step(message, level="INFO"):
-    """Print and log a message with timestamp"""
-    timestamp = datetime.now().strftime("%H:%M:%S")
-    symbol = {
-        "INFO": "[INFO]",
-        "SUCCESS": "[OK]  ",
-        "ERROR": "[ERR] ",
-        "WARN": "[WARN]",
-        "START": "[>>>] ",
-        "PROCESS": "[FILE]"
-    }.get(level, "      ")
-    
-    formatted = f"[{timestamp}] {symbol} {message}"
-    print(formatted)
-    
-    if level == "ERROR":
-        logging.error(message)
-    elif level == "WARN":
-        logging.warning(message)
+def reconcile_transactions():
+    """LOAD_MODE=2pc: settle the loads an interrupted run left pre-committed, before loading anything"""
+    if get_load_mode() != "2pc":
+        return
+    from transactions import reconcile
+    counts = reconcile()
+    if counts["committed"] or counts["aborted"]:
+        log_step(f"2PC: committed {counts['committed']} pre-committed loads of an interrupted run, "
+                 f"{counts['aborted']} aborted (their files load again)", "INFO")
+
+def run_watch():
+    """
+    Long-running mode: watch CSV_DIR and process each new CSV as soon as it
+    is fully written, without paying interpreter/pandas startup per file.
+    """
+    from watcher import DirectoryWatcher
+    from discover_next_1 import load_processed
+    from file_registry import classify_files
+    from input_files import CSV_SUFFIXES
+
+    watcher = DirectoryWatcher(
+        CSV_DIR,
+        suffixes=CSV_SUFFIXES,
+        settle_seconds=get_watch_settle_seconds(),
+        backend=get_watch_backend(),
+    )
+    rescan_seconds = get_watch_rescan_seconds()
+    reconcile_transactions()
+    log_step(f"Watching {CSV_DIR} for new CSV files (backend: {watcher.backend})", "START")
+
+    processed = load_processed()
+    next_rescan = 0.0
+    try:
+        while True:
+            force_scan = time.monotonic() >= next_rescan
+            if force_scan:
+                next_rescan = time.monotonic() + rescan_seconds
+                processed = load_processed()
+            ready = watcher.poll(timeout=1.0, force_scan=force_scan)
+            pending, _ = classify_files(ready, processed) if ready else ([], {})
+            for filename in pending:
+                start = time.time()
+                try:
+                    process_file(filename)
+                    log_step(f"{filename} done in {time.time() - start:.2f} seconds", "INFO")
+                except FileClaimedError as e:
+                    # Another run owns it - looked at again on the next full rescan
+                    watcher.forget(filename)
+                    log_step(f"Skipped: {e}", "INFO")
+                except Exception as e:
+                    # Not checkpointed - the next full rescan retries it
+                    watcher.forget(filename)
+                    log_step(f"Processing failed: {filename}: {e}", "ERROR")
+    except KeyboardInterrupt:
+        log_step("Watcher stopped", "INFO")
+    finally:
+        watcher.close()
+
+def emit_shards(shard_size):
+    """
+    Fan-out discovery: print the pending files as a JSON list of shards for
+    Argo `withParam`. Only the JSON goes to stdout (logs go to stderr/file).
+    """
+    from discover_next_1 import pending_files
+    pending = pending_files()
+    shards = [
+        {"shard": str(i // shard_size), "files": json.dumps(pending[i:i + shard_size])}
+        for i in range(0, len(pending), shard_size)
+    ]
+    logging.info(f"Fan-out: {len(pending)} pending files in {len(shards)} shards")
+    print(json.dumps(shards))
+
+def run_plan(tail=False, as_json=False):
+    """
+    Dry run: what the next batch run would load, grouped by target table, with
+    sampled problems and a wall-time estimate. Touches neither Doris nor
+    STAGE_DIR (see planner.py).
+    """
+    from planner import build_plan, print_plan
+    plan = build_plan(tail=tail)
+    if as_json:
+        print(json.dumps(plan, indent=1))
     else:
-        logging.info(message)
+        print_plan(plan)
 
-def run(cmd, desc):
-    print(f"\n{'='*60}")
-    print(f" {desc}")
-    print(f"{'='*60}")
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-    if result.returncode != 0:
-        print(f" FAILED: {result.stderr}")
-        logging.error(f"{desc} failed: {result.stderr}")
-        raise RuntimeError(f"{desc} failed")
-    output = result.stdout.strip()
-    if output:
-        print(output)
-    logging.info(f"SUCCESS: {desc}")
-    return output
+def run_shard(shard_id, files):
+    """
+    Process one shard of files in a fan-out pod. Checkpoints go to the shard's
+    own file (merged later by --consolidate) and ids come from the shared
+    reservation counter, so any number of shard pods can run side by side.
+    """
+    checkpoint_file = load_stage("6_checkpoint").shard_checkpoint_file(shard_id)
+    log_step(f"Shard {shard_id}: {len(files)} files", "START")
+    reconcile_transactions()
+    failed = []
+    for filename in files:
+        try:
+            process_file(filename, checkpoint_file=checkpoint_file)
+        except FileClaimedError as e:
+            log_step(f"Skipped: {e}", "INFO")
+        except Exception as e:
+            # Not checkpointed - picked up again by the next discovery
+            log_step(f"Processing failed: {filename}: {e}", "ERROR")
+            failed.append(filename)
+    if failed:
+        log_step(f"Shard {shard_id}: {len(failed)} files failed: {', '.join(failed)}", "ERROR")
+        sys.exit(1)
+    log_step(f"Shard {shard_id} complete", "SUCCESS")
 
-if __name__ == "__main__":
+def run_batch(coalesce=False, tail=False):
     start_time = time.time()
     processed_count = 0
     error_count = 0
     skipped_rows_total = 0
+    failed = []
     
     # Clear banner for each workflow run
     print("\n" + "=" * 70)
@@ -57,99 +136,84 @@ if __name__ == "__main__":
     log_step("CSV TO DORIS PIPELINE STARTED", "START")
     
     try:
-        # 1. Ingest - discover all CSVs
-        log_step("Step 1: Discovering CSV files...", "INFO")
-        run("python3 0_ingest.py", "Ingest discovery")
+        reconcile_transactions()
         
-        # Count total files
-        import glob
-        all_files = sorted([os.path.basename(f) for f in glob.glob(os.path.join(CSV_DIR, "*.csv"))])
+        # 1. Ingest - discover all CSVs (one directory listing, no pandas import)
+        from discover_next_1 import list_csv_files, pending_files
+        from resilience import CircuitOpenError
+        log_step("Step 1: Discovering CSV files...", "INFO")
+        all_files = list_csv_files()
         log_step(f"Found {len(all_files)} CSV files: {', '.join(all_files)}", "INFO")
         
-        # Check how many already processed
-        checkpoint_file = os.path.join(os.path.dirname(CSV_DIR), "checkpoint.txt")
-        processed_already = set()
-        if os.path.exists(checkpoint_file):
-            with open(checkpoint_file) as f:
-                processed_already = {line.strip() for line in f if line.strip()}
-        
-        remaining = len(all_files) - len(processed_already)
-        log_step(f"Already processed: {len(processed_already)} files", "INFO")
+        # Check how many already processed - by content, not just by name
+        pending = pending_files(tail=tail)
+        remaining = len(pending)
+        log_step(f"Already processed: {len(all_files) - remaining} files", "INFO")
         log_step(f"Remaining to process: {remaining} files", "INFO")
         
-        # 2. Process ALL unprocessed files
-        file_number = 1
-        while True:
-            # Discover next unprocessed file
-            next_file = run("python3 discover_next_1.py", "Discover next file")
-            if not next_file:
-                log_step("All files processed!", "SUCCESS")
-                break
-            
+        # 2. Process ALL unprocessed files in this process - pandas and the
+        #    stage modules are only imported once there is work to do
+        if tail and pending:
+            # Grown files load only their new rows - not grouped with others
+            from tail import process_tail
+            from input_files import compression_of
+            log_step(f"Tail mode: loading new rows of {remaining} files", "INFO")
+        elif coalesce and pending:
+            from coalesce import plan_groups, process_group
+            groups = plan_groups(pending)
+            log_step(f"Coalescing {remaining} files into {len(groups)} loads", "INFO")
+            for group in groups:
+                try:
+                    result = process_group(group)
+                except CircuitOpenError:
+                    raise
+                except Exception as e:
+                    # Nothing in the failed load was checkpointed - retried next run
+                    log_step(f"Processing failed: {', '.join(group)}", "ERROR")
+                    log_step(f"Error: {e}", "ERROR")
+                    failed.extend(group)
+                    continue
+                processed_count += result["loaded"]
+                error_count += result["rejected"]
+                skipped_rows_total += result["bad_rows"]
+            pending = []
+        
+        for file_number, next_file in enumerate(pending, start=1):
             log_step("=" * 60, "PROCESS")
             log_step(f"Processing file {file_number}/{remaining}: {next_file}", "PROCESS")
             log_step("=" * 60, "PROCESS")
             
             try:
-                # 3. Validate
-                log_step(f"Validating {next_file}...", "INFO")
-                run(f"python3 2_validate.py \"{next_file}\"", f"Validate {next_file}")
-                log_step(f"Validation passed", "SUCCESS")
-                
-                # 4. Transform & Stage
-                log_step(f"Transforming and staging {next_file}...", "INFO")
-                transform_output = run("python3 3_transform.py", "Transform & Stage")
-                staged = transform_output.strip().splitlines()[-1].strip()
-                log_step(f"Staged file created: {os.path.basename(staged)}", "SUCCESS")
-                
-                # 5. Load to Doris (with schema validation and row-level error handling)
-                log_step(f"Loading to Doris database...", "INFO")
-                env = os.environ.copy()
-                env["DORIS_HOST"] = os.getenv("DORIS_HOST", "host.docker.internal")
-                env["DORIS_FE_HTTP_PORT"] = os.getenv("DORIS_FE_HTTP_PORT", "8030")
-                
-                result = subprocess.run(
-                    ["python3", "4_load_to_doris.py", staged, next_file], 
-                    check=True, 
-                    env=env,
-                    capture_output=True,
-                    text=True
-                )
-                print(result.stdout)
-                
-                # Check if there were skipped rows
-                if "bad rows" in result.stdout.lower() or "skipped" in result.stdout.lower():
-                    import re
-                    match = re.search(r'(\d+)\s+bad rows', result.stdout, re.IGNORECASE)
-                    if match:
-                        bad_count = int(match.group(1))
-                        skipped_rows_total += bad_count
-                        log_step(f"Skipped {bad_count} bad rows - saved to error file", "WARN")
-                
-                log_step(f"Data loaded successfully", "SUCCESS")
-                
-                # 6. Checkpoint - mark as processed
-                run(f"python3 6_checkpoint.py \"{next_file}\"", "Update checkpoint")
-                
-                processed_count += 1
-                file_number += 1
-                log_step(f"COMPLETED: {next_file}", "SUCCESS")
-                
-            except subprocess.CalledProcessError as e:
-                # Check if it's a schema mismatch error
-                if "SCHEMA_MISMATCH" in e.stderr or "SCHEMA_MISMATCH" in e.stdout:
-                    log_step(f"Schema mismatch detected in {next_file}", "WARN")
-                    log_step(f"File saved to error_files/error_{next_file}", "WARN")
-                    log_step(f"Expected schema doesn't match - file skipped", "WARN")
-                    error_count += 1
-                    # Still checkpoint it so we don't retry
-                    run(f"python3 6_checkpoint.py \"{next_file}\"", "Checkpoint (error)")
-                    file_number += 1
+                # Compressed files can't be appended to in place - always loaded whole
+                if tail and not compression_of(next_file):
+                    summary = process_tail(next_file)
                 else:
-                    # Other errors - don't checkpoint, allow retry
-                    log_step(f"Processing failed: {next_file}", "ERROR")
-                    log_step(f"Error: {e.stderr}", "ERROR")
-                    raise
+                    summary = process_file(next_file)
+            except CircuitOpenError:
+                # Doris is down - no point trying the remaining files now
+                raise
+            except FileClaimedError as e:
+                # An overlapping run has it - not an error, not checkpointed here
+                log_step(f"Skipped: {e}", "INFO")
+                continue
+            except Exception as e:
+                # Other errors - don't checkpoint, allow retry (resumes from
+                # the last acknowledged chunk); carry on with the next file
+                log_step(f"Processing failed: {next_file}", "ERROR")
+                log_step(f"Error: {e}", "ERROR")
+                failed.append(next_file)
+                continue
+            
+            if summary is None:
+                error_count += 1
+            else:
+                processed_count += 1
+                skipped_rows_total += summary["bad_rows"]
+        
+        if failed:
+            log_step(f"{len(failed)} files failed and will be retried: {', '.join(failed)}", "WARN")
+        else:
+            log_step("All files processed!", "SUCCESS")
         
         # Summary
         elapsed_time = time.time() - start_time
@@ -159,11 +223,89 @@ if __name__ == "__main__":
         log_step(f"Total runtime: {elapsed_time:.2f} seconds", "INFO")
         log_step(f"Files processed: {processed_count}", "SUCCESS")
         if error_count > 0:
-            log_step(f"Schema mismatch errors: {error_count} files", "WARN")
+            log_step(f"Rejected files: {error_count} (see error_files/)", "WARN")
         if skipped_rows_total > 0:
             log_step(f"Bad rows skipped: {skipped_rows_total} rows", "WARN")
         print("=" * 70 + "\n")
         
     except Exception as e:
         log_step(f"Pipeline failed: {e}", "ERROR")
-        logging.error(f"Pipeline failed: {e}")
\ No newline at end of file
+        logging.error(f"Pipeline failed: {e}")
+
+def run_async_batch():
+    """Batch run with transforms in a process pool and several loads in flight"""
+    import async_pipeline
+    from discover_next_1 import pending_files
+    start_time = time.time()
+    log_step("CSV TO DORIS PIPELINE STARTED (async)", "START")
+    reconcile_transactions()
+    pending = pending_files()
+    log_step(f"Remaining to process: {len(pending)} files", "INFO")
+    if not pending:
+        return
+    
+    result = async_pipeline.run(pending)
+    log_step(f"Total runtime: {time.time() - start_time:.2f} seconds", "INFO")
+    log_step(f"Files processed: {result['loaded']}", "SUCCESS")
+    if result["rejected"]:
+        log_step(f"Rejected files: {result['rejected']} (see error_files/)", "WARN")
+    if result["bad_rows"]:
+        log_step(f"Bad rows skipped: {result['bad_rows']} rows", "WARN")
+    if result["failed"]:
+        log_step(f"Failed (retried next run): {', '.join(result['failed'])}", "ERROR")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CSV to Doris pipeline")
+    parser.add_argument("--watch", action="store_true",
+                        help="run as a daemon and process new CSVs as they arrive")
+    parser.add_argument("--emit-shards", action="store_true",
+                        help="print pending files as JSON shards for an Argo fan-out")
+    parser.add_argument("--shard-size", type=int, default=int(os.getenv("SHARD_SIZE", "1")),
+                        help="files per shard for --emit-shards (default: $SHARD_SIZE or 1)")
+    parser.add_argument("--shard-id", help="process one fan-out shard with this id")
+    parser.add_argument("--files", default="[]",
+                        help="JSON list (or comma-separated) of files for --shard-id")
+    parser.add_argument("--consolidate", action="store_true",
+                        help="merge shard checkpoints into checkpoint.txt")
+    parser.add_argument("--coalesce", action="store_true",
+                        help="load small same-schema files together as one transaction (also $COALESCE=1)")
+    parser.add_argument("--tail", action="store_true",
+                        help="load only rows appended to already loaded files (also $TAIL_MODE=1)")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile every stage into pipeline_logs/profiles/ (also $PROFILE=1)")
+    parser.add_argument("--plan", action="store_true",
+                        help="dry run: sample pending files and estimate rows, routing and wall time")
+    parser.add_argument("--plan-json", action="store_true",
+                        help="print the --plan report as JSON")
+    parser.add_argument("--async", dest="async_run", action="store_true",
+                        help="overlap transforms (process pool) with $LOAD_CONCURRENCY loads in threads")
+    args = parser.parse_args()
+
+    # Inside the pod Doris is reached through the Docker host gateway
+    os.environ.setdefault("DORIS_HOST", "host.docker.internal")
+    os.environ.setdefault("DORIS_FE_HTTP_PORT", "8030")
+
+    if args.profile or get_profile_enabled():
+        import profiling
+        profiling.enable()
+
+    if args.plan or args.plan_json:
+        run_plan(tail=args.tail or get_tail_enabled(), as_json=args.plan_json)
+    elif args.emit_shards:
+        emit_shards(max(1, args.shard_size))
+    elif args.shard_id is not None:
+        try:
+            shard_files = json.loads(args.files)
+        except ValueError:
+            shard_files = [f.strip() for f in args.files.split(",") if f.strip()]
+        run_shard(args.shard_id, shard_files)
+    elif args.consolidate:
+        load_stage("6_checkpoint").consolidate_checkpoints()
+    elif args.watch:
+        run_watch()
+    elif args.async_run:
+        run_async_batch()
+    else:
+        run_batch(coalesce=args.coalesce or get_coalesce_enabled(),
+                  tail=args.tail or get_tail_enabled())
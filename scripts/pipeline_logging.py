@@ -0,0 +1,118 @@
+# pipeline_logging.py
+"""
+Non-blocking, structured logging for the pipeline.
+
+Every logging call only enqueues the record (QueueHandler); a background
+QueueListener thread does the formatting and the file/console writes, so log
+I/O stays off the processing path. pipeline.log rotates by size
+(LOG_MAX_MB, LOG_BACKUPS) instead of growing forever.
+
+LOG_FORMAT=json writes one JSON object per line with correlation ids:
+  {"ts": "...", "level": "INFO", "msg": "...", "run": "...", "file": "data_1.csv", "stage": "load"}
+`run` comes from PIPELINE_RUN_ID (the Argo workflow name in the cron/fan-out
+templates, a random id otherwise); `file` and `stage` are set with
+log_context() around each file and stage. LOG_FORMAT=text keeps the
+original "%(asctime)s [%(levelname)s] %(message)s" lines.
+
+LOG_LEVEL gates the log file and verbose(): per-column detail output is only
+printed with LOG_LEVEL=DEBUG.
+"""
+import json
+import uuid
+import queue
+import atexit
+import logging
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+
+_run_id = ""
+_file = contextvars.ContextVar("file", default="")
+_stage = contextvars.ContextVar("stage", default="")
+_listener = None
+
+class ContextFilter(logging.Filter):
+    """Stamp run/file/stage onto the record in the calling thread, before it is queued"""
+
+    def filter(self, record):
+        record.run_id = _run_id
+        record.file = _file.get()
+        record.stage = _stage.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+            "run": getattr(record, "run_id", ""),
+        }
+        for key in ("file", "stage"):
+            value = getattr(record, key, "")
+            if value:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+def configure_logging(log_file, fmt="text", level="INFO", max_bytes=0, backups=5, run_id=None):
+    """Route the root logger through a queue to a (rotating) file and the console"""
+    global _listener, _run_id
+    if _listener is not None:
+        return
+    # One id per process - shared by all threads, unlike file/stage
+    _run_id = run_id or uuid.uuid4().hex[:12]
+
+    formatter = JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT)
+    file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backups)
+    file_handler.setFormatter(formatter)
+    console = logging.StreamHandler()
+    console.setLevel(logging.INFO)
+    console.setFormatter(formatter if fmt == "json" else logging.Formatter("%(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+    root.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, file_handler, console, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """Flush everything still queued (registered with atexit)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def run_id():
+    return _run_id
+
+def current_file():
+    """The file set by the innermost log_context(), if any"""
+    return _file.get()
+
+@contextmanager
+def log_context(file=None, stage=None):
+    """Tag every record logged inside the block (in this thread/task) with file/stage"""
+    tokens = []
+    if file is not None:
+        tokens.append((_file, _file.set(file)))
+    if stage is not None:
+        tokens.append((_stage, _stage.set(stage)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+def verbose():
+    """True when detail output (per-column analysis etc.) should be printed"""
+    return logging.getLogger().isEnabledFor(logging.DEBUG)
@@ -0,0 +1,116 @@
+# pipeline_steps.py
+"""
+The per-file steps every run mode shares: logging a step, importing a stage
+script, claiming a file's lease and validate -> transform -> load ->
+checkpoint for one file. pipeline_local.py, tail.py, coalesce.py,
+async_pipeline.py and planner.py import them from here - pipeline_local.py
+runs as __main__, so importing it again would create a second copy of the
+module with its own FileClaimedError class.
+"""
+import os
+import importlib
+from contextlib import contextmanager
+from datetime import datetime
+from local_config import logging, CHECKPOINT_FILE
+from pipeline_logging import log_context
+from profiling import profile_stage
+
+def log_step(message, level="INFO"):
+    """Print and log a message with timestamp"""
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    symbol = {
+        "INFO": "[INFO]",
+        "SUCCESS": "[OK]  ",
+        "ERROR": "[ERR] ",
+        "WARN": "[WARN]",
+        "START": "[>>>] ",
+        "PROCESS": "[FILE]"
+    }.get(level, "      ")
+    
+    formatted = f"[{timestamp}] {symbol} {message}"
+    print(formatted)
+    
+    if level == "ERROR":
+        logging.error(message)
+    elif level == "WARN":
+        logging.warning(message)
+    else:
+        logging.info(message)
+
+def load_stage(module_name):
+    """Import a numbered stage script (e.g. "2_validate") as a module"""
+    return importlib.import_module(module_name)
+
+class FileClaimedError(RuntimeError):
+    """Another run holds the file's lease, or has loaded the file meanwhile"""
+
+@contextmanager
+def claim(filename):
+    """
+    Hold `filename`'s lease for the block. Raises FileClaimedError when
+    another run (cron overlap, extra instance) has it or already loaded it.
+    """
+    from coordination import file_lease
+    from discover_next_1 import is_pending
+    with file_lease(filename) as lease:
+        if lease is None:
+            raise FileClaimedError(f"{filename} is being processed by another run")
+        # Discovery ran before the lease was ours - the other run may be done by now
+        if not is_pending(filename):
+            raise FileClaimedError(f"{filename} was already loaded by another run")
+        yield lease
+
+def process_file(filename, checkpoint_file=None):
+    """
+    Run validate -> transform -> load -> checkpoint for one file in this process.
+    Returns the load summary, or None when the file was rejected (malformed or schema mismatch).
+    `checkpoint_file` redirects the checkpoint (shard pods use their own file).
+    Raises FileClaimedError if another run holds the file.
+    """
+    # Every record logged while this file is processed carries its name
+    with log_context(file=filename), claim(filename) as lease:
+        return _process_file(filename, checkpoint_file or CHECKPOINT_FILE, lease)
+
+def _process_file(filename, checkpoint_file, lease):
+    mark_done = load_stage("6_checkpoint").mark_done
+
+    log_step(f"Processing {filename}", "PROCESS")
+    validator = load_stage("2_validate")
+    with log_context(stage="validate"), profile_stage("validate"):
+        validation = validator.validate(filename)
+        if not validation["ok"]:
+            if validation["retryable"]:
+                # Probably still arriving - leave it for the next run
+                raise RuntimeError(f"Not ready: {filename}: {validation['reason']}")
+            # Malformed - reject before any transform/load work, don't retry
+            validator.quarantine(filename, validation["reason"])
+            log_step(f"Rejected {filename}: {validation['reason']}", "WARN")
+            mark_done(filename, checkpoint_file)
+            return None
+
+    # An interrupted load resumes from its staged file - no second transform
+    from load_progress import resumable_stage
+    staged = resumable_stage(filename)
+    if staged is not None:
+        log_step(f"Resuming interrupted load of {filename} from {os.path.basename(staged)}", "INFO")
+    else:
+        with log_context(stage="transform"), profile_stage("transform"):
+            staged = load_stage("3_transform").transform(filename)
+
+    loader = load_stage("4_load_to_doris")
+    lease.check()
+    with log_context(stage="load"), profile_stage("load"):
+        try:
+            summary = loader.load_file(staged, filename)
+        except loader.SchemaMismatchError:
+            log_step(f"Schema mismatch detected in {filename} - file skipped", "WARN")
+            mark_done(filename, checkpoint_file)
+            return None
+
+    if summary and summary["bad_rows"]:
+        log_step(f"Skipped {summary['bad_rows']} bad rows - saved to error file", "WARN")
+    with log_context(stage="checkpoint"), profile_stage("checkpoint"):
+        lease.check()
+        mark_done(filename, checkpoint_file)
+    log_step(f"COMPLETED: {filename}", "SUCCESS")
+    return summary
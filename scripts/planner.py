@@ -0,0 +1,428 @@
+# planner.py
+"""
+Dry-run planning (--plan): what would the next run load, where, and for how long?
+
+Nothing is loaded, staged or recorded - no Doris connection, no STAGE_DIR
+writes, no registry/checkpoint updates. The cost per pending file is a stat
+and a few sampled blocks, never a full read, so planning terabytes of drops
+takes seconds:
+  - pending: registry size/mtime and checkpoint names only. Content hashes
+    are not computed, so a re-delivered duplicate counts as pending (flagged
+    when a loaded file has the same size)
+  - rows/bytes: header plus PLAN_SAMPLE_KB blocks from the head, middle and
+    end of the data (head only for compressed files, scaled by the
+    compression ratio seen so far); bytes per line extrapolated over the
+    file. Small files are read whole and counted exactly
+  - routing: the header goes through the column rules and the table router
+    as load_file would route it (exact / subset / new table), or against the
+    main schema with TABLE_ROUTING=single; nothing is registered
+  - problems in the sample: records with the wrong field count (validation
+    would reject the file), undecodable lines, and values that break a
+    column that is otherwise numeric (likely bad rows at load)
+  - wall time: a per-file overhead + per-row cost fitted to the files timed
+    in pipeline.log ("Processing x" .. "COMPLETED: x", rows from the
+    "Validated:" / "Tail:" lines), for a sequential batch run
+"""
+import io
+import os
+import re
+import bz2
+import csv
+import sys
+import gzip
+import json
+from datetime import datetime
+from local_config import CSV_DIR, LOG_FILE, logging, get_plan_sample_bytes, get_table_routing
+from column_names import header_mapping
+from input_files import compression_of
+from fast_path import NULL_TOKENS
+from table_router import get_router
+
+csv.field_size_limit(sys.maxsize)
+
+HISTORY_FILES = 500       # most recent timed files the wall-time model is fitted on
+NUMERIC_SHARE = 0.9       # a column this numeric in the sample is treated as numeric
+
+_TEXT_LINE = re.compile(r"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3}) \[\w+\] (.*)$")
+_START = re.compile(r"^Processing (?!file \d+/\d+: |failed: )(.+)$")
+_TAIL_START = re.compile(r"^Tail: (.+) lines (\d+)-(\d+) \(bytes")
+_ROWS = re.compile(r"^Validated: (.+) \((\d+) rows in ")
+_DONE = re.compile(r"^COMPLETED: (.+?)(?: up to line \d+)?$")
+
+class FileSample:
+    """Header and sampled records of one file, with the extrapolated totals"""
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size            # bytes on disk (compressed for .gz/.zst/.bz2)
+        self.header = None
+        self.data_bytes = 0         # estimated uncompressed bytes after the header
+        self.rows = 0
+        self.exact = False
+        self.sampled_rows = 0
+        self.bad_fields = 0         # records with the wrong number of fields
+        self.bad_encoding = 0
+        self.suspect = 0            # non-numeric values in otherwise numeric columns
+        self.first_bad = ""
+        self.notes = []
+
+def _decompressing(raw, codec):
+    """Decompressed stream over the open file `raw` (raw.tell() = compressed bytes consumed)"""
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=raw)
+    if codec == "bz2":
+        return bz2.BZ2File(raw)
+    try:
+        import pyarrow as pa
+    except ImportError:
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(raw)
+    return pa.CompressedInputStream(pa.PythonFile(raw, mode="r"), "zstd")
+
+def _complete_lines(block, at_start, at_end):
+    """Trim a sampled block to whole lines (a partial first/last line is dropped)"""
+    if not at_start:
+        block = block[block.find(b"\n") + 1:] if b"\n" in block else b""
+    if not at_end:
+        block = block[:block.rfind(b"\n") + 1]
+    return block
+
+def _read_blocks(path, start, block):
+    """(header line, [data blocks], uncompressed data bytes, exact) of a plain CSV"""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        header = f.readline()
+        start = max(start, len(header))
+        data = size - start
+        if data <= 3 * block:
+            f.seek(start)
+            return header, [f.read(data)], data, True
+        blocks = []
+        for i, pos in enumerate((start, start + (data - block) // 2, size - block)):
+            f.seek(pos)
+            blocks.append(_complete_lines(f.read(block), at_start=i == 0, at_end=i == 2))
+    return header, blocks, data, False
+
+def _read_compressed(path, codec, block):
+    """Same for a compressed CSV: the head only, sizes scaled by the compression ratio"""
+    with open(path, "rb") as raw:
+        size = os.fstat(raw.fileno()).st_size
+        stream = _decompressing(raw, codec)
+        try:
+            head = stream.read(4 * block)
+            exact = len(head) < 4 * block or not stream.read(1)
+            consumed = raw.tell()
+        finally:
+            stream.close()
+    end = head.find(b"\n") + 1 or len(head)
+    header, head = head[:end], head[end:]
+    if exact:
+        return header, [head], len(head), True
+    ratio = (len(header) + len(head)) / max(consumed, 1)
+    return header, [_complete_lines(head, True, False)], max(0, int(size * ratio) - len(header)), False
+
+def _is_number(value):
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+def sample_file(name, start=0):
+    """Sample CSV_DIR/<name> (from byte `start` for a tailed file) into a FileSample"""
+    path = os.path.join(CSV_DIR, name)
+    sample = FileSample(name, os.path.getsize(path))
+    if sample.size == 0:
+        sample.notes.append("empty - left for a later run")
+        return sample
+    block = get_plan_sample_bytes()
+    codec = compression_of(name)
+    try:
+        if codec:
+            header_line, blocks, data_bytes, exact = _read_compressed(path, codec, block)
+        else:
+            header_line, blocks, data_bytes, exact = _read_blocks(path, start, block)
+    except (EOFError, OSError) as e:
+        sample.notes.append(f"unreadable sample: {e}")
+        return sample
+
+    header = next(csv.reader([header_line.decode("utf-8-sig", errors="replace")]), None)
+    if not header:
+        sample.notes.append("missing header")
+        return sample
+    sample.header = header
+    sample.data_bytes = data_bytes
+    sample.exact = exact
+
+    n_fields = len(header)
+    sampled = 0
+    numeric = [0] * n_fields
+    text_rows = [[] for _ in range(n_fields)]
+    for data in blocks:
+        sampled += len(data)
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError:
+            text = data.decode("utf-8", errors="replace")
+            sample.bad_encoding += sum(1 for line in text.splitlines() if "\ufffd" in line)
+        try:
+            for record in csv.reader(io.StringIO(text, newline="")):
+                if not record:
+                    continue
+                row = sample.sampled_rows
+                sample.sampled_rows += 1
+                if len(record) != n_fields:
+                    sample.bad_fields += 1
+                    sample.first_bad = sample.first_bad or f"{len(record)} of {n_fields} fields"
+                    continue
+                for i, value in enumerate(record):
+                    if value not in NULL_TOKENS:
+                        if _is_number(value):
+                            numeric[i] += 1
+                        else:
+                            text_rows[i].append(row)
+        except csv.Error as e:
+            sample.bad_fields += 1
+            sample.first_bad = sample.first_bad or str(e)
+
+    suspect = set()
+    for count, rows in zip(numeric, text_rows):
+        if rows and count >= NUMERIC_SHARE * (count + len(rows)):
+            suspect.update(rows)
+    sample.suspect = len(suspect)
+
+    if exact:
+        sample.rows = sample.sampled_rows
+    elif sampled:
+        # Records per sampled byte, over the whole file
+        sample.rows = round(data_bytes * sample.sampled_rows / sampled)
+    return sample
+
+def pending_candidates(tail=False):
+    """
+    (name, start byte, note) for every file discovery would treat as pending,
+    decided from size/mtime alone (see the module docstring)
+    """
+    from discover_next_1 import list_csv_files, load_processed
+    from file_registry import load_registry
+    files = load_registry()["files"]
+    processed = load_processed()
+    loaded_sizes = {}
+    for name, entry in files.items():
+        if entry.get("hash") and not entry.get("duplicate_of"):
+            loaded_sizes.setdefault(entry["size"], name)
+
+    candidates = []
+    for name in list_csv_files():
+        st = os.stat(os.path.join(CSV_DIR, name))
+        entry = files.get(name)
+        if entry is None:
+            if name in processed:
+                continue
+            twin = loaded_sizes.get(st.st_size)
+            candidates.append((name, 0, f"same size as loaded {twin} - may be a duplicate" if twin else ""))
+        elif (st.st_size, st.st_mtime_ns) != (entry["size"], entry["mtime_ns"]):
+            if tail and not compression_of(name) and "tail" in entry and st.st_size >= entry["tail"]["offset"]:
+                candidates.append((name, entry["tail"]["offset"], f"tail from line {entry['tail']['line'] + 1}"))
+            elif not tail and "tail" in entry:
+                continue  # skipped by a run without tail mode (file_registry.classify_files)
+            elif tail and not compression_of(name) and entry.get("hash") and st.st_size > entry["size"]:
+                candidates.append((name, entry["size"], "tail (assumed appended)"))
+            else:
+                candidates.append((name, 0, "changed since it was loaded"))
+    return candidates
+
+def _log_files():
+    """pipeline.log and its rotated backups, newest first"""
+    paths = [LOG_FILE]
+    n = 1
+    while os.path.exists(f"{LOG_FILE}.{n}"):
+        paths.append(f"{LOG_FILE}.{n}")
+        n += 1
+    return [p for p in paths if os.path.exists(p)]
+
+def _parse_line(line):
+    """(timestamp, message) of a text or JSON log line, or None"""
+    if line.startswith("{"):
+        try:
+            entry = json.loads(line)
+            return datetime.fromisoformat(entry["ts"]).timestamp(), entry.get("msg", "")
+        except (ValueError, KeyError, TypeError):
+            return None
+    m = _TEXT_LINE.match(line)
+    if not m:
+        return None
+    return datetime.strptime(m.group(1), "%Y-%m-%d %H:%M:%S,%f").timestamp(), m.group(2)
+
+def file_timings(limit=HISTORY_FILES):
+    """(rows, seconds) of the most recent files processed start to finish, from the log"""
+    timings = []
+    for path in _log_files():
+        started, rows, found = {}, {}, []
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if "Processing " not in line and "COMPLETED: " not in line \
+                        and "Validated: " not in line and "Tail: " not in line:
+                    continue
+                parsed = _parse_line(line.rstrip("\n"))
+                if parsed is None:
+                    continue
+                ts, msg = parsed
+                m = _START.match(msg)
+                if m:
+                    started[m.group(1)] = ts
+                    rows.pop(m.group(1), None)
+                    continue
+                m = _TAIL_START.match(msg)
+                if m:
+                    started[m.group(1)] = ts
+                    rows[m.group(1)] = int(m.group(3)) - int(m.group(2)) + 1
+                    continue
+                m = _ROWS.match(msg)
+                if m:
+                    rows[m.group(1)] = int(m.group(2))
+                    continue
+                m = _DONE.match(msg)
+                if m and m.group(1) in started and m.group(1) in rows:
+                    found.append((rows.pop(m.group(1)), ts - started.pop(m.group(1))))
+        # Backups are older than pipeline.log - prepend them
+        timings = found + timings
+        if len(timings) >= limit:
+            break
+    return timings[-limit:]
+
+def fit_timings(timings):
+    """
+    (seconds per file, seconds per row) from (rows, seconds) samples: least
+    squares when the sizes vary, else the plain rows/second rate. None if
+    there is no usable history.
+    """
+    total_rows = sum(r for r, _ in timings)
+    total_seconds = sum(s for _, s in timings)
+    if not timings or total_rows <= 0:
+        return None
+    n = len(timings)
+    mean_rows, mean_seconds = total_rows / n, total_seconds / n
+    var = sum((r - mean_rows) ** 2 for r, _ in timings)
+    if n >= 3 and var > 0:
+        per_row = sum((r - mean_rows) * (s - mean_seconds) for r, s in timings) / var
+        per_file = mean_seconds - per_row * mean_rows
+        if per_row > 0 and per_file >= 0:
+            return per_file, per_row
+    return 0.0, total_seconds / total_rows
+
+def _route(sample, expected):
+    """(target label, match, problem) for a sampled header, as load_file would route it"""
+    mapping = header_mapping(sample.header)
+    if any(not c for c in mapping.columns):
+        return None, None, f"empty column name in header: {sample.header}"
+    if mapping.collisions:
+        return None, None, f"duplicate columns after normalization: {sorted(mapping.collisions)}"
+    if expected is not None and mapping.schema_key != expected:
+        return None, None, f"schema mismatch. Expected: {expected}, Got: {mapping.schema_key}"
+    table, match = get_router().route(mapping.columns, key=mapping.schema_key)
+    if table is None:
+        return f"new table ({mapping.schema_key})", "new", None
+    return table, match, None
+
+def build_plan(tail=False):
+    """Sample every pending file and group it by target table; returns the plan as a dict"""
+    from pipeline_steps import load_stage
+    expected = load_stage("2_validate").expected_schema() if get_table_routing() == "single" else None
+    timings = file_timings()
+    model = fit_timings(timings)
+    per_file, per_row = model or (None, None)
+
+    groups, problems, files = {}, [], []
+    for name, start, note in pending_candidates(tail=tail):
+        sample = sample_file(name, start)
+        entry = {
+            "file": name, "bytes": sample.size, "data_bytes": sample.data_bytes,
+            "rows": sample.rows, "exact": sample.exact, "sampled_rows": sample.sampled_rows,
+            "notes": ([note] if note else []) + sample.notes,
+        }
+        files.append(entry)
+        if sample.header is None:
+            if sample.size:
+                entry["problem"] = "; ".join(sample.notes)
+                problems.append({"file": name, "issue": entry["problem"]})
+            continue
+        target, match, problem = _route(sample, expected)
+        if sample.bad_fields:
+            problem = problem or (f"{sample.bad_fields} of {sample.sampled_rows} sampled records malformed "
+                                  f"(first: {sample.first_bad}) - validation would reject the file")
+        if sample.bad_encoding:
+            problem = problem or f"{sample.bad_encoding} sampled lines are not UTF-8 - validation would reject the file"
+        if problem:
+            entry["problem"] = problem
+            problems.append({"file": name, "issue": problem})
+            target, match = "rejected", "rejected"
+        if sample.suspect and not problem:
+            entry["suspect_rows"] = round(sample.rows * sample.suspect / max(sample.sampled_rows, 1))
+        group = groups.setdefault(target, {"target": target, "match": match, "files": [],
+                                           "bytes": 0, "rows": 0, "suspect_rows": 0})
+        group["files"].append(name)
+        group["bytes"] += sample.size
+        group["rows"] += 0 if problem else sample.rows
+        group["suspect_rows"] += entry.get("suspect_rows", 0)
+
+    for group in groups.values():
+        group["seconds"] = None if model is None else round(per_file * len(group["files"]) + per_row * group["rows"], 1)
+    return {
+        "files": len(files),
+        "bytes": sum(f["bytes"] for f in files),
+        "rows": sum(g["rows"] for g in groups.values()),
+        "groups": sorted(groups.values(), key=lambda g: (g["match"] == "rejected", -g["bytes"])),
+        "problems": problems,
+        "per_file": files,
+        "estimate": None if model is None else {
+            "seconds": round(sum(g["seconds"] for g in groups.values()), 1),
+            "seconds_per_file": round(per_file, 3),
+            "rows_per_second": round(1 / per_row) if per_row else None,
+            "history_files": len(timings),
+        },
+    }
+
+def _size(n):
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if n < 1024 or unit == "TB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+def _duration(seconds):
+    if seconds is None:
+        return "?"
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+def print_plan(plan):
+    """Human-readable report of build_plan()"""
+    print(f"\nPlan: {plan['files']} pending files, {_size(plan['bytes'])}, ~{plan['rows']:,} rows")
+    for g in plan["groups"]:
+        label = g["target"] if g["match"] in ("exact", "new", "rejected") else f"{g['target']} ({g['match']})"
+        line = f"  {label:<40} {len(g['files']):>6} files  {_size(g['bytes']):>10}  ~{g['rows']:>14,} rows"
+        if g["match"] != "rejected":
+            line += f"  {_duration(g['seconds']):>10}"
+        print(line)
+        if g["suspect_rows"]:
+            print(f"  {'':<40} ~{g['suspect_rows']:,} rows with non-numeric values in numeric columns")
+    if plan["problems"]:
+        print("\nProblems:")
+        for p in plan["problems"]:
+            print(f"  {p['file']}: {p['issue']}")
+    notes = [f for f in plan["per_file"] if f["notes"] and "problem" not in f]
+    if notes:
+        print("\nNotes:")
+        for f in notes:
+            print(f"  {f['file']}: {'; '.join(f['notes'])}")
+    estimate = plan["estimate"]
+    if estimate is None:
+        print("\nWall time: no timed files in pipeline.log yet")
+    else:
+        print(f"\nWall time: ~{_duration(estimate['seconds'])} sequential "
+              f"({estimate['rows_per_second'] or '?'} rows/s + {estimate['seconds_per_file']}s per file, "
+              f"fitted on {estimate['history_files']} files in pipeline.log)")
+    logging.info(f"Plan: {plan['files']} files, {plan['bytes']} bytes, ~{plan['rows']} rows, "
+                 f"{len(plan['problems'])} problems, "
+                 f"estimate {_duration(estimate['seconds']) if estimate else 'unknown'}")
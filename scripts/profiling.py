@@ -0,0 +1,220 @@
+# profiling.py
+"""
+Profiling mode: where does a slow run spend its time and memory?
+
+With PROFILE=1 (or --profile) every stage of every file (validate,
+transform, load, checkpoint) runs under:
+  - cProfile      -> <file>.<stage>.pstats (snakeviz, `python -m pstats`)
+  - a stack sampler thread (every PROFILE_SAMPLE_MS) -> <file>.<stage>.collapsed,
+    one "thread;frame;frame;frame count" line per stack, for flamegraph.pl
+    or speedscope; unlike cProfile it also shows where blocking calls
+    (Doris round trips) wait
+  - tracemalloc   -> the stage's peak traced memory
+Both profilers cover the calling thread plus the worker threads that run
+functions wrapped with in_stage() (load_chunks' chunk senders): each worker
+call has its own cProfile, merged into the stage's .pstats. tracemalloc's
+peak is process-wide, so a stage that overlapped another profiled stage
+(concurrent loads) gets peak_mb null instead of the other stage's memory.
+written to pipeline_logs/profiles/<run id>/. When the run ends, summary.json
+(wall time + peak memory per file and stage) and summary.txt (top hot
+functions across all stages by own time and by cumulative time) are written
+next to them, and the top functions are logged.
+
+Everything here is a no-op unless enable() was called; tracemalloc slows
+allocation-heavy code noticeably, so use it on a representative sample.
+"""
+import os
+import io
+import sys
+import json
+import time
+import atexit
+import pstats
+import cProfile
+import threading
+import contextvars
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from local_config import LOG_DIR, logging, get_profile_sample_ms
+from pipeline_logging import run_id, current_file
+
+TOP_FUNCTIONS = 25
+
+_enabled = False
+_profile_dir = None
+_records = []
+_lock = threading.Lock()
+_active = []    # stages being profiled right now, for the tracemalloc overlap check
+_current = contextvars.ContextVar("profile_stage", default=None)
+
+class StackSampler(threading.Thread):
+    """Samples the Python stacks of a set of threads at a fixed interval into collapsed-stack counts"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.threads = {thread_id: threading.current_thread().name}
+        self.interval = interval
+        self.counts = Counter()
+        self._done = threading.Event()
+        self._threads_lock = threading.Lock()
+
+    def add_thread(self, thread_id, name):
+        with self._threads_lock:
+            self.threads[thread_id] = name
+
+    def remove_thread(self, thread_id):
+        with self._threads_lock:
+            self.threads.pop(thread_id, None)
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frames = sys._current_frames()
+            with self._threads_lock:
+                threads = list(self.threads.items())
+            for thread_id, thread_name in threads:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if stack:
+                    stack.append(thread_name)
+                    self.counts[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+def enable():
+    """Turn profiling on for this process (summary written at exit)"""
+    global _enabled, _profile_dir
+    if _enabled:
+        return
+    _enabled = True
+    _profile_dir = os.path.join(LOG_DIR, "profiles", run_id())
+    os.makedirs(_profile_dir, exist_ok=True)
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    atexit.register(write_summary)
+    logging.info(f"Profiling enabled, writing to {_profile_dir}")
+
+def enabled():
+    return _enabled
+
+class _Stage:
+    """One profiled stage: its sampler, the cProfiles of its worker calls, and whether it overlapped another"""
+
+    def __init__(self, sampler):
+        self.sampler = sampler
+        self.worker_profiles = []
+        self.overlapped = False
+
+@contextmanager
+def profile_stage(stage):
+    """Profile the block as `stage` of the file in the current log context"""
+    if not _enabled:
+        yield
+        return
+    name = f"{current_file() or 'run'}.{stage}".replace(os.sep, "_")
+    profiler = cProfile.Profile()
+    state = _Stage(StackSampler(threading.get_ident(), get_profile_sample_ms() / 1000))
+    with _lock:
+        if _active:
+            for other in _active:
+                other.overlapped = True
+            state.overlapped = True
+        else:
+            tracemalloc.reset_peak()
+        _active.append(state)
+    start_memory = tracemalloc.get_traced_memory()[0]
+    token = _current.set(state)
+    state.sampler.start()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - start
+        state.sampler.stop()
+        _current.reset(token)
+        peak = tracemalloc.get_traced_memory()[1]
+        base = os.path.join(_profile_dir, name)
+        stats = pstats.Stats(profiler)
+        with _lock:
+            _active.remove(state)
+            for worker in state.worker_profiles:
+                stats.add(worker)
+        stats.dump_stats(f"{base}.pstats")
+        state.sampler.write(f"{base}.collapsed")
+        with _lock:
+            _records.append({
+                "file": current_file(), "stage": stage, "seconds": round(elapsed, 4),
+                "peak_mb": None if state.overlapped else round((peak - start_memory) / 1024 / 1024, 2),
+                "pstats": f"{name}.pstats", "samples": sum(state.sampler.counts.values()),
+            })
+
+def in_stage(fn):
+    """
+    Wrap `fn` for a worker thread so the stage profiling the calling thread
+    also samples and profiles the worker while it runs `fn`
+    """
+    state = _current.get()
+    if state is None:
+        return fn
+
+    def run(*args, **kwargs):
+        thread = threading.current_thread()
+        state.sampler.add_thread(thread.ident, thread.name)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # Python 3.12+: one profiler per process, and it already sees every thread
+            profiler = None
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                with _lock:
+                    state.worker_profiles.append(profiler)
+            state.sampler.remove_thread(thread.ident)
+    return run
+
+def _top_functions(stats, sort_key):
+    out = io.StringIO()
+    stats.stream = out
+    stats.sort_stats(sort_key).print_stats(TOP_FUNCTIONS)
+    return out.getvalue()
+
+def write_summary():
+    """summary.json (per stage) and summary.txt (hot functions across the run)"""
+    if not _enabled or not _records:
+        return
+    with open(os.path.join(_profile_dir, "summary.json"), "w") as f:
+        json.dump({"run": run_id(), "stages": _records}, f, indent=1)
+
+    stats = pstats.Stats(*(os.path.join(_profile_dir, r["pstats"]) for r in _records))
+    stats.strip_dirs()
+    with open(os.path.join(_profile_dir, "summary.txt"), "w") as f:
+        f.write(f"Run {run_id()}: {len(_records)} profiled stages\n\n")
+        for r in sorted(_records, key=lambda r: -r["seconds"])[:TOP_FUNCTIONS]:
+            peak = f"{r['peak_mb']:9.2f} MB peak" if r["peak_mb"] is not None else "  (overlapped) peak"
+            f.write(f"  {r['seconds']:9.3f}s  {peak}  {r['file']} / {r['stage']}\n")
+        f.write("\n== By own time ==\n")
+        f.write(_top_functions(stats, "tottime"))
+        f.write("\n== By cumulative time ==\n")
+        f.write(_top_functions(stats, "cumulative"))
+
+    # The ten functions with the most own time, in the pipeline log
+    top = sorted(stats.stats.items(), key=lambda item: -item[1][2])[:10]
+    lines = [f"  {tt:8.3f}s  {calls:>9} calls  {func[2]} ({func[0]}:{func[1]})"
+             for func, (_, calls, tt, _, _) in top]
+    logging.info(f"Profile summary ({_profile_dir}), top functions by own time:\n" + "\n".join(lines))
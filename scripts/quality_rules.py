@@ -0,0 +1,217 @@
+# quality_rules.py
+"""
+Declarative data-quality rules, evaluated column-wise on each load batch.
+
+Type conformance (LoadBatch.from_frame) only says a value fits its column.
+quality_rules.json, next to table_map.json, adds per-table rules:
+
+    {
+      "main_data_table": {
+        "action": "reject",                          # default for the rules below
+        "rules": [
+          {"column": "age", "min": 0, "max": 120},
+          {"column": "bmi", "gt": 0},
+          {"column": "gender", "in": ["Male", "Female"]},
+          {"column": "workout_type", "in": ["Cardio", "HIIT", "Strength", "Yoga"]},
+          {"column": "email", "regex": "[^@]+@[^@]+"},
+          {"column": "session_duration_hours", "not_null": true},
+          {"name": "bmi_formula", "column": "bmi",
+           "approx": "weight_kg / height_m ** 2", "rel_tol": 0.02,
+           "action": "warn"}
+        ]
+      }
+    }
+
+Each rule is compiled once (per change of the file) into a function from the
+batch's buffers to a boolean NumPy mask of violating rows - no per-row Python.
+Range, enum and regex rules ignore NULLs (regexes use pyarrow's RE2 syntax
+when pyarrow is installed); `approx` compares a column with an
+arithmetic expression over other columns (+ - * / ** and numbers only).
+
+"reject" rules send violating rows to the error file and drop them from the
+load; "warn" rules only count. Violations per rule are logged, returned in
+the load summary and added up in pipeline_logs/quality_counters.json.
+"""
+import os
+import ast
+import json
+import numpy as np
+from local_config import QUALITY_RULES_FILE, QUALITY_COUNTS_FILE
+from coordination import locked, write_json_atomic
+
+ACTIONS = ("reject", "warn")
+_EXPR_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod, ast.USub, ast.UAdd,
+)
+
+def _numeric(batch, col_idx):
+    """float64 values of a column, NaN where NULL or not numeric"""
+    if batch.kinds[col_idx] not in ("int", "float"):
+        return None
+    values = batch.data[col_idx].astype(np.float64)
+    values[~batch.valid[col_idx]] = np.nan
+    return values
+
+def _fullmatch(values, pattern):
+    """Vectorized re.fullmatch over a string buffer (pyarrow's RE2 when installed)"""
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        import pandas as pd
+        return pd.Series(values, dtype=object).str.fullmatch(pattern).fillna(False).to_numpy(dtype=bool)
+    matched = pc.match_substring_regex(pa.array(values.astype(object), type=pa.string()), f"^(?:{pattern})$")
+    return matched.to_numpy(zero_copy_only=False)
+
+def _compile_expr(text):
+    """Arithmetic over column names -> (code, column names)"""
+    tree = ast.parse(text, mode="eval")
+    for node in ast.walk(tree):
+        if not isinstance(node, _EXPR_NODES) or \
+                (isinstance(node, ast.Constant) and not isinstance(node.value, (int, float))):
+            raise ValueError(f"Unsupported expression in quality rule: {text!r}")
+    names = sorted({node.id for node in ast.walk(tree) if isinstance(node, ast.Name)})
+    return compile(tree, "<quality rule>", "eval"), names
+
+class Rule:
+    def __init__(self, spec, default_action):
+        self.column = spec["column"]
+        self.action = spec.get("action", default_action)
+        if self.action not in ACTIONS:
+            raise ValueError(f"Invalid quality rule action {self.action!r}")
+        self.spec = spec
+        self.columns = [self.column]
+        if "approx" in spec:
+            self.kind = "approx"
+            self._code, names = _compile_expr(spec["approx"])
+            self.columns += names
+        elif "in" in spec:
+            self.kind = "in"
+            self._allowed = np.array([str(v) for v in spec["in"]])
+        elif "regex" in spec:
+            self.kind = "regex"
+        elif "not_null" in spec:
+            self.kind = "not_null"
+        elif any(k in spec for k in ("min", "max", "gt", "lt")):
+            self.kind = "range"
+        else:
+            raise ValueError(f"Quality rule for '{self.column}' has no check: {spec}")
+        self.name = spec.get("name") or f"{self.column}_{self.kind}"
+
+    def violations(self, batch, index):
+        """Boolean mask of violating rows, or None when the batch lacks a column"""
+        if any(c not in index for c in self.columns):
+            return None
+        i = index[self.column]
+        valid = batch.valid[i]
+        spec = self.spec
+        if self.kind == "not_null":
+            return ~valid
+        if self.kind == "in":
+            values = batch.data[i]
+            if batch.kinds[i] in ("int", "float"):
+                values = values.astype(str)
+            return valid & ~np.isin(values, self._allowed)
+        if self.kind == "regex":
+            return valid & ~_fullmatch(batch.data[i], spec["regex"])
+
+        values = _numeric(batch, i)
+        if values is None:
+            return None
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if self.kind == "range":
+                bad = np.zeros(len(values), dtype=bool)
+                if "min" in spec:
+                    bad |= values < spec["min"]
+                if "max" in spec:
+                    bad |= values > spec["max"]
+                if "gt" in spec:
+                    bad |= values <= spec["gt"]
+                if "lt" in spec:
+                    bad |= values >= spec["lt"]
+                return bad
+            # approx: NULL/non-numeric inputs and non-finite results are not checked
+            env = {name: _numeric(batch, index[name]) for name in self.columns[1:]}
+            if any(v is None for v in env.values()):
+                return None
+            expected = eval(self._code, {"__builtins__": {}}, env)
+            checked = np.isfinite(values) & np.isfinite(expected)
+            close = np.isclose(values, expected, rtol=spec.get("rel_tol", 0.01), atol=spec.get("abs_tol", 0.0))
+            return checked & ~close
+
+    def reason(self):
+        checks = {k: v for k, v in self.spec.items() if k not in ("name", "column", "action")}
+        return f"Rule '{self.name}' failed on '{self.column}': {json.dumps(checks)}"
+
+class QualityResult:
+    def __init__(self, num_rows):
+        self.counts = {}                                   # rule name -> violating rows
+        self.rejected = np.zeros(num_rows, dtype=bool)
+        self.rule = np.full(num_rows, -1, dtype=np.int64)  # first rejecting rule per row
+        self.rules = []
+
+class QualityRules:
+    """Compiled rules per table, recompiled when quality_rules.json changes"""
+
+    def __init__(self, rules_file=QUALITY_RULES_FILE):
+        self.rules_file = rules_file
+        self._mtime = None
+        self._tables = {}
+
+    def refresh(self):
+        try:
+            mtime = os.stat(self.rules_file).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        tables = {}
+        if mtime is not None:
+            with open(self.rules_file) as f:
+                for table, config in json.load(f).items():
+                    action = config.get("action", "reject")
+                    tables[table] = [Rule(spec, action) for spec in config.get("rules", [])]
+        self._tables = tables
+        self._mtime = mtime
+
+    def check(self, table_name, batch):
+        """Evaluate the table's rules on `batch`; returns a QualityResult"""
+        self.refresh()
+        result = QualityResult(len(batch))
+        rules = self._tables.get(table_name, [])
+        if not rules or not len(batch):
+            return result
+        index = {c: i for i, c in enumerate(batch.columns)}
+        for rule in rules:
+            bad = rule.violations(batch, index)
+            if bad is None:
+                continue
+            result.counts[rule.name] = int(bad.sum())
+            if rule.action == "reject" and result.counts[rule.name]:
+                result.rule[bad & ~result.rejected] = len(result.rules)
+                result.rejected |= bad
+            result.rules.append(rule)
+        return result
+
+_rules = None
+
+def get_quality_rules():
+    global _rules
+    if _rules is None:
+        _rules = QualityRules()
+    return _rules
+
+def record_counts(table_name, counts):
+    """Add this load's per-rule violation counts to the running totals"""
+    if not counts:
+        return
+    with locked(QUALITY_COUNTS_FILE):
+        totals = {}
+        if os.path.exists(QUALITY_COUNTS_FILE):
+            with open(QUALITY_COUNTS_FILE) as f:
+                totals = json.load(f)
+        table = totals.setdefault(table_name, {})
+        for name, count in counts.items():
+            table[name] = table.get(name, 0) + count
+        write_json_atomic(QUALITY_COUNTS_FILE, totals, indent=1)
@@ -0,0 +1,225 @@
+# resilience.py
+"""
+Retries, backoff and circuit breaking for the Doris calls.
+
+A transient Doris error (FE restart, dropped connection, "too many
+versions" back-pressure, a Stream Load timeout) used to abort the whole run.
+Calls now go through with_retry():
+  - only errors classified as retryable are retried; a syntax or schema
+    error fails immediately
+  - waits use exponential backoff with full jitter, capped at
+    DORIS_RETRY_MAX_DELAY
+  - a process-wide circuit breaker opens after DORIS_BREAKER_FAILURES
+    consecutive failed attempts and fails calls fast for
+    DORIS_BREAKER_COOLDOWN seconds, then lets one trial call through
+    (half-open) while every other call keeps failing fast until it returns
+
+Errors are classified by type, MySQL error number and Doris status, never
+by searching the whole message: a Stream Load or 2PC failure is raised as
+DorisLoadError with its Status, and Doris error codes are read from the
+"[E-235]" / "[TIMEOUT]" tag Doris puts in front of its messages.
+
+DorisConnection wraps pymysql with the same policy and reconnects after a
+lost connection. Chunk-level resume (only unacknowledged chunks are resent)
+lives in load_progress.py.
+"""
+import re
+import time
+import random
+import threading
+from local_config import (
+    logging, get_doris_host, get_doris_port, get_doris_user, get_doris_pass, get_doris_db,
+    get_retry_attempts, get_retry_base_delay, get_retry_max_delay,
+    get_breaker_failures, get_breaker_cooldown
+)
+
+# MySQL client/server codes that mean "try again": can't connect, server gone
+# away, lost connection, too many connections, lock wait timeout
+RETRYABLE_MYSQL_CODES = {1040, 1205, 2003, 2006, 2013, 2014, 2055}
+
+# MySQL error Doris FE reports every execution error under ("errCode = 2,
+# detailMessage = ..."); its Doris status code decides
+DORIS_MYSQL_ERROR = 1105
+
+# Doris status codes that are transient: too many versions (compaction
+# back-pressure), busy BE, timeouts, unavailable service/backends
+RETRYABLE_DORIS_CODES = {
+    "E-235", "TOO_MANY_VERSION", "TOO_MANY_TASKS", "TIMEOUT", "SERVICE_UNAVAILABLE",
+}
+
+# Stream Load "Status" values worth another attempt with the same label
+RETRYABLE_LOAD_STATUSES = {"Publish Timeout"}
+
+# "[E-235]" or "[TIMEOUT]" - the tag Doris puts in front of a status message
+DORIS_CODE = re.compile(r"\[(E-?\d+|[A-Z][A-Z_]+)\]")
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling Doris while the breaker is open"""
+
+class DorisLoadError(RuntimeError):
+    """A Stream Load or 2PC request Doris answered with a failure"""
+
+    def __init__(self, message, status=None, http_status=None):
+        super().__init__(message)
+        self.status = status            # Stream Load "Status" ("Fail", "Publish Timeout", ...)
+        self.http_status = http_status  # set when the HTTP request itself failed
+
+def doris_codes(message):
+    """Doris status codes tagged in an error message"""
+    return set(DORIS_CODE.findall(str(message)))
+
+class CircuitBreaker:
+    def __init__(self, failures=None, cooldown=None):
+        self.failures_to_open = failures or get_breaker_failures()
+        self.cooldown = get_breaker_cooldown() if cooldown is None else cooldown
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.half_open = False  # a trial call is in flight
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if self.half_open:
+                raise CircuitOpenError("Doris circuit half-open, waiting for the trial call")
+            remaining = self.opened_at + self.cooldown - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError(f"Doris circuit open after {self.consecutive_failures} "
+                                       f"consecutive failures, retry in {remaining:.0f}s")
+            # Half-open: this call is the trial, the rest fail fast until it returns
+            self.half_open = True
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.half_open = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.half_open or (self.consecutive_failures >= self.failures_to_open and self.opened_at is None):
+                # A failed trial re-opens the circuit for another cooldown
+                self.half_open = False
+                self.opened_at = time.monotonic()
+                logging.error(f"Doris circuit opened for {self.cooldown:.0f}s "
+                              f"after {self.consecutive_failures} consecutive failures")
+
+_breaker = None
+
+def get_breaker():
+    """Process-wide breaker shared by every Doris call (MySQL and Stream Load)"""
+    global _breaker
+    if _breaker is None:
+        _breaker = CircuitBreaker()
+    return _breaker
+
+def is_retryable(exc):
+    """Classify an exception from pymysql / requests / Stream Load as transient or not"""
+    if isinstance(exc, CircuitOpenError):
+        return False
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    if isinstance(exc, DorisLoadError):
+        if exc.http_status is not None:
+            return exc.http_status >= 500
+        return exc.status in RETRYABLE_LOAD_STATUSES or bool(doris_codes(exc) & RETRYABLE_DORIS_CODES)
+    module = type(exc).__module__ or ""
+    if module.startswith("requests") or module.startswith("urllib3"):
+        # ConnectionError, Timeout, ChunkedEncodingError ... - not HTTPError from a 4xx
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+        return status is None or status >= 500
+    if module.startswith("pymysql"):
+        code = exc.args[0] if exc.args and isinstance(exc.args[0], int) else None
+        if code in RETRYABLE_MYSQL_CODES:
+            return True
+        if type(exc).__name__ == "InterfaceError":
+            return True  # connection already closed
+        if code == DORIS_MYSQL_ERROR:
+            return bool(doris_codes(exc) & RETRYABLE_DORIS_CODES)
+    return False
+
+def backoff_delay(attempt, base=None, max_delay=None):
+    """Full-jitter exponential backoff for the given (1-based) retry"""
+    base = get_retry_base_delay() if base is None else base
+    max_delay = get_retry_max_delay() if max_delay is None else max_delay
+    return random.uniform(0, min(max_delay, base * (2 ** (attempt - 1))))
+
+def with_retry(fn, *args, description="Doris call", attempts=None, on_retry=None, **kwargs):
+    """
+    Call fn(*args, **kwargs), retrying retryable errors with jittered backoff.
+    `on_retry(exc)` runs before each retry (e.g. to drop a dead connection).
+    """
+    breaker = get_breaker()
+    attempts = attempts or get_retry_attempts()
+    for attempt in range(1, attempts + 1):
+        breaker.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            retryable = is_retryable(e)
+            if retryable:
+                breaker.record_failure()
+            elif not isinstance(e, CircuitOpenError):
+                # Doris answered (a syntax, schema or data error) - it is up
+                breaker.record_success()
+            if not retryable or attempt == attempts:
+                raise
+            delay = backoff_delay(attempt)
+            logging.warning(f"{description} failed ({type(e).__name__}: {str(e)[:200]}), "
+                            f"retry {attempt}/{attempts - 1} in {delay:.1f}s")
+            if on_retry is not None:
+                on_retry(e)
+            time.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
+
+class DorisConnection:
+    """pymysql connection to Doris that reconnects and retries transient errors"""
+
+    def __init__(self):
+        self._conn = None
+
+    def _connect(self):
+        import pymysql
+        if self._conn is None:
+            self._conn = pymysql.connect(
+                host=get_doris_host(), port=get_doris_port(),
+                user=get_doris_user(), password=get_doris_pass(),
+                database=get_doris_db()
+            )
+        return self._conn
+
+    def _reset(self, exc=None):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+        self._conn = None
+
+    def _execute(self, sql):
+        conn = self._connect()
+        with conn.cursor() as cur:
+            cur.execute(sql)
+            rows = cur.fetchall()
+        conn.commit()
+        return rows
+
+    def execute(self, sql, description=None, on_retry=None):
+        """Run one statement (reconnecting/retrying as needed) and return its rows"""
+        def reset(exc):
+            self._reset(exc)
+            if on_retry is not None:
+                on_retry(exc)
+        return with_retry(self._execute, sql, description=description or sql.strip().split("\n")[0][:60],
+                          on_retry=reset)
+
+    def escape_string(self, value):
+        # Called once per string value - skip _connect() when already connected
+        return (self._conn or self._connect()).escape_string(value)
+
+    def close(self):
+        self._reset()
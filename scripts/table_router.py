@@ -0,0 +1,131 @@
+# table_router.py
+"""
+Routes each incoming file to its target Doris table by column schema.
+
+table_map.json keeps the original `main_table` / `main_schema` keys and adds
+a `tables` section mapping every table to its schema key (sorted column
+names joined by "|"). Legacy `<schema key>: <table>` entries written by the
+old get_or_create_table design are folded in when the map is read.
+
+The router compiles the map into two in-memory indexes:
+  - schema key -> table, for exact matches
+  - column -> tables containing it, so a file whose columns are a subset of
+    an existing table is routed to the narrowest such table (the missing
+    columns load as NULL)
+The indexes are rebuilt only when table_map.json changes on disk.
+"""
+import os
+import json
+from local_config import TABLE_MAP_FILE, logging
+from coordination import write_json_atomic
+
+MAIN_TABLE_NAME = "main_data_table"
+
+def schema_key(columns):
+    return "|".join(sorted(columns))
+
+class TableRouter:
+    def __init__(self, table_map_file=TABLE_MAP_FILE):
+        self.table_map_file = table_map_file
+        self._mtime = None
+        self._map = {}
+        self._by_schema = {}
+        self._columns = {}
+        self._by_column = {}
+
+    def refresh(self):
+        """Reload and recompile the index if table_map.json changed"""
+        try:
+            mtime = os.stat(self.table_map_file).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime and (mtime is not None or not self._map):
+            return
+        table_map = {}
+        if mtime is not None:
+            with open(self.table_map_file) as f:
+                table_map = json.load(f)
+        self._compile(table_map)
+        self._mtime = mtime
+
+    def _compile(self, table_map):
+        tables = dict(table_map.get("tables", {}))
+        if table_map.get("main_table") and table_map.get("main_schema"):
+            tables.setdefault(table_map["main_table"], table_map["main_schema"])
+        # Legacy get_or_create_table entries: "<schema key>": "<table>"
+        for key, value in table_map.items():
+            if key not in ("main_table", "main_schema", "tables") and isinstance(value, str):
+                tables.setdefault(value, key)
+
+        self._map = {**table_map, "tables": tables}
+        self._by_schema = {key: table for table, key in tables.items()}
+        self._columns = {table: frozenset(key.split("|")) for table, key in tables.items()}
+        self._by_column = {}
+        for table, cols in self._columns.items():
+            for col in cols:
+                self._by_column.setdefault(col, set()).add(table)
+
+    def route(self, columns, key=None):
+        """
+        Return (table_name, match) where match is "exact", "subset" or None
+        when no existing table can take these columns. `key` is the schema key
+        of `columns` if the caller already has it.
+        """
+        self.refresh()
+        key = key or schema_key(columns)
+        if key in self._by_schema:
+            return self._by_schema[key], "exact"
+
+        candidates = None
+        for col in columns:
+            tables = self._by_column.get(col)
+            if not tables:
+                return None, None
+            candidates = set(tables) if candidates is None else candidates & tables
+            if not candidates:
+                return None, None
+        if not candidates:
+            return None, None
+        # Narrowest superset wins, ties broken by name for determinism
+        table = min(candidates, key=lambda t: (len(self._columns[t]), t))
+        return table, "subset"
+
+    def register(self, columns):
+        """
+        Assign a new table for `columns` and persist it to table_map.json.
+        The first table keeps the historical name main_data_table.
+        Call with the table map lock held.
+        """
+        self.refresh()
+        tables = self._map.get("tables", {})
+        if not tables:
+            table_name = MAIN_TABLE_NAME
+        else:
+            n = len(tables) + 1
+            while f"tbl_{n}" in tables:
+                n += 1
+            table_name = f"tbl_{n}"
+
+        table_map = {k: v for k, v in self._map.items() if k in ("main_table", "main_schema")}
+        if "main_table" not in table_map:
+            table_map["main_table"] = table_name
+            table_map["main_schema"] = schema_key(columns)
+        table_map["tables"] = {**tables, table_name: schema_key(columns)}
+        write_json_atomic(self.table_map_file, table_map, indent=2)
+        self._compile(table_map)
+        self._mtime = os.stat(self.table_map_file).st_mtime_ns
+        logging.info(f"Routing: new table {table_name} for schema {schema_key(columns)}")
+        return table_name
+
+    def tables(self):
+        self.refresh()
+        return dict(self._map.get("tables", {}))
+
+_router = None
+
+def get_router():
+    """Process-wide router, so the compiled index survives across files"""
+    global _router
+    if _router is None:
+        _router = TableRouter()
+    return _router
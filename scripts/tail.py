@@ -0,0 +1,187 @@
+# tail.py
+"""
+Tail mode: load only the rows appended to a CSV since its last load.
+
+Without it a checkpointed file is done forever (or, once the registry sees
+new content, re-ingested in full), so a producer that appends to
+events.csv forces a rename and a reload of everything.
+
+With TAIL_MODE=1 (or --tail) the registry entry of every loaded file keeps a
+"tail" record next to its size/mtime:
+  {"offset": <bytes up to the last complete line>, "line": <its line number>,
+   "window": <hash of the 4 KB before offset>}
+On the next run a grown file is snapshotted from that offset up to its last
+complete (newline-terminated) line, the original header line is prepended,
+and the segment goes through validate -> transform -> load like a file of
+its own. A line still being written stays for the next run. Only the window
+is re-hashed, so a run costs the new bytes, not the whole file; if the window
+no longer matches, the file was rewritten rather than appended and is loaded
+again from the start.
+
+Files loaded before tail mode was switched on are adopted once: if the
+registry hash still matches the first `size` bytes, tailing starts there.
+
+Limitations: tail mode has to stay on for tailed files (a run without it
+skips them with a warning - reloading would duplicate their rows), records
+with quoted newlines must not straddle an append, and duplicates are only
+dropped within a segment.
+"""
+import os
+import shutil
+import hashlib
+from local_config import CSV_DIR, STAGE_DIR, ERROR_DIR, CHECKPOINT_FILE, logging
+from file_registry import load_registry, file_hash, record
+from pipeline_steps import log_step, load_stage, claim
+from pipeline_logging import log_context
+from profiling import profile_stage
+
+WINDOW_BYTES = 4096
+COPY_BYTES = 1024 * 1024
+
+def window_hash(f, offset):
+    """Hash of the WINDOW_BYTES before `offset` in the open binary file `f`"""
+    start = max(0, offset - WINDOW_BYTES)
+    f.seek(start)
+    return hashlib.blake2b(f.read(offset - start), digest_size=16).hexdigest()
+
+def count_lines(f, start, stop):
+    """Newlines in [start, stop) of the open binary file `f`"""
+    f.seek(start)
+    lines = 0
+    while start < stop:
+        block = f.read(min(COPY_BYTES, stop - start))
+        if not block:
+            break
+        lines += block.count(b"\n")
+        start += len(block)
+    return lines
+
+def last_line_end(f, offset, size):
+    """Offset just past the last newline at or after `offset`, or None"""
+    pos = size
+    while pos > offset:
+        start = max(offset, pos - COPY_BYTES)
+        f.seek(start)
+        i = f.read(pos - start).rfind(b"\n")
+        if i >= 0:
+            return start + i + 1
+        pos = start
+    return None
+
+def resume_point(path, entry):
+    """(offset, line) to continue `path` from; (0, 0) for a new or rewritten file"""
+    tail = (entry or {}).get("tail")
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        if tail is not None:
+            if size >= tail["offset"] and window_hash(f, tail["offset"]) == tail["window"]:
+                return tail["offset"], tail["line"]
+            logging.info(f"Tail: {os.path.basename(path)} was rewritten, loading it from the start")
+            return 0, 0
+        if entry and entry.get("hash") and size > entry["size"]:
+            # Loaded in full before tail mode - adopt it if that content is still the prefix
+            if file_hash(path, entry["size"]) == entry["hash"]:
+                return entry["size"], count_lines(f, 0, entry["size"])
+    return 0, 0
+
+def snapshot_segment(filename, offset, line):
+    """
+    Copy header + the complete lines after `offset` to a segment file in
+    STAGE_DIR. Returns (segment_path, end, end_line, stat), or None when
+    there is no new complete line yet.
+    """
+    path = os.path.join(CSV_DIR, filename)
+    segment = os.path.join(STAGE_DIR, f"tail_{filename}")
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        end = last_line_end(f, offset, st.st_size)
+        if end is None:
+            return None
+        with open(segment, "wb") as out:
+            if offset > 0:
+                f.seek(0)
+                out.write(f.readline())
+            f.seek(offset)
+            remaining = end - offset
+            while remaining > 0:
+                block = f.read(min(COPY_BYTES, remaining))
+                out.write(block)
+                remaining -= len(block)
+        end_line = line + count_lines(f, offset, end)
+        window = window_hash(f, end)
+    return segment, end, end_line, {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "window": window}
+
+def record_tail(filename, end, end_line, snapshot):
+    """
+    Store the new offset (the registry's size/mtime are those of the snapshot).
+    Merged into the entry: the hash of the first full load stays for duplicate detection
+    """
+    record({filename: {
+        "size": snapshot["size"], "mtime_ns": snapshot["mtime_ns"],
+        "tail": {"offset": end, "line": end_line, "window": snapshot["window"]},
+    }}, merge=True)
+
+def process_tail(filename, checkpoint_file=None):
+    """
+    Load the rows of `filename` appended since its recorded offset (the whole
+    file the first time). Returns the load summary (0 rows while the new line
+    is incomplete), or None when the segment was rejected. Raises
+    FileClaimedError if another run holds the file.
+    """
+    with log_context(file=filename), claim(filename) as lease:
+        return _process_tail(filename, checkpoint_file or CHECKPOINT_FILE, lease)
+
+def _process_tail(filename, checkpoint_file, lease):
+    path = os.path.join(CSV_DIR, filename)
+    offset, line = resume_point(path, load_registry()["files"].get(filename))
+    snapshot = snapshot_segment(filename, offset, line)
+    if snapshot is None:
+        # The appended line is still being written - nothing to load yet
+        log_step(f"Tail: no new complete lines in {filename}", "INFO")
+        return {"table": None, "first_id": None, "loaded_rows": 0, "bad_rows": 0}
+    segment, end, end_line, stat = snapshot
+    # Progress/error records are per segment, so a failed segment resumes on its own
+    segment_name = f"{filename}@{offset}" if offset else filename
+    log_step(f"Tail: {filename} lines {line + 1}-{end_line} (bytes {offset}-{end})", "PROCESS")
+
+    validator = load_stage("2_validate")
+    with log_context(stage="validate"), profile_stage("validate"):
+        validation = validator.validate_file(segment, validator.expected_schema())
+    if not validation["ok"]:
+        if validation["retryable"]:
+            os.remove(segment)
+            raise RuntimeError(f"Not ready: {segment_name}: {validation['reason']}")
+        os.makedirs(ERROR_DIR, exist_ok=True)
+        rejected = os.path.join(ERROR_DIR, f"rejected_{segment_name}")
+        shutil.move(segment, rejected)
+        logging.error(f"REJECTED: {segment_name} - {validation['reason']}\n  Saved to: {rejected}")
+        log_step(f"Rejected {segment_name}: {validation['reason']}", "WARN")
+        # Like a rejected file: skip past it rather than retrying forever
+        if offset == 0:
+            load_stage("6_checkpoint").mark_done(filename, checkpoint_file)
+        record_tail(filename, end, end_line, stat)
+        return None
+
+    with log_context(stage="transform"), profile_stage("transform"):
+        staged = load_stage("3_transform").transform(filename, src=segment)
+    os.remove(segment)
+
+    loader = load_stage("4_load_to_doris")
+    lease.check()
+    with log_context(stage="load"), profile_stage("load"):
+        try:
+            summary = loader.load_file(staged, segment_name)
+        except loader.SchemaMismatchError:
+            log_step(f"Schema mismatch detected in {segment_name} - segment skipped", "WARN")
+            record_tail(filename, end, end_line, stat)
+            return None
+    if summary and summary["bad_rows"]:
+        log_step(f"Skipped {summary['bad_rows']} bad rows - saved to error file", "WARN")
+
+    with log_context(stage="checkpoint"), profile_stage("checkpoint"):
+        lease.check()
+        if offset == 0:
+            load_stage("6_checkpoint").mark_done(filename, checkpoint_file)
+        record_tail(filename, end, end_line, stat)
+    log_step(f"COMPLETED: {filename} up to line {end_line}", "SUCCESS")
+    return summary
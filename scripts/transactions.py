@@ -0,0 +1,148 @@
+# transactions.py
+"""
+Exactly-once loads with Stream Load two-phase commit (LOAD_MODE=2pc).
+
+With labelled INSERTs there is a crash window: Doris has committed the last
+chunk, the pod dies before 6_checkpoint runs, and the next run loads the
+file again (under a new id range, so new labels). In 2pc mode each chunk
+goes through:
+  1. Stream Load with `two_phase_commit: true` and a deterministic label,
+     <table>_<digest>_<start>_<stop>, where the digest covers the file
+     name and the staged file's content hash and start/stop is the chunk's
+     row range - fixed LOAD_CHUNK_ROWS cuts in this mode (load_control.py),
+     so the labels are the same on every attempt, whatever id range the
+     attempt reserved and whether or not its load_progress record survived
+  2. the returned txn id is journaled in load_transactions.json, next to
+     checkpoint.txt, before anything is made visible
+  3. commit through /api/<db>/_stream_load_2pc, then the journal entry is
+     dropped; the file is checkpointed once all its chunks are committed
+
+Whatever the crash point, the next run converges:
+  - reconcile() runs at startup and commits every journaled transaction
+    Doris still holds as PRECOMMITTED (forward recovery - the rows are
+    already there), and forgets the ones already visible or aborted
+  - the file itself is still pending, so it is loaded again; every label
+    that exists is resolved through get_load_state instead of being
+    loaded twice: VISIBLE/COMMITTED chunks are skipped, a PRECOMMITTED one
+    (crash before its txn id was journaled) is committed by label
+
+doris_standin.py speaks this HTTP API for local tests without a cluster.
+"""
+import os
+import json
+import time
+import hashlib
+from local_config import (
+    logging, TXN_JOURNAL_FILE, get_doris_host, get_doris_fe_http_port, get_doris_db,
+    get_doris_user, get_doris_pass
+)
+from coordination import locked, write_json_atomic
+from file_registry import file_hash
+from resilience import DorisLoadError, with_retry
+
+DONE_STATES = ("VISIBLE", "COMMITTED")
+
+def load_digest(filename, staged_path):
+    """Stable id of one load of `filename`'s staged content"""
+    material = f"{filename}|{file_hash(staged_path)}"
+    return hashlib.blake2b(material.encode("utf-8"), digest_size=8).hexdigest()
+
+def txn_label(table_name, digest, start, stop):
+    return f"{table_name}_{digest}_{start}_{stop}"
+
+def _api(path):
+    return f"http://{get_doris_host()}:{get_doris_fe_http_port()}/api/{get_doris_db()}/{path}"
+
+def load_state(label):
+    """Doris state of a load label: UNKNOWN, PREPARE, PRECOMMITTED, COMMITTED, VISIBLE or ABORTED"""
+    import requests
+
+    def attempt():
+        response = requests.get(_api("get_load_state"), params={"label": label},
+                                auth=(get_doris_user(), get_doris_pass()), timeout=30)
+        response.raise_for_status()
+        result = response.json()
+        if result.get("msg") != "success":
+            raise DorisLoadError(f"get_load_state {label} failed: {result}", status=result.get("msg"))
+        return result.get("data", "UNKNOWN")
+    return with_retry(attempt, description=f"Load state of {label}")
+
+def finish(label, txn_id=None, operation="commit"):
+    """Commit (or abort) a pre-committed Stream Load by txn id, or by label when the id is unknown"""
+    import requests
+    headers = {"txn_operation": operation}
+    if txn_id is not None:
+        headers["txn_id"] = str(txn_id)
+    else:
+        headers["label"] = label
+
+    def attempt():
+        response = requests.put(_api("_stream_load_2pc"), headers=headers,
+                                auth=(get_doris_user(), get_doris_pass()), timeout=60)
+        response.raise_for_status()
+        result = response.json()
+        if str(result.get("status", "")).lower() == "success":
+            return result
+        message = str(result.get("msg", ""))
+        # A commit whose reply was lost, retried: already done
+        if operation == "commit" and ("visible" in message.lower() or "already commit" in message.lower()):
+            return result
+        raise DorisLoadError(f"Stream Load 2PC {operation} of {label} failed: {message}",
+                             status=result.get("status"))
+    return with_retry(attempt, description=f"2PC {operation} {label}")
+
+def _read_journal():
+    if not os.path.exists(TXN_JOURNAL_FILE):
+        return {"txns": {}}
+    with open(TXN_JOURNAL_FILE) as f:
+        return json.load(f)
+
+def journal(label, txn_id, table_name, filename, rows):
+    """Record a pre-committed transaction before it is committed (fsync'd, atomic)"""
+    with locked(TXN_JOURNAL_FILE):
+        state = _read_journal()
+        state["txns"][label] = {
+            "txn_id": txn_id, "table": table_name, "file": filename,
+            "rows": rows, "precommitted_at": time.time(),
+        }
+        write_json_atomic(TXN_JOURNAL_FILE, state, indent=1)
+
+def forget(*labels):
+    """Drop committed (or settled) transactions from the journal"""
+    with locked(TXN_JOURNAL_FILE):
+        state = _read_journal()
+        if not any(label in state["txns"] for label in labels):
+            return
+        for label in labels:
+            state["txns"].pop(label, None)
+        write_json_atomic(TXN_JOURNAL_FILE, state, indent=1)
+
+def pending():
+    """Journaled transactions not yet known to be committed: {label: entry}"""
+    return _read_journal()["txns"]
+
+def reconcile():
+    """
+    Settle the transactions a crashed or killed run left in the journal.
+    Returns {"committed": n, "visible": n, "aborted": n}.
+    """
+    counts = {"committed": 0, "visible": 0, "aborted": 0}
+    txns = pending()
+    if not txns:
+        return counts
+    logging.info(f"2PC: reconciling {len(txns)} journaled transactions")
+    for label, entry in txns.items():
+        state = load_state(label)
+        if state == "PRECOMMITTED":
+            finish(label, entry.get("txn_id"))
+            counts["committed"] += 1
+            logging.info(f"2PC: committed {label} (txn {entry.get('txn_id')}, {entry['rows']} rows of {entry['file']})")
+        elif state in DONE_STATES:
+            counts["visible"] += 1
+        else:
+            # Aborted or expired - the file isn't checkpointed, so it loads again
+            counts["aborted"] += 1
+            logging.warning(f"2PC: {label} of {entry['file']} was {state}, it will be loaded again")
+        forget(label)
+    logging.info(f"2PC reconcile: {counts}")
+    return counts
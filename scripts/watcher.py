@@ -0,0 +1,175 @@
+# watcher.py
+"""
+Directory watcher for the long-running pipeline mode.
+
+Uses inotify on Linux (through ctypes, no extra packages) and falls back to
+an mtime-indexed directory scan everywhere else, including mounts that don't
+deliver inotify events (e.g. minikube 9p hostPath mounts). Either way a file
+is only reported once its size and mtime have stopped changing for
+`settle_seconds`, so half-written CSVs are never handed to the pipeline.
+"""
+import os
+import sys
+import time
+import select
+import struct
+from local_config import logging
+
+# inotify event masks (see <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+def _init_inotify(directory):
+    """Return an inotify fd watching `directory`, or None if unavailable"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        wd = libc.inotify_add_watch(fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+def _read_inotify_names(fd):
+    """Drain pending inotify events, returning the affected file names"""
+    names = set()
+    overflow = False
+    while True:
+        try:
+            buf = os.read(fd, 64 * 1024)
+        except BlockingIOError:
+            break
+        if not buf:
+            break
+        offset = 0
+        while offset < len(buf):
+            _wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+            offset += _EVENT_HEADER.size
+            name = buf[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+            elif name:
+                names.add(os.fsdecode(name))
+    return names, overflow
+
+class DirectoryWatcher:
+    """Reports new, fully written files in a directory"""
+
+    def __init__(self, directory, suffixes=(".csv",), settle_seconds=0.5,
+                 poll_interval=0.25, backend="auto"):
+        self.directory = directory
+        self.suffixes = tuple(s.lower() for s in suffixes)
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+
+        self._fd = _init_inotify(directory) if backend in ("auto", "inotify") else None
+        if backend == "inotify" and self._fd is None:
+            logging.warning("inotify unavailable, falling back to directory scan")
+        self.backend = "inotify" if self._fd is not None else "scan"
+
+        # name -> (mtime_ns, size) for every file seen so far
+        self._index = {}
+        self._dir_mtime = None
+        # name -> (mtime_ns, size, last_change) for files that may still be written
+        self._pending = {}
+
+    def _matches(self, name):
+        return name.lower().endswith(self.suffixes)
+
+    def _scan(self, force=False):
+        """Re-list the directory only if its mtime moved; return changed names"""
+        try:
+            dir_mtime = os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            return set()
+        if not force and dir_mtime == self._dir_mtime:
+            return set()
+        self._dir_mtime = dir_mtime
+
+        changed = set()
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.is_file() or not self._matches(entry.name):
+                    continue
+                st = entry.stat()
+                key = (st.st_mtime_ns, st.st_size)
+                if self._index.get(entry.name) != key:
+                    changed.add(entry.name)
+        return changed
+
+    def _track(self, names, now):
+        for name in names:
+            if not self._matches(name):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                self._pending.pop(name, None)
+                continue
+            self._pending[name] = (st.st_mtime_ns, st.st_size, now)
+
+    def _settled(self, now):
+        """Return pending files whose size/mtime held still for settle_seconds"""
+        ready = []
+        for name, (mtime_ns, size, last_change) in list(self._pending.items()):
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                del self._pending[name]
+                continue
+            if (st.st_mtime_ns, st.st_size) != (mtime_ns, size):
+                self._pending[name] = (st.st_mtime_ns, st.st_size, now)
+                continue
+            if now - last_change >= self.settle_seconds:
+                del self._pending[name]
+                self._index[name] = (mtime_ns, size)
+                ready.append(name)
+        return sorted(ready)
+
+    def forget(self, name):
+        """Drop a reported file from the index so the next full rescan reports it again (failed loads)"""
+        self._index.pop(name, None)
+
+    def poll(self, timeout=1.0, force_scan=False):
+        """Wait up to `timeout` seconds and return files that are ready"""
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            if self._fd is not None and not force_scan:
+                wait = self.poll_interval if self._pending else max(0.0, deadline - now)
+                readable, _, _ = select.select([self._fd], [], [], wait)
+                if readable:
+                    names, overflow = _read_inotify_names(self._fd)
+                    if overflow:
+                        names |= self._scan(force=True)
+                    self._track(names, time.monotonic())
+            else:
+                self._track(self._scan(force=force_scan), now)
+                force_scan = False
+                if not self._pending:
+                    time.sleep(min(self.poll_interval, max(0.0, deadline - now)))
+
+            ready = self._settled(time.monotonic())
+            if ready or time.monotonic() >= deadline:
+                return ready
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,9 @@
+# conftest.py
+"""Shared setup: scripts/ on the path and a throwaway PIPELINE_BASE_DIR"""
+import os
+import sys
+import tempfile
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+os.environ.setdefault("PIPELINE_BASE_DIR", tempfile.mkdtemp(prefix="pipeline_tests_"))
@@ -0,0 +1,84 @@
+# test_coalesce.py
+"""Coalesced groups: membership kept across an interruption, schema mismatches rejected per group"""
+import os
+import importlib
+import pytest
+
+import coalesce
+from local_config import CSV_DIR, CHECKPOINT_FILE, LOAD_GROUP_DIR, FILE_REGISTRY_FILE
+
+loader = importlib.import_module("4_load_to_doris")
+
+FILES = ["small_1.csv", "small_2.csv", "small_3.csv"]
+
+@pytest.fixture
+def small_files():
+    for path in (CHECKPOINT_FILE, FILE_REGISTRY_FILE, coalesce.PENDING_GROUPS_FILE):
+        if os.path.exists(path):
+            os.remove(path)
+    os.makedirs(CSV_DIR, exist_ok=True)
+    for i, name in enumerate(FILES):
+        with open(os.path.join(CSV_DIR, name), "w") as f:
+            f.write(f"name,score\nrow{i},{i}\nrow{i}b,{i + 0.5}\n")
+    yield FILES
+    for name in FILES:
+        os.remove(os.path.join(CSV_DIR, name))
+
+def checkpointed():
+    if not os.path.exists(CHECKPOINT_FILE):
+        return []
+    with open(CHECKPOINT_FILE) as f:
+        return f.read().split()
+
+class FakeLoad:
+    """load_file stand-in: records the loads, optionally fails once"""
+    def __init__(self, fail=None):
+        self.loads = []
+        self.fail = fail
+
+    def __call__(self, staged_path, original_filename=None, chunk_rows=None):
+        if self.fail is not None:
+            error, self.fail = self.fail, None
+            raise error
+        self.loads.append(original_filename)
+        return {"table": "tbl", "first_id": 1, "loaded_rows": chunk_rows, "bad_rows": 0,
+                "quality": {}, "tuning": None}
+
+def test_interrupted_group_is_replanned_with_its_members(small_files, monkeypatch):
+    load = FakeLoad(fail=RuntimeError("connection lost"))
+    monkeypatch.setattr(loader, "load_file", load)
+    with pytest.raises(RuntimeError):
+        coalesce.process_group(FILES[:2])
+    name = coalesce.group_name(FILES[:2])
+    assert coalesce.pending_groups() == {name: FILES[:2]}
+
+    # A third file arrived meanwhile - the interrupted group keeps its name
+    groups = coalesce.plan_groups(FILES)
+    assert groups == [FILES[:2], FILES[2:]]
+    coalesce.process_group(groups[0])
+    assert load.loads == [f"{name}.csv"]
+    assert checkpointed() == FILES[:2] and coalesce.pending_groups() == {}
+
+def test_loaded_group_is_only_checkpointed_on_rerun(small_files, monkeypatch):
+    load = FakeLoad()
+    monkeypatch.setattr(loader, "load_file", load)
+    checkpoint = importlib.import_module("6_checkpoint")
+    real_mark_done_many = checkpoint.mark_done_many
+    def crash(*args, **kwargs):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(checkpoint, "mark_done_many", crash)
+    with pytest.raises(KeyboardInterrupt):
+        coalesce.process_group(FILES)
+    assert len(load.loads) == 1
+
+    monkeypatch.setattr(checkpoint, "mark_done_many", real_mark_done_many)
+    result = coalesce.process_group(coalesce.plan_groups(FILES)[0])
+    assert len(load.loads) == 1 and result["loaded"] == 3
+    assert checkpointed() == FILES
+    assert os.path.exists(os.path.join(LOAD_GROUP_DIR, f"{coalesce.group_name(FILES)}.json"))
+
+def test_schema_mismatch_rejects_the_group_without_retrying(small_files, monkeypatch):
+    monkeypatch.setattr(loader, "load_file", FakeLoad(fail=loader.SchemaMismatchError("mismatch")))
+    result = coalesce.process_group(FILES)
+    assert result["rejected"] == 3 and result["loaded"] == 0
+    assert checkpointed() == FILES and coalesce.pending_groups() == {}
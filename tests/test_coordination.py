@@ -0,0 +1,56 @@
+# test_coordination.py
+"""Lease and lock files are cleaned up without breaking mutual exclusion"""
+import os
+import threading
+import importlib
+
+from coordination import Lease, locked, lease_path
+from local_config import CHECKPOINT_FILE
+
+checkpoint = importlib.import_module("6_checkpoint")
+
+def test_released_lease_leaves_no_files():
+    lease = Lease("events.csv", ttl=30)
+    assert lease.acquire()
+    assert os.path.exists(lease_path("events.csv"))
+    lease.release()
+    assert not os.path.exists(lease_path("events.csv"))
+    assert not os.path.exists(f"{lease_path('events.csv')}.lock")
+
+def test_waiter_on_a_removed_lock_file_locks_the_new_one(tmp_path):
+    path = str(tmp_path / "shared.json")
+    holding = threading.Event()
+    release = threading.Event()
+    inside = []
+
+    def first():
+        with locked(path, remove=True):
+            holding.set()
+            release.wait()
+            inside.append("first")
+
+    def second():
+        with locked(path):
+            # Holds the lock file that exists now, not the deleted one
+            inside.append(("second", os.path.exists(f"{path}.lock")))
+
+    a = threading.Thread(target=first)
+    a.start()
+    holding.wait()
+    b = threading.Thread(target=second)
+    b.start()
+    release.set()
+    a.join()
+    b.join()
+    assert inside == ["first", ("second", True)]
+
+def test_consolidation_removes_shard_locks():
+    if os.path.exists(CHECKPOINT_FILE):
+        os.remove(CHECKPOINT_FILE)
+    shard = checkpoint.shard_checkpoint_file(7)
+    checkpoint.mark_done("sharded.csv", shard)
+    assert os.path.exists(f"{shard}.lock")
+    assert checkpoint.consolidate_checkpoints() == 1
+    assert not os.path.exists(shard) and not os.path.exists(f"{shard}.lock")
+    with open(CHECKPOINT_FILE) as f:
+        assert "sharded.csv" in f.read().split()
@@ -0,0 +1,45 @@
+# test_file_registry.py
+"""Discovery of tailed files: never re-queued in full, hash kept for duplicate detection"""
+import os
+import shutil
+import pytest
+
+import file_registry
+import tail
+from local_config import CSV_DIR, FILE_REGISTRY_FILE
+
+@pytest.fixture
+def events():
+    if os.path.exists(FILE_REGISTRY_FILE):
+        os.remove(FILE_REGISTRY_FILE)
+    path = os.path.join(CSV_DIR, "events.csv")
+    with open(path, "w") as f:
+        f.write("a,b\n1,2\n")
+    yield path
+    for name in ("events.csv", "events_copy.csv"):
+        if os.path.exists(os.path.join(CSV_DIR, name)):
+            os.remove(os.path.join(CSV_DIR, name))
+
+def tail_load(path):
+    """What a first tail-mode load leaves in the registry"""
+    file_registry.record_done(os.path.basename(path))
+    st = os.stat(path)
+    tail.record_tail(os.path.basename(path), st.st_size, 2,
+                     {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "window": "w"})
+
+def test_record_tail_keeps_the_content_hash(events):
+    tail_load(events)
+    entry = file_registry.load_registry()["files"]["events.csv"]
+    assert entry["hash"] and entry["tail"]["offset"] == os.path.getsize(events)
+
+def test_grown_tailed_file_is_skipped_without_tail_mode(events):
+    tail_load(events)
+    with open(events, "a") as f:
+        f.write("3,4\n")
+    assert file_registry.classify_files(["events.csv"]) == ([], {})
+    assert file_registry.classify_files(["events.csv"], tail=True) == (["events.csv"], {})
+
+def test_copy_of_a_tailed_file_is_a_duplicate(events):
+    tail_load(events)
+    shutil.copy(events, os.path.join(CSV_DIR, "events_copy.csv"))
+    assert file_registry.classify_files(["events_copy.csv"]) == ([], {"events_copy.csv": "events.csv"})
@@ -0,0 +1,30 @@
+# test_load_progress.py
+"""A resumed load knows its rejected rows are already in the error file"""
+from load_progress import LoadProgress
+
+def staged_file(tmp_path):
+    path = tmp_path / "staged_events.csv"
+    path.write_text("a\n1\nx\n")
+    return str(path)
+
+def test_rejects_written_survives_a_resume(tmp_path):
+    staged = staged_file(tmp_path)
+    progress = LoadProgress("events.csv", staged, "tbl")
+    progress.check(2)
+    progress.start(1, 2)
+    assert not progress.rejects_written
+    progress.mark_rejects_written()
+
+    resumed = LoadProgress("events.csv", staged, "tbl")
+    assert resumed.check(2) and resumed.rejects_written
+    resumed.finish()
+
+def test_fresh_load_writes_rejects_again(tmp_path):
+    staged = staged_file(tmp_path)
+    progress = LoadProgress("events.csv", staged, "tbl")
+    progress.start(1, 2)
+    progress.mark_rejects_written()
+    progress.finish()
+
+    again = LoadProgress("events.csv", staged, "tbl")
+    assert not again.check(2) and not again.rejects_written
@@ -0,0 +1,56 @@
+# test_profiling.py
+"""PROFILE=1: worker threads belong to their stage, overlapping stages get no peak memory"""
+import time
+import pstats
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+import profiling
+from pipeline_logging import log_context
+
+@pytest.fixture
+def profiled(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "_enabled", True)
+    monkeypatch.setattr(profiling, "_profile_dir", str(tmp_path))
+    monkeypatch.setattr(profiling, "_records", [])
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    yield tmp_path
+    if started:
+        tracemalloc.stop()
+
+def spin(seconds=0.1):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(100))
+
+def test_worker_threads_are_profiled_with_the_stage(profiled):
+    with log_context(file="events.csv"), profiling.profile_stage("load"):
+        with ThreadPoolExecutor(2, thread_name_prefix="load") as pool:
+            list(pool.map(profiling.in_stage(spin), [0.1, 0.1]))
+    stats = pstats.Stats(str(profiled / "events.csv.load.pstats"))
+    assert any(func[2] == "spin" for func in stats.stats)
+    collapsed = (profiled / "events.csv.load.collapsed").read_text()
+    assert any(line.startswith("load_") and "spin" in line for line in collapsed.splitlines())
+
+def test_overlapping_stages_report_no_peak(profiled):
+    entered = threading.Barrier(2)
+
+    def stage(name):
+        with log_context(file=name), profiling.profile_stage("load"):
+            entered.wait()
+            spin(0.05)
+
+    threads = [threading.Thread(target=stage, args=(f"f{i}.csv",)) for i in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with log_context(file="alone.csv"), profiling.profile_stage("load"):
+        spin(0.01)
+    peaks = {r["file"]: r["peak_mb"] for r in profiling._records}
+    assert peaks["f0.csv"] is None and peaks["f1.csv"] is None
+    assert peaks["alone.csv"] is not None
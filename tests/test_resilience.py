@@ -0,0 +1,45 @@
+# test_resilience.py
+"""Circuit breaker half-open state and retry classification"""
+import pytest
+
+from resilience import CircuitBreaker, CircuitOpenError, DorisLoadError, is_retryable
+
+class OperationalError(Exception):
+    """Stands in for pymysql.err.OperationalError (classified by module)"""
+OperationalError.__module__ = "pymysql.err"
+
+def open_breaker():
+    breaker = CircuitBreaker(failures=1, cooldown=0)
+    breaker.record_failure()
+    return breaker
+
+def test_half_open_admits_one_trial():
+    breaker = open_breaker()
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    breaker.before_call()
+    breaker.before_call()
+
+def test_failed_trial_reopens():
+    breaker = open_breaker()
+    breaker.cooldown = 60
+    breaker.opened_at -= 60
+    breaker.before_call()
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError, match="retry in"):
+        breaker.before_call()
+
+def test_doris_codes_and_statuses_are_retried():
+    assert is_retryable(OperationalError(1105, "errCode = 2, detailMessage = [E-235]version count: 2001, exceed limit"))
+    assert is_retryable(DorisLoadError("Stream Load failed: Fail: [TOO_MANY_TASKS]queue full", status="Fail"))
+    assert is_retryable(DorisLoadError("Stream Load failed: Publish Timeout: ", status="Publish Timeout"))
+    assert is_retryable(DorisLoadError("Stream Load failed: HTTP 503", http_status=503))
+    assert is_retryable(OperationalError(2013, "Lost connection to MySQL server during query"))
+
+def test_messages_that_only_mention_a_keyword_are_not_retried():
+    assert not is_retryable(OperationalError(1105, "errCode = 2, detailMessage = Unknown column 'timeout_ms'"))
+    assert not is_retryable(DorisLoadError("Stream Load failed: Fail: too many filtered rows, id -235", status="Fail"))
+    assert not is_retryable(RuntimeError("column timeout is not nullable"))
+    assert not is_retryable(DorisLoadError("Stream Load failed: HTTP 401", http_status=401))
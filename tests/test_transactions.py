@@ -0,0 +1,129 @@
+# test_transactions.py
+"""
+LOAD_MODE=2pc against doris_standin.py (FE redirecting to a BE, 2PC,
+load states): the redirect, label resolution and crash recovery.
+"""
+import os
+import importlib
+import types
+import pandas as pd
+import pytest
+import requests
+
+import transactions
+from doris_standin import StandinState, serve
+from load_batch import LoadBatch
+from load_control import LoadController
+from local_config import TXN_JOURNAL_FILE
+
+loader = importlib.import_module("4_load_to_doris")
+
+TABLE = "events"
+
+@pytest.fixture
+def standin(tmp_path, monkeypatch):
+    state = StandinState(str(tmp_path / "standin"))
+    fe, be = serve("127.0.0.1", 0, 0, state)
+    monkeypatch.setenv("DORIS_HOST", "127.0.0.1")
+    monkeypatch.setenv("DORIS_FE_HTTP_PORT", str(fe.server_address[1]))
+    monkeypatch.setenv("DORIS_DB", "test2")
+    monkeypatch.setenv("DORIS_RETRY_BASE_DELAY", "0.01")
+    monkeypatch.delenv("DORIS_BE_HTTP", raising=False)
+    if os.path.exists(TXN_JOURNAL_FILE):
+        os.remove(TXN_JOURNAL_FILE)
+    yield state
+    fe.shutdown()
+    be.shutdown()
+
+def table_state(standin):
+    with standin.lock:
+        return standin.tables().get(f"test2.{TABLE}", {"visible_rows": 0, "precommitted": [], "duplicate_ids": 0})
+
+def make_batch(rows=3):
+    df = pd.DataFrame({"id": range(1, rows + 1), "name": [f"n{i}" for i in range(rows)]})
+    batch, rejects = LoadBatch.from_frame(df, {"id": "BIGINT", "name": "VARCHAR(20)"})
+    assert len(rejects) == 0
+    return batch
+
+def two_pc_sender(batch, digest="d1"):
+    progress = types.SimpleNamespace(filename="events.csv")
+    controller = LoadController(TABLE, len(batch), adaptive=False, fixed_chunks=True)
+    return loader.send_2pc(TABLE, batch, progress, controller, digest)
+
+def precommit(batch, label):
+    result = loader.stream_load_to_doris(batch, TABLE, label=label, two_phase_commit=True)
+    assert result["Status"] == "Success"
+    return result["TxnId"]
+
+def test_stream_load_resolves_the_fe_redirect(standin):
+    result = loader.stream_load_to_doris(make_batch(), TABLE, label="plain_1")
+    assert result["NumberLoadedRows"] == 3
+    assert table_state(standin)["visible_rows"] == 3
+
+def test_following_the_redirect_with_requests_loses_the_load(standin):
+    # What the resolve-first PUT avoids: credentials dropped on the way to the BE
+    url = f"http://127.0.0.1:{os.environ['DORIS_FE_HTTP_PORT']}/api/test2/{TABLE}/_stream_load"
+    response = requests.put(url, data=iter([b"1,a\n"]), auth=("root", ""),
+                            headers={"Expect": "100-continue", "label": "naive_1"}, timeout=10)
+    assert response.status_code == 401
+    assert table_state(standin)["visible_rows"] == 0
+
+def test_chunk_is_committed_and_journal_cleared(standin):
+    batch = make_batch()
+    two_pc_sender(batch)(0, 3)
+    assert table_state(standin) == {"visible_rows": 3, "precommitted": [], "duplicate_ids": 0}
+    assert transactions.pending() == {}
+
+def test_label_already_visible_is_not_loaded_again(standin):
+    batch = make_batch()
+    send = two_pc_sender(batch)
+    send(0, 3)
+    send(0, 3)
+    state = table_state(standin)
+    assert state["visible_rows"] == 3
+    assert state["duplicate_ids"] == 0
+
+def test_label_precommitted_is_committed_by_label(standin):
+    # Crash after the pre-commit, before its txn id was journaled
+    batch = make_batch()
+    precommit(batch, transactions.txn_label(TABLE, "d1", 0, 3))
+    assert transactions.pending() == {}
+    assert len(table_state(standin)["precommitted"]) == 1
+
+    two_pc_sender(batch)(0, 3)
+    assert table_state(standin) == {"visible_rows": 3, "precommitted": [], "duplicate_ids": 0}
+
+def test_reconcile_commits_a_journaled_precommit(standin):
+    # Crash between journal and commit: reconcile finishes it, the reload skips it
+    batch = make_batch()
+    label = transactions.txn_label(TABLE, "d1", 0, 3)
+    txn_id = precommit(batch, label)
+    transactions.journal(label, txn_id, TABLE, "events.csv", 3)
+
+    assert transactions.reconcile() == {"committed": 1, "visible": 0, "aborted": 0}
+    assert transactions.pending() == {}
+    assert table_state(standin)["visible_rows"] == 3
+
+    two_pc_sender(batch)(0, 3)
+    assert table_state(standin) == {"visible_rows": 3, "precommitted": [], "duplicate_ids": 0}
+
+def test_reconcile_forgets_visible_and_aborted(standin):
+    batch = make_batch()
+    visible = transactions.txn_label(TABLE, "d1", 0, 3)
+    aborted = transactions.txn_label(TABLE, "d2", 0, 3)
+    txn_visible = precommit(batch, visible)
+    transactions.finish(visible, txn_visible)
+    txn_aborted = precommit(batch, aborted)
+    transactions.finish(aborted, txn_aborted, operation="abort")
+    transactions.journal(visible, txn_visible, TABLE, "events.csv", 3)
+    transactions.journal(aborted, txn_aborted, TABLE, "events.csv", 3)
+
+    assert transactions.reconcile() == {"committed": 0, "visible": 1, "aborted": 1}
+    assert transactions.pending() == {}
+    assert table_state(standin)["visible_rows"] == 3
+
+def test_lost_commit_ack_is_retried(standin):
+    standin.lose_commit_acks = 1
+    two_pc_sender(make_batch())(0, 3)
+    assert table_state(standin) == {"visible_rows": 3, "precommitted": [], "duplicate_ids": 0}
+    assert transactions.pending() == {}